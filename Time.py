@@ -1,10 +1,7 @@
 #!/usr/bin/env python3
 		  
 import requests
-import numpy as np
-from PIL import Image, ImageDraw, ImageFont, ImageStat, ImageEnhance
-import fcntl
-import struct
+from PIL import Image, ImageDraw, ImageStat, ImageEnhance
 import os
 import time
 from datetime import datetime, timedelta
@@ -17,13 +14,16 @@ from io import BytesIO
 import geocoder
 import tzlocal
 import hashlib
-import json
+from framebuffer import FRAMEBUFFER_DEVICE, get_framebuffer
+from functools import lru_cache
+from typography import load_font
+from nfcstatus import StatusLog
 
 load_dotenv()
 
 # Constants
 API_KEY = os.getenv("OPENWEATHER_API_KEY")
-FRAMEBUFFER = "/dev/fb0"
+FRAMEBUFFER = FRAMEBUFFER_DEVICE
 FONT_PATH = "/home/pi/plexdap/led.ttf" #"/usr/share/fonts/truetype/sf-pro/SF-Pro-Display-Regular.otf" 
 CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache')
 os.makedirs(CACHE_DIR, exist_ok=True)
@@ -37,27 +37,13 @@ cached_weather = None
 cached_weather_time = 0
 cached_wallpaper = None
 cached_wallpaper_time = 0
-cached_framebuffer_info = None
 
-error_log_file = 'nfc_errors.json'
+# Written by main.py; latest() reads only the tail of the file
+status_log = StatusLog()
 
 def get_latest_nfc_error():
     try:
-        with open(error_log_file, 'r') as f:
-            # Read each line and load as JSON
-            error_logs = [json.loads(line) for line in f.readlines()]
-            
-        if not error_logs:
-            return None, None
-
-        # Find the log entry with the latest timestamp
-        latest_log = max(error_logs, key=lambda x: datetime.strptime(x['timestamp'], '%Y-%m-%d %H:%M:%S'))
-        return latest_log['status'], latest_log['timestamp']
-    
-    except FileNotFoundError:
-        return None, None  # File does not exist
-    except json.JSONDecodeError:
-        return None, None  # Malformed JSON file
+        return status_log.latest()
     except Exception as e:
         return f"Error while reading log file: {str(e)}", None
 
@@ -172,25 +158,17 @@ def adjust_brightness(image, brightness_factor):
     return enhancer.enhance(brightness_factor)
 
 def get_framebuffer_info(fbdev):
-    global cached_framebuffer_info
-    if cached_framebuffer_info:
-        return cached_framebuffer_info
-
-    with open(fbdev, "rb") as fb:
-        fmt = "8I12I36I"
-        FBIOGET_VSCREENINFO = 0x4600
-        screen_info = fcntl.ioctl(fb, FBIOGET_VSCREENINFO, b"\0" * struct.calcsize(fmt))
-        data = struct.unpack(fmt, screen_info)
-        cached_framebuffer_info = (data[0], data[1], data[6])
-        return cached_framebuffer_info
+    framebuffer = get_framebuffer(fbdev)
+    return framebuffer.width, framebuffer.height, framebuffer.bpp
 
+@lru_cache(maxsize=8)
 def calculate_font_size(width, height):
     max_font_size = 100
     optimal_height = int(height * 0.9)
     optimal_width = int(width * 0.9)
 
     for font_size in range(max_font_size, 0, -1):
-        font = ImageFont.truetype(FONT_PATH, font_size)
+        font = load_font(FONT_PATH, font_size)
         text_bbox = font.getbbox("00:00:00")
         text_width = text_bbox[2] - text_bbox[0]
         text_height = text_bbox[3] - text_bbox[1]
@@ -251,10 +229,9 @@ def create_time_image(width, height):
     # Fetch the latest NFC error and timestamp
     error, timestamp = get_latest_nfc_error()
 
-    if "NFC is down!" in error:
+    nfcerror = " "
+    if error and "NFC is down!" in error:
         nfcerror=f"{error}"
-    if "NFC is up!" in error:
-        nfcerror=" "
 
     sun_elevation = get_solar_elevation_angle(lat, lon)
     pluto_time_status = "Pluto Time!" if -1.5 <= sun_elevation <= 1.5 else f"{nfcerror}" #To display either Pluto Time or NFC status
@@ -265,16 +242,16 @@ def create_time_image(width, height):
     font_color = calculate_contrast_color(image)
 
     font_size = calculate_font_size(width, height)
-    font = ImageFont.truetype(FONT_PATH, size=font_size)
+    font = load_font(FONT_PATH, font_size)
 
     day_font_size = int(font_size * 0.40)
-    day_font = ImageFont.truetype(FONT_PATH, size=day_font_size)
+    day_font = load_font(FONT_PATH, day_font_size)
 
     temp_font_size = int(font_size * 0.35)
-    temp_font = ImageFont.truetype(FONT_PATH, size=temp_font_size)
+    temp_font = load_font(FONT_PATH, temp_font_size)
 
     pluto_font_size = int(font_size * 0.20)
-    pluto_font = ImageFont.truetype(FONT_PATH, size=pluto_font_size)
+    pluto_font = load_font(FONT_PATH, pluto_font_size)
 
     padding = 10
 
@@ -319,21 +296,9 @@ def create_time_image(width, height):
 def display_time_on_framebuffer(fbdev):
     fb_width, fb_height, fb_bpp = get_framebuffer_info(fbdev)
     image = create_time_image(fb_width, fb_height)
-
-    img_data = np.array(image, dtype=np.uint8)
-    r, g, b = img_data[:, :, 0], img_data[:, :, 1], img_data[:, :, 2]
-
-    if fb_bpp == 32:
-        fb_data = (r.astype(np.uint32) << 16) | (g.astype(np.uint32) << 8) | b.astype(np.uint32)
-    elif fb_bpp == 16:
-        fb_data = ((r.astype(np.uint16) & 0xF8) << 8) | ((g.astype(np.uint16) & 0xFC) << 3) | (b.astype(np.uint16) >> 3)
-    else:
-        raise ValueError(f"Unsupported bits per pixel: {fb_bpp}")
-
-    fb_data = np.array(fb_data, dtype=np.uint32 if fb_bpp == 32 else np.uint16)
-
-    with open(fbdev, "wb") as fb:
-        fb.write(fb_data.tobytes())
+    update = get_framebuffer(fbdev).update_image(image)
+    print(f"Framebuffer update: {len(update['regions'])} region(s), "
+          f"{update['bytes_written']} bytes in {update['elapsed'] * 1000:.1f} ms")
 
 def time_until_next_minute():
     current_time = time.localtime()
@@ -0,0 +1,161 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image
+
+# Memory budget for decoded artwork held in-process
+ARTWORK_CACHE_BYTES = int(os.getenv("ARTWORK_CACHE_BYTES", 32 * 1024 * 1024))
+# Budget for the raw pixel files on disk (0 disables the disk tier)
+ARTWORK_DISK_CACHE_BYTES = int(os.getenv("ARTWORK_DISK_CACHE_BYTES", 128 * 1024 * 1024))
+# Disk tier shared by the renderer and the webhook listener
+ARTWORK_CACHE_DIR = os.getenv("ARTWORK_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), 'image_cache'))
+
+
+class ImageCache:
+    """Two-tier LRU cache of decoded images.
+
+    Tier one is an in-process ``OrderedDict`` of NumPy arrays bounded by
+    ``max_bytes``.  Tier two, when ``disk_dir`` is set, stores raw ``.npy``
+    pixel files that are memory-mapped back on a hit instead of being
+    PNG-decoded.  Both tiers evict least recently used entries once they go
+    over budget.  The disk tier can be shared: files another process
+    writes into ``disk_dir`` are picked up on the next lookup.
+    """
+
+    def __init__(self, max_bytes=ARTWORK_CACHE_BYTES, disk_dir=None, max_disk_bytes=ARTWORK_DISK_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir if max_disk_bytes > 0 else None
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.disk_entries = OrderedDict()
+        self.disk_bytes = 0
+        self.lock = threading.Lock()
+        self.stats = {
+            'hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'disk_evictions': 0,
+        }
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    def _scan_disk(self):
+        files = []
+        for filename in os.listdir(self.disk_dir):
+            if filename.endswith('.npy'):
+                path = os.path.join(self.disk_dir, filename)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(files):
+            self.disk_entries[path] = size
+            self.disk_bytes += size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.md5(key.encode()).hexdigest() + '.npy')
+
+    def get(self, key):
+        with self.lock:
+            array = self.entries.get(key)
+            if array is not None:
+                self.entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return array
+
+            if self.disk_dir:
+                path = self._disk_path(key)
+                if self._has_disk_entry(path):
+                    try:
+                        array = np.load(path, mmap_mode='r')
+                    except (OSError, ValueError) as e:
+                        print(f"Error reading cached image {path}: {e}")
+                        self._remove_disk_entry(path)
+                    else:
+                        self.disk_entries.move_to_end(path)
+                        os.utime(path)
+                        self.stats['disk_hits'] += 1
+                        self._store(key, array)
+                        return array
+
+            self.stats['misses'] += 1
+            return None
+
+    def _has_disk_entry(self, path):
+        if path in self.disk_entries:
+            return True
+        # Written by another process since the directory was scanned
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return False
+        self.disk_entries[path] = size
+        self.disk_bytes += size
+        return True
+
+    def contains(self, key):
+        """True if ``key`` is cached in either tier, without loading it."""
+        with self.lock:
+            return key in self.entries or bool(self.disk_dir and self._has_disk_entry(self._disk_path(key)))
+
+    def put(self, key, array, persist=True):
+        with self.lock:
+            self._store(key, array)
+            if persist and self.disk_dir:
+                self._persist(key, array)
+
+    def _store(self, key, array):
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key).nbytes
+        if array.nbytes > self.max_bytes:
+            return
+        self.entries[key] = array
+        self.bytes += array.nbytes
+        while self.bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= evicted.nbytes
+            self.stats['evictions'] += 1
+
+    def _persist(self, key, array):
+        path = self._disk_path(key)
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.save(f, np.ascontiguousarray(array))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error caching image {path}: {e}")
+            return
+        if path in self.disk_entries:
+            self.disk_bytes -= self.disk_entries.pop(path)
+        size = os.path.getsize(path)
+        self.disk_entries[path] = size
+        self.disk_bytes += size
+        while self.disk_bytes > self.max_disk_bytes and len(self.disk_entries) > 1:
+            evicted_path = next(iter(self.disk_entries))
+            self._remove_disk_entry(evicted_path)
+            self.stats['disk_evictions'] += 1
+
+    def _remove_disk_entry(self, path):
+        self.disk_bytes -= self.disk_entries.pop(path, 0)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def get_image(self, key):
+        array = self.get(key)
+        return Image.fromarray(np.asarray(array)) if array is not None else None
+
+    def put_image(self, key, image, persist=True):
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGB')
+        self.put(key, np.asarray(image), persist)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, bytes=self.bytes, entries=len(self.entries),
+                        disk_bytes=self.disk_bytes, disk_entries=len(self.disk_entries))
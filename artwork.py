@@ -0,0 +1,42 @@
+from io import BytesIO
+from PIL import Image
+import requests
+
+ARTWORK_TIMEOUT = 5
+
+
+def artwork_key(thumb, size):
+    """Cache key for ``thumb`` scaled to fit a ``size`` x ``size`` box."""
+    return f"{thumb}@{size}"
+
+
+def transcode_url(base_url, thumb, token, size):
+    # Plex photo transcoder; scales server-side so only ``size`` px come over the wire
+    return (f"{base_url}/photo/:/transcode?width={size}&height={size}&minSize=1&upscale=1"
+            f"&url={requests.utils.quote(thumb, safe='')}&X-Plex-Token={token}")
+
+
+def original_url(base_url, thumb, token):
+    return f"{base_url}{thumb}?X-Plex-Token={token}"
+
+
+def decode_image(data, size):
+    """Decode ``data``, letting JPEG scale down in the DCT domain to no less than ``size``."""
+    img = Image.open(BytesIO(data))
+    if img.format == 'JPEG':
+        img.draft('RGB', (size, size))
+    img.load()
+    return img
+
+
+def fetch_artwork(session, base_url, thumb, token, size, timeout=ARTWORK_TIMEOUT):
+    """Fetch ``thumb`` sized for a ``size`` px square, falling back to the original."""
+    for url in (transcode_url(base_url, thumb, token, size), original_url(base_url, thumb, token)):
+        try:
+            response = session.get(url, timeout=timeout)
+            if response.status_code == 200:
+                return decode_image(response.content, size)
+            print(f"Artwork request returned {response.status_code}: {url.split('?')[0]}")
+        except Exception as e:
+            print(f"Error fetching image: {e}")
+    return None
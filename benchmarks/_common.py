@@ -0,0 +1,79 @@
+"""Helpers shared by the benchmark scripts: synthetic covers, timing and a stub player."""
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import numpy as np
+from PIL import Image
+
+
+def make_cover(size=1000, seed=1, grid=8):
+    """A smooth ``size`` px square cover: a random ``grid`` x ``grid`` image scaled up."""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (grid, grid, 3), dtype=np.uint8)
+    return Image.fromarray(small).resize((size, size), Image.BICUBIC)
+
+
+def timed(fn, repeat=1, warmup=True, clock=time.perf_counter, label=None):
+    """Mean seconds per call of ``fn()`` over ``repeat`` calls, and the last call's result.
+
+    With a ``label`` the time is also printed.
+    """
+    if warmup:
+        fn()
+    start = clock()
+    for _ in range(repeat):
+        result = fn()
+    elapsed = (clock() - start) / repeat
+    if label:
+        print(f"{label:<34} {elapsed * 1000:8.3f} ms")
+    return elapsed, result
+
+
+class StubPlayer:
+    """Local stand-in for a Plexamp player that accepts every command.
+
+    Each response takes ``latency`` seconds, playMedia ``hang`` seconds.
+    Counts requests and TCP connections and records when pauses arrive.
+    """
+
+    def __init__(self, latency=0, hang=0):
+        self.latency = latency
+        self.hang = hang
+        self.requests = 0
+        self.connections = 0
+        self.pauses = []
+        self.pause_received = threading.Event()
+        self.lock = threading.Lock()
+        player = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with player.lock:
+                    player.connections += 1
+
+            def do_GET(self):
+                with player.lock:
+                    player.requests += 1
+                time.sleep(player.latency)
+                if "/playMedia" in self.path:
+                    time.sleep(player.hang)
+                elif self.path.endswith("/pause"):
+                    player.pauses.append(time.monotonic())
+                    player.pause_received.set()
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset(self):
+        self.requests = self.connections = 0
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Artwork fetch-and-decode benchmark against the local stub Plex server.
+
+Compares the old full-size download + decode with the photo transcoder
+and with JPEG draft decoding of the original, reporting bytes on the
+wire, decoded pixel memory and time to an album-art-sized image.
+
+    python benchmarks/bench_artwork.py [--repeat 10] [--size 360]
+"""
+import os
+import sys
+import time
+import argparse
+from io import BytesIO
+import requests
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_plex import StubPlex, ART_SIZE
+from artwork import fetch_artwork
+from compositor import resize_image_aspect_ratio
+
+THUMB = "/library/metadata/900/thumb"
+
+
+def old_fetch(session, base_url, size):
+    # fb.py:fetch_image_from_url before sized requests, plus the later resize
+    response = session.get(f"{base_url}{THUMB}?X-Plex-Token=token")
+    img = Image.open(BytesIO(response.content))
+    img.load()
+    decoded = img.width * img.height * len(img.getbands())
+    return resize_image_aspect_ratio(img, size, size), decoded
+
+
+def new_fetch(session, base_url, size):
+    img = fetch_artwork(session, base_url, THUMB, "token", size)
+    decoded = img.width * img.height * len(img.getbands())
+    return resize_image_aspect_ratio(img, size, size), decoded
+
+
+def run(label, fn, stub, repeat):
+    fn()
+    sent, sent_bytes = len(stub.requests), stub.bytes_sent
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _, decoded = fn()
+    elapsed = (time.perf_counter() - start) / repeat
+    print(f"{label:<24} {elapsed * 1000:8.1f} ms  {(stub.bytes_sent - sent_bytes) / repeat / 1024:7.0f} KiB wire  "
+          f"{decoded / 1024:6.0f} KiB decoded  {(len(stub.requests) - sent) / repeat:.0f} req")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--size", type=int, default=360)
+    args = parser.parse_args()
+
+    session = requests.Session()
+    with StubPlex() as stub:
+        print(f"original art: {ART_SIZE}x{ART_SIZE}, {len(stub.art)} bytes")
+        baseline = run("old full download", lambda: old_fetch(session, stub.url, args.size), stub, args.repeat)
+        transcoded = run("photo transcoder", lambda: new_fetch(session, stub.url, args.size), stub, args.repeat)
+        stub.transcode = False
+        drafted = run("original + JPEG draft", lambda: new_fetch(session, stub.url, args.size), stub, args.repeat)
+    print(f"speedup: transcoder {baseline / transcoded:.1f}x, draft fallback {baseline / drafted:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Background blur benchmark: full-size GaussianBlur(30) vs the reduced-resolution engine.
+
+Reports time per background and how far each variant is from the current
+output (PSNR and a windowed SSIM on luma).
+
+    python benchmarks/bench_blur.py [--repeat 5]
+"""
+import os
+import sys
+import argparse
+import numpy as np
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from blur import blurred_background, box_blur
+from _common import make_cover, timed
+
+WIDTH, HEIGHT = 800, 480
+
+
+def old_background(img, width, height):
+    # fb.py:create_blurred_background before the blur engine
+    blurred_img = img.resize((width, height)).filter(ImageFilter.GaussianBlur(30))
+    overlay = Image.new('RGBA', (width, height), (0, 0, 0, 128))
+    return Image.alpha_composite(blurred_img.convert('RGBA'), overlay).convert('RGB')
+
+
+def luma(img):
+    return np.asarray(img.convert('L'), dtype=np.float32)
+
+
+def psnr(a, b):
+    mse = np.mean((luma(a) - luma(b)) ** 2)
+    return float('inf') if mse == 0 else 10 * np.log10(255 ** 2 / mse)
+
+
+def ssim(a, b, radius=5):
+    x, y = luma(a), luma(b)
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    mean_x, mean_y = box_blur(x, radius, 1), box_blur(y, radius, 1)
+    var_x = box_blur(x * x, radius, 1) - mean_x ** 2
+    var_y = box_blur(y * y, radius, 1) - mean_y ** 2
+    cov = box_blur(x * y, radius, 1) - mean_x * mean_y
+    ssim_map = ((2 * mean_x * mean_y + c1) * (2 * cov + c2)) / ((mean_x ** 2 + mean_y ** 2 + c1) * (var_x + var_y + c2))
+    return float(ssim_map.mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    cover = make_cover(seed=3, grid=24)
+    baseline_time, reference = timed(lambda: old_background(cover, WIDTH, HEIGHT), args.repeat)
+    print(f"{'variant':<22} {'ms':>8} {'speedup':>8} {'PSNR dB':>8} {'SSIM':>6}")
+    print(f"{'old GaussianBlur(30)':<22} {baseline_time * 1000:8.1f} {1.0:8.1f} {'-':>8} {'-':>6}")
+    for method in ("gaussian", "box"):
+        for quality in (1.0, 0.5, 0.25, 0.125):
+            elapsed, result = timed(lambda: blurred_background(cover, WIDTH, HEIGHT, quality, method), args.repeat)
+            label = f"{method} q={quality}"
+            print(f"{label:<22} {elapsed * 1000:8.1f} {baseline_time / elapsed:8.1f} "
+                  f"{psnr(reference, result):8.1f} {ssim(reference, result):6.3f}")
+
+
+if __name__ == "__main__":
+    main()
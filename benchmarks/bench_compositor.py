@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""Now-playing redraw benchmark: full rebuild vs cached album layer + text panel.
+
+    python benchmarks/bench_compositor.py [--tracks 10]
+"""
+import os
+import sys
+import time
+import argparse
+from PIL import Image, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from compositor import NowPlayingCompositor
+from framebuffer import image_to_pixels
+from fb import get_font, FONT_BOLD, FONT_REGULAR, LOSSLESS_ICON_PATH, HIRES_ICON_PATH
+from _common import make_cover
+
+WIDTH, HEIGHT = 800, 480
+
+
+def make_background(cover):
+    blurred = cover.resize((WIDTH, HEIGHT)).filter(ImageFilter.GaussianBlur(30))
+    overlay = Image.new('RGBA', (WIDTH, HEIGHT), (0, 0, 0, 128))
+    return Image.alpha_composite(blurred.convert('RGBA'), overlay).convert('RGB')
+
+
+def track(i):
+    return {
+        "album_id": "album-1",
+        "thumb_url": None,
+        "title": f"Symphony No. {i} in C minor, Op. {60 + i}: I. Allegro con brio",
+        "artist": "Berliner Philharmoniker, Herbert von Karajan",
+        "album": "Beethoven: The Nine Symphonies",
+        "audioData": "24bit/96.0kHz",
+        "isLossless": True,
+        "isHiRes": True,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=10)
+    args = parser.parse_args()
+
+    cover = make_cover()
+    fonts = (get_font(FONT_BOLD, 36), get_font(FONT_REGULAR, 28), get_font(FONT_REGULAR, 20))
+
+    # Old behaviour: every track change rebuilds background, art and text
+    start = time.perf_counter()
+    for i in range(args.tracks):
+        now_playing = NowPlayingCompositor(WIDTH, HEIGHT, fonts, LOSSLESS_ICON_PATH, HIRES_ICON_PATH)
+        key = now_playing.album_key(track(i))
+        now_playing.build_album_layer(key, cover, make_background(cover))
+        image_to_pixels(now_playing.render_text_panel(now_playing.album_layers[key], track(i)), 16)
+    full = (time.perf_counter() - start) / args.tracks
+
+    now_playing = NowPlayingCompositor(WIDTH, HEIGHT, fonts, LOSSLESS_ICON_PATH, HIRES_ICON_PATH)
+    key = now_playing.album_key(track(0))
+    start = time.perf_counter()
+    now_playing.build_album_layer(key, cover, make_background(cover))
+    now_playing.render(key, track(0))
+    first = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(args.tracks):
+        now_playing.render(key, track(i))
+    cached = (time.perf_counter() - start) / args.tracks
+
+    print(f"full rebuild per track        {full * 1000:8.1f} ms")
+    print(f"first track of album (miss)   {first * 1000:8.1f} ms")
+    print(f"next track, cached layers     {cached * 1000:8.1f} ms")
+    print(f"speedup on track change: {full / cached:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""Mode-switch latency: process respawn (old main.py) vs the resident display service.
+
+Both sides draw to a plain-file framebuffer against the stub Plex server,
+with the clock's weather/wallpaper lookups replaced by offline values so
+no internet access is needed.
+
+    python benchmarks/bench_display_switch.py [--switches 10]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from stub_plex import StubPlex
+
+# Applied in both the respawned children and the resident service
+OFFLINE_PATCH = """
+import Time
+from PIL import Image
+from typography import FALLBACK_FONTS
+import os
+Time.FONT_PATH = next(p for p in FALLBACK_FONTS if os.path.exists(p))
+Time.get_weather = lambda lat, lon, key: (21.0, 'clear sky', '01d', None, None)
+Time.get_bing_wallpaper = lambda: Image.new('RGB', (1920, 1080), 'navy')
+Time.fetch_weather_icon = lambda code, size=(20, 20): None
+"""
+
+RESPAWN_CHILD = OFFLINE_PATCH + """
+import sys
+import fb
+if sys.argv[1] == 'clock':
+    Time.display_time_on_framebuffer(Time.FRAMEBUFFER)
+else:
+    fb.update_now_playing(force=True)
+"""
+
+
+def prepare_workdir(stub):
+    workdir = tempfile.mkdtemp()
+    with open(os.path.join(workdir, "currentlyplaying.json"), "w") as f:
+        json.dump({"event": "media.play", "metadata": {
+            "ratingKey": stub.rating_keys[0], "parentRatingKey": "900", "title": "Track 1",
+            "grandparentTitle": "Stub Artist", "parentTitle": "Stub Album",
+            "thumb": "/library/metadata/900/thumb"}}, f)
+    with open(os.path.join(workdir, "nfc_errors.json"), "w") as f:
+        f.write(json.dumps({"status": "NFC is up!", "timestamp": "2024-01-01 00:00:00"}) + "\n")
+    os.environ.update({
+        "FRAMEBUFFER_DEVICE": os.path.join(workdir, "fb0"),
+        "PLEX_BASE_URL": stub.url,
+        "PLEX_TOKEN": "token",
+        "LAT": "51.5",
+        "LON": "-0.1",
+        "PLAYER_URL": stub.url,
+        "ARTWORK_DISK_CACHE_BYTES": "0",
+        "LIBRARY_DB": os.path.join(workdir, "library.db"),
+        "DISPLAY_SOCKET": os.path.join(workdir, "display.sock"),
+        "STATE_SOCKET": os.path.join(workdir, "state.sock"),
+        "PYTHONPATH": REPO,
+    })
+    return workdir
+
+
+def respawn_switch(mode, workdir):
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", RESPAWN_CHILD, mode], cwd=workdir, check=True,
+                   stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--switches", type=int, default=10)
+    args = parser.parse_args()
+
+    with StubPlex() as stub:
+        workdir = prepare_workdir(stub)
+        os.chdir(workdir)
+        modes = ["nowplaying", "clock"] * ((args.switches + 1) // 2)
+
+        respawn = [respawn_switch(mode, workdir) for mode in modes[:args.switches]]
+
+        exec(OFFLINE_PATCH, {})
+        import displayd
+        service = displayd.DisplayService(socket_path=os.environ["DISPLAY_SOCKET"])
+        threading.Thread(target=service.run, daemon=True).start()
+        while not os.path.exists(service.socket_path):
+            time.sleep(0.01)
+        displayd.show("nowplaying", service.socket_path)  # warm up both screens
+        displayd.show("clock", service.socket_path)
+
+        resident = []
+        for mode in modes[:args.switches]:
+            start = time.perf_counter()
+            displayd.show(mode, service.socket_path)
+            resident.append(time.perf_counter() - start)
+
+    def summary(label, samples):
+        samples = sorted(samples)
+        print(f"{label:<28} median {samples[len(samples) // 2] * 1000:8.1f} ms   max {samples[-1] * 1000:8.1f} ms")
+        return samples[len(samples) // 2]
+
+    old = summary("respawn Time.py / fb.py", respawn)
+    new = summary("resident service switch", resident)
+    print(f"speedup: {old / new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
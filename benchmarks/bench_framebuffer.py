@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""Frame-push benchmark: old fb.py / Time.py write paths vs the mmap framebuffer.
+
+Also times a dirty-rectangle update where only the clock digits change.
+
+Runs against a plain file so it works without a display:
+
+    python benchmarks/bench_framebuffer.py [--frames 20] [--device /dev/fb0]
+"""
+import os
+import sys
+import struct
+import argparse
+import itertools
+import tempfile
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from framebuffer import Framebuffer, rgb_to_rgb565
+from _common import timed
+
+WIDTH, HEIGHT = 800, 480
+
+
+def old_fb_push(path, img):
+    # fb.py before the shared framebuffer module
+    img_data = np.array(img.convert('RGB'))
+    r = (img_data[:, :, 0] >> 3).astype(np.uint16)
+    g = (img_data[:, :, 1] >> 2).astype(np.uint16)
+    b = (img_data[:, :, 2] >> 3).astype(np.uint16)
+    rgb565_image = ((r << 11) | (g << 5) | b).flatten()
+    with open(path, "wb") as fb:
+        fb.write(struct.pack("H" * len(rgb565_image), *rgb565_image))
+
+
+def old_time_push(path, img):
+    # Time.py before the shared framebuffer module (16 bpp branch)
+    img_data = np.array(img, dtype=np.uint8)
+    r, g, b = img_data[:, :, 0], img_data[:, :, 1], img_data[:, :, 2]
+    fb_data = ((r.astype(np.uint16) & 0xF8) << 8) | ((g.astype(np.uint16) & 0xFC) << 3) | (b.astype(np.uint16) >> 3)
+    fb_data = np.array(fb_data, dtype=np.uint16)
+    with open(path, "wb") as fb:
+        fb.write(fb_data.tobytes())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--device", default=None, help="framebuffer path (default: temp file)")
+    args = parser.parse_args()
+
+    path = args.device or os.path.join(tempfile.mkdtemp(), "fb0")
+    rng = np.random.default_rng(0)
+    images = [Image.fromarray(rng.integers(0, 255, (HEIGHT, WIDTH, 3), dtype=np.uint8)) for _ in range(2)]
+    frames565 = [rgb_to_rgb565(np.asarray(img)) for img in images]
+
+    framebuffer = Framebuffer(path, geometry=(WIDTH, HEIGHT, 16))
+    print(f"{path}: {framebuffer.width}x{framebuffer.height} @ {framebuffer.bpp} bpp")
+
+    # Alternate between two frames so every push changes the whole screen
+    image, frame565 = itertools.cycle(images), itertools.cycle(frames565)
+    baseline, _ = timed(lambda: old_fb_push(path, next(image)), args.frames, label="fb.py struct.pack (old)")
+    timed(lambda: old_time_push(path, next(image)), args.frames, label="Time.py open+tobytes (old)")
+    converted, _ = timed(lambda: framebuffer.write_image(next(image)), args.frames,
+                         label="mmap write_image (convert+push)")
+    pushed, _ = timed(lambda: framebuffer.write(next(frame565)), args.frames, label="mmap write (pre-converted)")
+    print(f"speedup vs struct.pack: {baseline / converted:.1f}x convert+push, {baseline / pushed:.1f}x push only")
+
+    # Clock-style update: only a digit-sized box changes between frames
+    clock_frames = [frames565[0].copy() for _ in range(2)]
+    clock_frames[1][380:460, 600:780] ^= 0xFFFF
+    framebuffer.invalidate()
+    framebuffer.update(clock_frames[0])
+    clock_frame = itertools.cycle(clock_frames)
+    timed(lambda: framebuffer.update(next(clock_frame)), args.frames, label="mmap update (clock digits dirty)")
+    framebuffer.update(clock_frames[0])
+    update = framebuffer.update(clock_frames[1])
+    print(f"dirty update wrote {update['bytes_written']} of {framebuffer.frame_bytes} bytes")
+
+    framebuffer.close()
+
+
+if __name__ == "__main__":
+    main()
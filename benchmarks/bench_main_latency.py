@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Card-removal-to-pause latency while the player hangs on playMedia.
+
+A stub player accepts commands but sits on every playMedia request for
+``--hang`` seconds.  A card is tapped (its playMedia hangs), then removed;
+the time until the stub receives the pause is measured for the old
+sequential 100 ms loop and for the asyncio controller:
+
+    python benchmarks/bench_main_latency.py [--hang 3] [--taps 3]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from nfcsim import SimulatedPN532, SimulatedTag, mifare_classic_image
+from nfcreader import NFCReader
+from playerclient import PlayerClient
+from _common import StubPlayer
+
+
+def open_url(url, timeout=1):
+    try:
+        requests.get(url, timeout=timeout)
+    except requests.RequestException:
+        pass
+
+
+def legacy_loop(main, reader, player, stop):
+    # The old main(): one 100 ms loop doing blocking I/O inline
+    last_card_id = None
+    while not stop.is_set():
+        current_card_id, card_uri = reader.current_card()
+        main.check_media_status()
+        if current_card_id:
+            if current_card_id != last_card_id:
+                open_url(card_uri, timeout=10)
+            last_card_id = current_card_id
+        elif last_card_id:
+            open_url(f"{player.url}/player/playback/pause")
+            last_card_id = None
+        time.sleep(0.1)
+
+
+def removal_to_pause(pn532, tag, player, taps):
+    samples = []
+    for _ in range(taps):
+        pn532.present(tag)
+        time.sleep(0.5)  # playMedia is now in flight and hanging
+        player.pause_received.clear()
+        removed = time.monotonic()
+        pn532.remove()
+        player.pause_received.wait(player.hang + 15)
+        samples.append(player.pauses[-1] - removed)
+        time.sleep(player.hang)  # let the hung request drain before the next tap
+    return samples
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hang", type=float, default=3.0, help="seconds the stub holds each playMedia")
+    parser.add_argument("--taps", type=int, default=3)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    player = StubPlayer(hang=args.hang)
+    import main
+
+    tag = SimulatedTag(b'\x01\x02\x03\x04', mifare_classic_image(
+        f"{player.url}/player/playback/playMedia?key=%2Flibrary%2Fmetadata%2F1"))
+
+    pn532 = SimulatedPN532()
+    reader = NFCReader(pn532, poll_interval=0.05)
+    reader.start()
+    stop = threading.Event()
+    threading.Thread(target=legacy_loop, args=(main, reader, player, stop), daemon=True).start()
+    legacy = removal_to_pause(pn532, tag, player, args.taps)
+    stop.set()
+    reader.stop()
+
+    pn532 = SimulatedPN532()
+    reader = NFCReader(pn532, poll_interval=0.05)
+    controller = main.Controller(reader, player=PlayerClient(player.url), scripts=(),
+                                 show=lambda mode: None, media_status=lambda: None,
+                                 state_socket=os.path.join(os.getcwd(), "state.sock"))
+    threading.Thread(target=asyncio.run, args=(controller.run(),), daemon=True).start()
+    controller_samples = removal_to_pause(pn532, tag, player, args.taps)
+
+    def summary(label, samples):
+        print(f"{label:<28} max {max(samples) * 1000:8.1f} ms   "
+              f"mean {sum(samples) / len(samples) * 1000:8.1f} ms")
+
+    print(f"playMedia hangs for {args.hang:.1f} s on every tap")
+    summary("sequential 100 ms loop", legacy)
+    summary("asyncio controller", controller_samples)
+    latency = controller.player.latency
+    print("player command latency: " + ", ".join(
+        f"{name} n={histogram.count} mean {histogram.sum / histogram.count * 1000:.1f} ms"
+        for name, histogram in latency.items() if histogram.count))
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Stats counters under contention: the old shared dict vs per-thread metrics.
+
+Several threads count webhook events by type at full speed, as request
+handlers and the state worker do.  Compares the old unsynchronised
+``stats['events'][event] += 1``, the same dict behind a lock, and
+metrics.Counter (one shard per thread), for throughput and for counts
+lost to races.  Also times histogram observations and a /metrics render:
+
+    python benchmarks/bench_metrics.py [--threads 8] [--increments 200000]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import Registry, FAST_BUCKETS
+
+EVENTS = ("media.play", "media.pause", "media.resume", "media.stop", "media.scrobble")
+
+
+def hammer(threads, increments, work):
+    barrier = threading.Barrier(threads + 1)
+
+    def run(index):
+        barrier.wait()
+        for i in range(increments):
+            work(EVENTS[(i + index) % len(EVENTS)])
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--increments", type=int, default=200000)
+    parser.add_argument("--switch-interval", type=float, default=1e-6,
+                        help="sys.setswitchinterval; small values make thread switches (and races) frequent")
+    args = parser.parse_args()
+    sys.setswitchinterval(args.switch_interval)
+    expected = args.threads * args.increments
+
+    def report(label, elapsed, counted):
+        print(f"{label:<28} {expected / elapsed / 1e6:6.2f} M inc/s   counted {counted:9d} / {expected}"
+              f"   lost {expected - counted}")
+
+    events = defaultdict(int)
+
+    def shared_dict(event):
+        events[event] += 1
+
+    report("shared dict (old stats)", hammer(args.threads, args.increments, shared_dict), sum(events.values()))
+
+    locked = defaultdict(int)
+    lock = threading.Lock()
+
+    def locked_dict(event):
+        with lock:
+            locked[event] += 1
+
+    report("dict + lock", hammer(args.threads, args.increments, locked_dict), sum(locked.values()))
+
+    registry = Registry()
+    counter = registry.counter('webhook_events_total', 'Webhook events by type', label='event')
+    report("metrics.Counter", hammer(args.threads, args.increments, counter.inc), sum(counter.totals().values()))
+
+    histogram = registry.histogram('webhook_handle_seconds', 'Webhook handling time', buckets=FAST_BUCKETS)
+    elapsed = hammer(args.threads, args.increments, lambda event: histogram.observe(0.0004))
+    print(f"{'metrics.Histogram.observe':<28} {expected / elapsed / 1e6:6.2f} M obs/s   "
+          f"counted {histogram.total().count:9d} / {expected}")
+
+    start = time.perf_counter()
+    text = registry.render()
+    print(f"/metrics render: {(time.perf_counter() - start) * 1000:.2f} ms, {len(text.splitlines())} lines "
+          f"from {args.threads + 1} thread shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""NDEF parser fuzzing and throughput over a corpus of Plex tag dumps.
+
+The corpus mirrors what tag-writing apps put on Plex cards: a bare URI
+record, URI plus Android Application Record, smart posters, records with
+IDs, long and chunked records, and lock-control TLVs ahead of the message.
+Every dump must decode to its URI; then random mutations (bit flips,
+truncation, insertions) must only ever yield a string or None.
+
+    python benchmarks/bench_ndef.py [--fuzz 20000] [--seed 1]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nfc
+import ndef
+from nfcsim import uri_record, ndef_tlv
+
+SERVER = "0123456789abcdef0123456789abcdef01234567"
+PLEX_URIS = [
+    f"https://listen.plex.tv/player/playback/playMedia?uri=server%3A%2F%2F{SERVER}"
+    f"%2Fcom.plexapp.plugins.library%2Flibrary%2Fmetadata%2F{key}&key=%2Flibrary%2Fmetadata%2F{key}&offset=0"
+    for key in (7, 4821, 123456)
+] + [
+    f"https://listen.plex.tv/player/playback/playMedia?uri=server%3A%2F%2F{SERVER}"
+    f"%2Fcom.plexapp.plugins.library%2Fplaylists%2F98765%2Fitems&shuffle=1&repeat=2" + "&x=" + "y" * 200,
+]
+
+
+def record(tnf, record_type, payload, record_id=b'', mb=True, me=True, cf=False, short=None):
+    short = len(payload) < 256 if short is None else short
+    flags = tnf | (ndef.FLAG_MB if mb else 0) | (ndef.FLAG_ME if me else 0) | (ndef.FLAG_CF if cf else 0)
+    flags |= (ndef.FLAG_SR if short else 0) | (ndef.FLAG_IL if record_id else 0)
+    header = bytes([flags, len(record_type)])
+    header += bytes([len(payload)]) if short else len(payload).to_bytes(4, 'big')
+    header += bytes([len(record_id)]) if record_id else b''
+    return header + record_type + record_id + payload
+
+
+def uri_payload(uri):
+    encoded = uri_record(uri)
+    return encoded[4:] if encoded[0] & ndef.FLAG_SR else encoded[7:]
+
+
+def corpus():
+    dumps = []
+    for uri in PLEX_URIS:
+        payload = uri_payload(uri)
+        aar = record(ndef.TNF_EXTERNAL, b'android.com:pkg', b'com.plexapp.android', mb=False)
+        title = record(ndef.TNF_WELL_KNOWN, b'T', b'\x02enMy album', me=False)
+        messages = [
+            record(ndef.TNF_WELL_KNOWN, b'U', payload),
+            record(ndef.TNF_WELL_KNOWN, b'U', payload, me=False) + aar,
+            record(ndef.TNF_WELL_KNOWN, b'Sp', title + record(ndef.TNF_WELL_KNOWN, b'U', payload, mb=False)),
+            record(ndef.TNF_WELL_KNOWN, b'U', payload, record_id=b'plex-card-1'),
+            record(ndef.TNF_WELL_KNOWN, b'U', payload, short=False),
+            record(ndef.TNF_WELL_KNOWN, b'U', payload[:40], me=False, cf=True)
+            + record(ndef.TNF_UNCHANGED, b'', payload[40:], mb=False),
+        ]
+        if len(uri) < 256:  # an absolute URI lives in the 1-byte-length type field
+            messages.append(record(ndef.TNF_ABSOLUTE_URI, uri.encode(), b''))
+        for message in messages:
+            dumps.append((ndef_tlv(message), uri))
+            # Lock control TLV and NULL padding ahead of the NDEF TLV
+            dumps.append((b'\x01\x03\xa0\x10\x44\x00\x00' + ndef_tlv(message), uri))
+    return dumps
+
+
+def old_parse_ndef_message(ndef_data):
+    if ndef_data[0] != nfc.TLV_TAG_NDEF:
+        return None
+    ndef_start = 4 if ndef_data[1] == 0xFF else 2
+    record = ndef_data[ndef_start:]
+    if len(record) < 3:
+        return None
+    type_length = record[1]
+    if len(record) < 3 + type_length:
+        return None
+    if record[3:3 + type_length] == b'U':
+        payload = record[3 + type_length:]
+        prefixes = {0x00: '', 0x01: 'http://www.', 0x02: 'https://www.', 0x03: 'http://', 0x04: 'https://'}
+        uri = prefixes.get(payload[0], '') + payload[1:].decode('utf-8', errors='ignore')
+        return uri.replace("@", "").replace("https://listen.plex.tv", "http://localhost:32500")
+    return None
+
+
+def mutate(data, rng):
+    data = bytearray(data)
+    for _ in range(rng.randint(1, 4)):
+        choice = rng.random()
+        if choice < 0.5 and data:
+            data[rng.randrange(len(data))] ^= 1 << rng.randrange(8)
+        elif choice < 0.7 and data:
+            del data[rng.randrange(len(data)):]
+        elif choice < 0.85:
+            data.insert(rng.randrange(len(data) + 1), rng.randrange(256))
+        elif data:
+            data[rng.randrange(len(data))] = rng.choice((0x00, 0xFF, 0xFE, 0x03))
+    return bytes(data)
+
+
+def throughput(label, parse, dumps, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for data, _ in dumps:
+            parse(data)
+    elapsed = time.perf_counter() - start
+    count = repeat * len(dumps)
+    print(f"{label:<30} {count / elapsed:10.0f} messages/s  "
+          f"{repeat * sum(len(d) for d, _ in dumps) / elapsed / 1e6:6.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--fuzz", type=int, default=20000, help="number of mutated dumps")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    dumps = corpus()
+    old_ok = 0
+    for data, uri in dumps:
+        expected = nfc.local_play_uri(uri)
+        result = nfc.parse_ndef_message(data)
+        assert result == expected, (data[:16], result)
+        try:
+            old_ok += old_parse_ndef_message(data) == expected
+        except (IndexError, ValueError):
+            pass
+    print(f"corpus: {len(dumps)} dumps, new parser {len(dumps)}/{len(dumps)}, old parser {old_ok}/{len(dumps)}")
+
+    rng = random.Random(args.seed)
+    decoded = 0
+    for _ in range(args.fuzz):
+        data, _ = rng.choice(dumps)
+        result = nfc.parse_ndef_message(mutate(data, rng))
+        assert result is None or isinstance(result, str), result
+        decoded += result is not None
+    print(f"fuzz: {args.fuzz} mutated dumps, no crashes, {decoded} still decoded to a URI")
+
+    throughput("old parser (1 short record)", lambda d: old_parse_ndef_message(d) if d[0] == 3 else None,
+               dumps, args.repeat)
+    throughput("ndef parser", nfc.parse_ndef_message, dumps, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Player commands: one requests.get per gesture vs the pooled, coalescing PlayerClient.
+
+Replays bursts of touch gestures (skips and play/pause toggles) against a
+local stub player with a small per-request delay, and counts requests,
+TCP connections and time until the burst has been sent:
+
+    python benchmarks/bench_playerclient.py [--gestures 40] [--latency 0.02]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from playerclient import PlayerClient
+from _common import StubPlayer
+
+
+def gestures(count, seed):
+    rng = random.Random(seed)
+    return [rng.choice(("skipNext", "skipNext", "skipPrevious", "playPause")) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--gestures", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.02, help="stub player response time")
+    parser.add_argument("--gap", type=float, default=0.005, help="seconds between gestures")
+    args = parser.parse_args()
+
+    stub = StubPlayer(latency=args.latency)
+    burst = gestures(args.gestures, 1)
+
+    # Old touch.py: blocking request per gesture, new connection each time
+    start = time.perf_counter()
+    for name in burst:
+        requests.get(f"{stub.url}/player/playback/{name}", timeout=5)
+        time.sleep(args.gap)
+    old_time = time.perf_counter() - start
+    old = (stub.requests, stub.connections)
+
+    stub.reset()
+    client = PlayerClient(stub.url)
+    start = time.perf_counter()
+    for name in burst:
+        client.command(name)
+        time.sleep(args.gap)
+    enqueue_done = time.perf_counter() - start
+    client.flush()
+    new_time = time.perf_counter() - start
+
+    print(f"{args.gestures} gestures, player answers in {args.latency * 1000:.0f} ms")
+    print(f"requests.get per gesture   {old[0]:4d} requests {old[1]:3d} connections {old_time * 1000:8.1f} ms")
+    print(f"PlayerClient               {stub.requests:4d} requests {stub.connections:3d} connections "
+          f"{new_time * 1000:8.1f} ms (gesture loop never blocked: {enqueue_done * 1000:.1f} ms)")
+    print(f"client stats: {client.stats}")
+    for name, histogram in client.latency.items():
+        print(f"  {name:<14} n={histogram.count:3d}  p50 <= {histogram.quantile(0.5) * 1000:6.0f} ms"
+              f"  p99 <= {histogram.quantile(0.99) * 1000:6.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
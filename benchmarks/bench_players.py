@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""Several DAPs on one Plex server: a listener per DAP vs one listener routing by player.
+
+Dozens of simulated players send a Plex-shaped webhook mix (bench_webhook's
+payloads, JPEG thumbnails on play).  Some of the players are DAPs.  Compares
+the CPU it takes to ingest the stream:
+
+  - one listener per DAP, each decoding every payload (the listener before
+    routing);
+  - one listener per DAP, each dropping other players' events early;
+  - a single listener with every DAP in its player table.
+
+Then checks the routing: each DAP's state bus subscriber and snapshot file
+must see exactly that DAP's states, in order.  Also times player lookups
+against table size:
+
+    python benchmarks/bench_players.py [--players 48] [--daps 12] [--requests 3000]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+from types import SimpleNamespace
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORKDIR = tempfile.mkdtemp()
+os.environ.update(ARTWORK_CACHE_DIR=os.path.join(WORKDIR, "image_cache"),
+                  METRICS_DIR=os.path.join(WORKDIR, "metrics"),
+                  PLAYERS_FILE=os.path.join(WORKDIR, "players.json"),
+                  STATE_SOCKET=os.path.join(WORKDIR, "state.sock"),
+                  SNAPSHOT_FILE=os.path.join(WORKDIR, "currentlyplaying.json"))
+os.chdir(WORKDIR)
+
+from bench_webhook import plex_payload
+from stub_plex import make_jpeg
+import webhooklistener
+from webhooklistener import read_payload, iter_body, apply_event, UnknownPlayer, ThumbnailSink, STATE_EVENTS
+from multipart import MultipartParser, BufferSink, boundary_from
+from playertable import PlayerTable, PlayerRoute
+from snapshot import read_seq
+from _common import timed
+
+
+def split_request(request):
+    head, _, body = request.partition(b'\r\n\r\n')
+    headers = {}
+    for line in head.decode('latin-1').split('\r\n')[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return headers, body
+
+
+def reader_for(body):
+    reader = asyncio.StreamReader()
+    reader.feed_data(body)
+    reader.feed_eof()
+    return reader
+
+
+async def read_payload_before(reader, headers, title):
+    # webhooklistener.read_payload before routing: every payload is decoded
+    fields = {}
+
+    def payload():
+        if 'data' not in fields and 'payload' in fields:
+            fields['data'] = json.loads(fields['payload'].getvalue())
+        return fields.get('data')
+
+    def on_part(part):
+        if part.name == 'payload':
+            fields['payload'] = BufferSink(webhooklistener.MAX_PAYLOAD)
+            return fields['payload']
+        data = payload()
+        if part.name == 'thumb' and data.get('event') in webhooklistener.THUMBNAIL_EVENTS \
+                and data.get('Player', {}).get('title') == title:
+            fields['thumb'] = ThumbnailSink(webhooklistener.MAX_THUMBNAIL)
+            return fields['thumb']
+        return None
+
+    parser = MultipartParser(boundary_from(headers['content-type']), on_part)
+    async for chunk in iter_body(reader, headers):
+        parser.feed(chunk)
+    parser.close()
+    return payload()
+
+
+async def ingest_before(requests, title):
+    decoded = 0
+    for headers, body in requests:
+        await read_payload_before(reader_for(body), headers, title)
+        decoded += 1
+    return decoded
+
+
+async def ingest(requests, table):
+    decoded = 0
+    for headers, body in requests:
+        try:
+            await read_payload(reader_for(body), headers, table)
+            decoded += 1
+        except UnknownPlayer:
+            pass
+    return decoded
+
+
+async def decode(requests, table):
+    decoded = []
+    for headers, body in requests:
+        try:
+            decoded.append((await read_payload(reader_for(body), headers, table))[0])
+        except UnknownPlayer:
+            pass
+    return decoded
+
+
+def cpu_time(coroutine):
+    return timed(lambda: asyncio.run(coroutine), warmup=False, clock=time.process_time)
+
+
+def subscribe(route, received, expected, done):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(route.state_bus.socket_path)
+        client.settimeout(10)
+        for line in client.makefile('rb'):
+            received.append(json.loads(line))
+            if len(received) == expected:
+                break
+    done.release()
+
+
+def lookup_ns(size, daps, repeat=200000):
+    routes = [SimpleNamespace(uuid=uuid.UUID(int=10 ** 6 + i).hex, title=None) for i in range(size)]
+    table = PlayerTable(routes)
+    player = {"title": "x", "uuid": routes[-1].uuid}
+    start = time.perf_counter()
+    for _ in range(repeat):
+        table.lookup(player)
+    by_uuid = (time.perf_counter() - start) / repeat * 1e9
+    start = time.perf_counter()
+    for _ in range(repeat):
+        next((route for route in routes if route.uuid == player["uuid"]), None)
+    scan = (time.perf_counter() - start) / repeat * 1e9
+    return by_uuid, scan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=48)
+    parser.add_argument("--daps", type=int, default=12)
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    rng = random.Random(1)
+    players = [{"local": True, "publicAddress": "10.0.0.1", "title": f"player-{i}", "uuid": uuid.UUID(int=i).hex}
+               for i in range(args.players)]
+    daps = players[:args.daps]
+    thumbnails = [make_jpeg(rng.choice((300, 400, 600)), seed) for seed in range(8)]
+    requests = [split_request(plex_payload(rng, players, thumbnails)) for _ in range(args.requests)]
+    size = sum(len(body) for _, body in requests) / len(requests)
+    print(f"{args.requests} webhooks from {args.players} players ({size / 1024:.1f} KB avg), {args.daps} of them DAPs")
+
+    def route_for(player, table):
+        return PlayerRoute(player["title"], uuid=player["uuid"],
+                           state_socket=os.path.join(WORKDIR, f"{table}-{player['title']}.sock"),
+                           snapshot_file=os.path.join(WORKDIR, f"{table}-{player['title']}.json"))
+
+    def report(label, seconds, decoded):
+        print(f"{label:<36} {seconds * 1000:8.1f} ms CPU  {seconds / args.requests * 1e6:7.1f} us/webhook"
+              f"   payloads decoded {decoded:6d}")
+
+    seconds = decoded = 0
+    for dap in daps:
+        elapsed, count = cpu_time(ingest_before(requests, dap["title"]))
+        seconds, decoded = seconds + elapsed, decoded + count
+    report(f"{args.daps} listeners, decode everything", seconds, decoded)
+
+    seconds = decoded = 0
+    for dap in daps:
+        elapsed, count = cpu_time(ingest(requests, PlayerTable([route_for(dap, "single")])))
+        seconds, decoded = seconds + elapsed, decoded + count
+    report(f"{args.daps} listeners, drop early", seconds, decoded)
+
+    table = PlayerTable([route_for(dap, "shared") for dap in daps])
+    report(f"1 listener, {args.daps} players routed", *cpu_time(ingest(requests, table)))
+
+    # Route the state events and check what each DAP's subscriber and snapshot saw
+    expected = {dap["uuid"]: 0 for dap in daps}
+    routed = [data for data in asyncio.run(decode(requests, table)) if data["event"] in STATE_EVENTS]
+    for data in routed:
+        expected[data["Player"]["uuid"]] += 1
+    table.start()
+    received = {route.uuid: [] for route in table.routes}
+    done = threading.Semaphore(0)
+    for route in table.routes:
+        threading.Thread(target=subscribe, args=(route, received[route.uuid], expected[route.uuid], done),
+                         daemon=True).start()
+    time.sleep(0.2)
+    start = time.perf_counter()
+    for data in routed:
+        apply_event(table.lookup(data["Player"]), data)
+    for _ in table.routes:
+        done.acquire(timeout=10)
+    elapsed = time.perf_counter() - start
+    table.flush()
+
+    misrouted = out_of_order = stale_snapshots = 0
+    for route in table.routes:
+        states = received[route.uuid]
+        misrouted += sum(state["player"]["uuid"] != route.uuid for state in states)
+        out_of_order += [state["seq"] for state in states] != list(range(1, len(states) + 1))
+        stale_snapshots += read_seq(route.snapshot_writer.path) != expected[route.uuid]
+    delivered = sum(map(len, received.values()))
+    print(f"routing: {delivered} / {len(routed)} states delivered to {args.daps} subscribers in "
+          f"{elapsed * 1000:.0f} ms, misrouted {misrouted}, out of order {out_of_order}, "
+          f"stale snapshots {stale_snapshots}, writes {table.snapshot_stats()['writes']}")
+
+    for size in (1, args.players, 1000):
+        by_uuid, scan = lookup_ns(size, args.daps)
+        print(f"lookup among {size:5d} players: table {by_uuid:6.0f} ns   list scan {scan:8.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
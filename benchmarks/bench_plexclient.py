@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""Track metadata lookup benchmark against the local stub Plex server.
+
+Compares the old fb.py lookup (fresh connection, whole listing parsed
+with ET.fromstring, linear scan) with PlexClient's direct metadata fetch,
+its streaming iterparse fallback, and concurrent lookups of one key.
+
+    python benchmarks/bench_plexclient.py [--tracks 2000] [--repeat 20]
+"""
+import os
+import sys
+import argparse
+import threading
+import xml.etree.ElementTree as ET
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_plex import StubPlex
+from plexclient import PlexClient
+from _common import timed
+
+
+def old_lookup(url, rating_key):
+    response = requests.get(url, timeout=5)
+    root = ET.fromstring(response.content)
+    for track in root.findall("Track"):
+        if track.get("ratingKey") == rating_key:
+            return track
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tracks", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with StubPlex(tracks=args.tracks) as stub:
+        listing = f"{stub.url}/status/sessions"
+        client = PlexClient(stub.url, "token")
+        early, late = stub.rating_keys[5], stub.rating_keys[-1]
+
+        baseline, _ = timed(lambda: old_lookup(listing, early), args.repeat, label="old: fresh GET + fromstring + scan")
+        direct, _ = timed(lambda: client.get_track(early), args.repeat, label="client: /library/metadata/{key}")
+        timed(lambda: client.find_track(listing, early), args.repeat, label="client: iterparse, early match")
+        timed(lambda: client.find_track(listing, late), args.repeat, label="client: iterparse, last item")
+        print(f"direct lookup speedup: {baseline / direct:.1f}x")
+
+        stub.latency = 0.05
+        before = client.stats['requests']
+        threads = [threading.Thread(target=client.get_track, args=(early,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(f"8 concurrent lookups of one key -> {client.stats['requests'] - before} request(s), "
+              f"{client.stats['coalesced']} coalesced")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""Track-change latency: cold fetch+render vs a frame pre-rendered by QueuePrefetcher.
+
+Runs fb.py's render path against the local stub Plex server:
+
+    python benchmarks/bench_prefetch.py [--latency 0.05]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_plex import StubPlex
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="stub response delay in seconds")
+    parser.add_argument("--lookahead", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    with StubPlex(latency=args.latency) as stub:
+        os.environ["FRAMEBUFFER_DEVICE"] = os.path.join(workdir, "fb0")
+        os.environ["PLEX_BASE_URL"] = stub.url
+        os.environ["ARTWORK_DISK_CACHE_BYTES"] = "0"
+        import fb
+        from prefetch import QueuePrefetcher
+
+        prefetcher = QueuePrefetcher(stub.url, "token", fb.prerender_track, player_url=stub.url,
+                                     lookahead=args.lookahead)
+        play_queue = prefetcher.fetch_upcoming_tracks(prefetcher.fetch_play_queue_id())
+
+        # Cold path: what a track change costs without prefetching
+        cold_track = play_queue[-1]
+        start = time.perf_counter()
+        fb.prerender_track(cold_track)
+        cold = time.perf_counter() - start
+
+        fb.artwork_cache.entries.clear()
+        fb.compositor = None
+        start = time.perf_counter()
+        prefetcher.refresh()
+        prefetcher.executor.shutdown(wait=True)
+        warmup = time.perf_counter() - start
+
+        next_track_id = play_queue[0].get("ratingKey")
+        start = time.perf_counter()
+        frame = prefetcher.get_frame(next_track_id)
+        hit = time.perf_counter() - start
+
+    print(f"cold track change (fetch + render)   {cold * 1000:8.1f} ms")
+    print(f"background pre-render of {args.lookahead} tracks    {warmup * 1000:8.1f} ms")
+    print(f"prefetched track change (lookup)     {hit * 1000:8.3f} ms  frame={'yes' if frame is not None else 'no'}")
+    print(f"prefetcher stats: {prefetcher.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Presence detector: debounce on a scripted flaky tag, and polls per minute over a simulated night.
+
+Runs NFCReader against a scripted fake PN532 with a simulated clock, so
+the overnight run takes a moment:
+
+    python benchmarks/bench_presence.py [--hours 8]
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nfcsim import SimulatedPN532, SimulatedTag, mifare_classic_image
+from nfcreader import NFCReader
+
+URI = "https://listen.plex.tv/player/playback/playMedia?key=%2Flibrary%2Fmetadata%2F1"
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def flaky_tag():
+    tag = SimulatedTag(b'\x01\x02\x03\x04', mifare_classic_image(URI))
+    pn532 = SimulatedPN532()
+    reader = NFCReader(pn532, clock=Clock())
+    # Tag sliding onto the reader, dropping out for single polls, then lifted off
+    pn532.script([None, tag, tag, None, tag, tag, tag, None, tag, None, None, None])
+    events = [reader.poll() for _ in range(12)]
+    kinds = [event.kind for event in events if event is not None]
+    print(f"flaky tag: {kinds}, flaps suppressed: {reader.stats['debounced']}")
+    assert kinds == ["present", "removed"], kinds
+
+
+def night(hours):
+    tag = SimulatedTag(b'\x01\x02\x03\x04', mifare_classic_image(URI))
+    clock = Clock()
+    pn532 = SimulatedPN532()
+    reader = NFCReader(pn532, poll_timeout=0, clock=clock)
+    # Evening: play an album for 45 minutes, then the reader sits empty
+    busy, idle_per_minute = [], []
+    end = hours * 3600
+    pn532.present(tag)
+    while clock.now < end:
+        if clock.now >= 45 * 60 and pn532.tag is not None:
+            pn532.remove()
+        reader.poll()
+        clock.now += reader.next_interval()
+        if clock.now < 45 * 60 and int(clock.now) % 600 == 0:
+            busy.append(reader.transactions_per_minute())
+        elif clock.now > end - 60:
+            idle_per_minute.append(reader.transactions_per_minute())
+
+    fixed = 60 / 0.1
+    print(f"fixed 100 ms polling        {fixed:6.0f} transactions/min, {fixed * 60 * hours:8.0f} over {hours} h")
+    print(f"adaptive, card present      {max(busy):6.0f} transactions/min")
+    print(f"adaptive, idle reader       {idle_per_minute[-1]:6.0f} transactions/min")
+    print(f"adaptive total              {reader.pn532.total:8.0f} over {hours} h")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--hours", type=float, default=8)
+    args = parser.parse_args()
+    flaky_tag()
+    night(args.hours)
+
+
+if __name__ == "__main__":
+    main()
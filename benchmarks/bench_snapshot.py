@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""currentlyplaying.json: in-place indent=2 rewrite per event vs the write-behind SnapshotWriter.
+
+Replays bursts of pause/resume events (as a flaky Bluetooth sink or a
+fidgety user produces) while a reader thread loads the file in a tight
+loop, then compares file writes, bytes written, torn reads seen by the
+reader, and the cost of checking an unchanged snapshot:
+
+    python benchmarks/bench_snapshot.py [--bursts 10] [--burst-size 8]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from snapshot import SnapshotWriter, read_seq
+
+METADATA = {
+    "librarySectionType": "artist", "ratingKey": "12345", "key": "/library/metadata/12345",
+    "parentRatingKey": "12300", "grandparentRatingKey": "12000", "type": "track",
+    "title": "Track", "grandparentTitle": "Artist", "parentTitle": "Album", "summary": "x" * 800,
+    "thumb": "/library/metadata/12300/thumb/1700000000", "Genre": [{"tag": "Rock"}],
+}
+
+
+def states(bursts, burst_size):
+    seq = 0
+    for _ in range(bursts):
+        burst = []
+        for i in range(burst_size):
+            seq += 1
+            burst.append({"event": "media.pause" if i % 2 else "media.resume",
+                          "player": {"title": "dap", "uuid": "abc"}, "metadata": METADATA,
+                          "timestamp": "2024-01-01T00:00:00", "seq": seq})
+        yield burst
+
+
+def reader(path, stop, counts):
+    while not stop.is_set():
+        try:
+            with open(path) as f:
+                json.load(f)
+            counts['ok'] += 1
+        except FileNotFoundError:
+            pass
+        except json.JSONDecodeError:
+            counts['torn'] += 1
+
+
+def replay(path, args, write):
+    stop = threading.Event()
+    counts = {'ok': 0, 'torn': 0}
+    thread = threading.Thread(target=reader, args=(path, stop, counts), daemon=True)
+    thread.start()
+    for burst in states(args.bursts, args.burst_size):
+        for state in burst:
+            write(state)
+            time.sleep(args.event_gap)
+        time.sleep(args.burst_gap)
+    stop.set()
+    thread.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bursts", type=int, default=10)
+    parser.add_argument("--burst-size", type=int, default=8)
+    parser.add_argument("--event-gap", type=float, default=0.02)
+    parser.add_argument("--burst-gap", type=float, default=0.8)
+    args = parser.parse_args()
+    events = args.bursts * args.burst_size
+    workdir = tempfile.mkdtemp()
+
+    old_path = os.path.join(workdir, "old.json")
+    old = {'writes': 0, 'bytes_written': 0}
+
+    def write_in_place(state):
+        # webhooklistener.write_current_playing before the write-behind writer
+        with open(old_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        old['writes'] += 1
+        old['bytes_written'] += os.path.getsize(old_path)
+
+    old_reads = replay(old_path, args, write_in_place)
+
+    new_path = os.path.join(workdir, "new.json")
+    writer = SnapshotWriter(new_path)
+    new_reads = replay(new_path, args, writer.update)
+    writer.flush()
+    new = writer.stats
+
+    with open(new_path) as f:
+        last_seq = json.load(f)['seq']
+    assert last_seq == events, (last_seq, events)
+
+    print(f"{events} events in {args.bursts} bursts of {args.burst_size}, {args.event_gap * 1000:.0f} ms apart")
+    print(f"in place, indent=2   {old['writes']:4d} writes  {old['bytes_written'] / 1024:7.1f} KB  "
+          f"torn reads {old_reads['torn']:5d} / {old_reads['ok'] + old_reads['torn']}")
+    print(f"SnapshotWriter       {new['writes']:4d} writes  {new['bytes_written'] / 1024:7.1f} KB  "
+          f"torn reads {new_reads['torn']:5d} / {new_reads['ok'] + new_reads['torn']}  "
+          f"(coalesced {new['coalesced']}, last seq {last_seq})")
+
+    repeat = 2000
+    start = time.perf_counter()
+    for _ in range(repeat):
+        with open(new_path) as f:
+            json.load(f)
+    parse = (time.perf_counter() - start) / repeat
+    start = time.perf_counter()
+    for _ in range(repeat):
+        read_seq(new_path)
+    seq_only = (time.perf_counter() - start) / repeat
+    print(f"unchanged check: json.load {parse * 1e6:6.1f} us   read_seq {seq_only * 1e6:6.1f} us")
+
+
+if __name__ == "__main__":
+    main()
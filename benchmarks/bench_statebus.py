@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Now-playing change latency: polling currentlyplaying.json vs the pushed state bus.
+
+Publishes a series of states through the webhook listener's path (bus
+publish + snapshot write) while a 100 ms poller (old main.py), a 1 s poller
+(old fb.py) and bus subscribers measure when they noticed each change:
+
+    python benchmarks/bench_statebus.py [--states 20] [--subscribers 2]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import statebus
+
+
+def poller(path, interval, seen, stop):
+    last_mtime = None
+    while not stop.is_set():
+        try:
+            mtime = os.path.getmtime(path)
+            if mtime != last_mtime:
+                last_mtime = mtime
+                with open(path) as f:
+                    seen.append((json.load(f)['sent'], time.monotonic()))
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            pass
+        time.sleep(interval)
+
+
+def subscriber(socket_path, seen):
+    for state in statebus.iter_states(socket_path, reconnect_delay=0.05):
+        seen.append((state['sent'], time.monotonic()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--states", type=int, default=20)
+    parser.add_argument("--subscribers", type=int, default=2)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    snapshot = os.path.join(workdir, "currentlyplaying.json")
+    bus = statebus.StateBus(os.path.join(workdir, "state.sock"))
+    bus.start()
+
+    stop = threading.Event()
+    polled_fast, polled_slow = [], []
+    pushed = [[] for _ in range(args.subscribers)]
+    threading.Thread(target=poller, args=(snapshot, 0.1, polled_fast, stop), daemon=True).start()
+    threading.Thread(target=poller, args=(snapshot, 1.0, polled_slow, stop), daemon=True).start()
+    for seen in pushed:
+        threading.Thread(target=subscriber, args=(bus.socket_path, seen), daemon=True).start()
+    while len(bus.clients) < args.subscribers:
+        time.sleep(0.01)
+
+    rng = random.Random(1)
+    for _ in range(args.states):
+        state = bus.publish({"event": "media.play", "metadata": {"ratingKey": "1"}, "sent": time.monotonic()})
+        with open(snapshot, "w") as f:
+            json.dump(state, f, indent=2)
+        time.sleep(rng.uniform(0.5, 1.5))
+    stop.set()
+
+    def summary(label, seen):
+        delays = sorted(received - sent for sent, received in seen)
+        print(f"{label:<26} saw {len(seen):3d}/{args.states}  median {delays[len(delays) // 2] * 1000:8.2f} ms"
+              f"   max {delays[-1] * 1000:8.2f} ms")
+
+    summary("poll every 100 ms", polled_fast)
+    summary("poll every 1 s", polled_slow)
+    for index, seen in enumerate(pushed):
+        summary(f"state bus subscriber {index + 1}", seen)
+
+
+if __name__ == "__main__":
+    main()
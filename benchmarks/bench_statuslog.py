@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Latest NFC status: parsing all of nfc_errors.json vs StatusLog.latest().
+
+Fills logs of increasing length with up/down status lines and times the
+old Time.get_latest_nfc_error (parse every line, max by timestamp)
+against the tail read, then checks that rotation keeps the log bounded
+and the latest status readable:
+
+    python benchmarks/bench_statuslog.py [--lines 1000 10000 100000]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from nfcstatus import StatusLog
+from _common import timed
+
+
+def old_get_latest_nfc_error(path):
+    # Time.get_latest_nfc_error before the status log
+    try:
+        with open(path, 'r') as f:
+            error_logs = [json.loads(line) for line in f.readlines()]
+        if not error_logs:
+            return None, None
+        latest_log = max(error_logs, key=lambda x: datetime.strptime(x['timestamp'], '%Y-%m-%d %H:%M:%S'))
+        return latest_log['status'], latest_log['timestamp']
+    except FileNotFoundError:
+        return None, None
+    except json.JSONDecodeError:
+        return None, None
+
+
+def fill(path, lines):
+    start = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+    with open(path, 'w') as f:
+        for i in range(lines):
+            status = "NFC is down!" if i % 2 else "NFC is up!"
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start + i))
+            f.write(json.dumps({"status": status, "timestamp": stamp}) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    print(f"{'lines':>8} {'size':>9} {'parse all':>12} {'tail read':>12} {'cached':>12}")
+    for lines in args.lines:
+        path = os.path.join(workdir, f"nfc_errors_{lines}.json")
+        fill(path, lines)
+        old_time, old = timed(lambda: old_get_latest_nfc_error(path), args.repeat, warmup=False)
+        log = StatusLog(path, max_bytes=float("inf"))
+        tail_time, new = timed(lambda: StatusLog(path).latest(), args.repeat, warmup=False)
+        log.latest()
+        cached_time, _ = timed(log.latest, args.repeat * 100, warmup=False)
+        assert old == new, (old, new)
+        print(f"{lines:8d} {os.path.getsize(path) / 1024:7.0f}KB {old_time * 1000:9.2f} ms "
+              f"{tail_time * 1000:9.3f} ms {cached_time * 1000:9.4f} ms")
+
+    path = os.path.join(workdir, "rotating.json")
+    log = StatusLog(path, max_bytes=4096)
+    for i in range(1000):
+        log.append("NFC is down!" if i % 2 else "NFC is up!", is_error=bool(i % 2))
+    log.append("NFC is up!")
+    size, backup = os.path.getsize(path), os.path.getsize(f"{path}.1")
+    status, _ = log.latest()
+    print(f"1001 appends with max_bytes=4096: {size} B + {backup} B backup, latest {status!r}")
+    assert size <= 4096 and backup <= 4096 + 128 and status == "NFC is up!"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""Word-wrap and font-load microbenchmark on long classical-album titles.
+
+    python benchmarks/bench_typography.py [--repeat 20]
+"""
+import os
+import sys
+import argparse
+from PIL import ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from typography import get_font, wrap_text, FALLBACK_FONTS
+from _common import timed
+
+TITLES = [
+    "Symphony No. 9 in D minor, Op. 125 \"Choral\": IV. Presto - Allegro assai - Presto "
+    "\"O Freunde, nicht diese Töne!\" - Allegro assai vivace (alla marcia)",
+    "Das wohltemperierte Klavier, Book 1: Prelude and Fugue No. 1 in C major, BWV 846",
+    "Mass in B minor, BWV 232: Gloria in excelsis Deo - Et in terra pax hominibus bonae voluntatis",
+    "Die Walküre, WWV 86B, Act III: \"Leb' wohl, du kühnes, herrliches Kind!\" (Wotan's Farewell "
+    "and Magic Fire Music) " * 3,
+]
+MAX_WIDTH = 360
+
+
+def old_get_font(preferred_path, size, fallback_paths=FALLBACK_FONTS):
+    if os.path.exists(preferred_path):
+        return ImageFont.truetype(preferred_path, size)
+    for path in fallback_paths:
+        if os.path.exists(path):
+            return ImageFont.truetype(path, size)
+    return ImageFont.load_default()
+
+
+def old_wrap_text(text, font, max_width):
+    if not text:
+        return []
+    lines = []
+    words = text.split()
+    while words:
+        line = ''
+        while words and font.getbbox(line + words[0])[2] <= max_width:
+            line += (words.pop(0) + ' ')
+        if not line:
+            # The original loops forever on a word wider than max_width
+            line = words.pop(0)
+        lines.append(line.strip())
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    font_path = next((path for path in FALLBACK_FONTS if os.path.exists(path)), None)
+    if font_path is None:
+        print("No TrueType fallback font installed; measuring with the default bitmap font.")
+        font_path = "/nonexistent.ttf"
+    font = get_font(font_path, 36)
+
+    old_load, _ = timed(lambda: [old_get_font(font_path, s) for s in (36, 28, 20)], args.repeat, warmup=False,
+                        label="old get_font x3")
+    new_load, _ = timed(lambda: [get_font(font_path, s) for s in (36, 28, 20)], args.repeat, warmup=False,
+                        label="cached get_font x3")
+    old_wrap, _ = timed(lambda: [old_wrap_text(t, font, MAX_WIDTH) for t in TITLES], args.repeat, warmup=False,
+                        label="old wrap_text (all titles)")
+    new_wrap, _ = timed(lambda: [wrap_text(t, font, MAX_WIDTH) for t in TITLES], args.repeat, warmup=False,
+                        label="new wrap_text (all titles)")
+    print(f"speedup: font load {old_load / new_load:.0f}x, wrap {old_wrap / new_wrap:.1f}x")
+
+    mismatched = sum(old_wrap_text(t, font, MAX_WIDTH) != wrap_text(t, font, MAX_WIDTH) for t in TITLES)
+    print(f"titles wrapped differently from the old wrapper: {mismatched}/{len(TITLES)}")
+
+
+if __name__ == "__main__":
+    main()
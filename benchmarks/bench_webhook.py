@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""Webhook ingestion: the old threaded Flask listener vs the asyncio listener.
+
+Each listener runs in its own process (working directory and state socket
+in a temp dir) and is replayed a mix of Plex-shaped multipart webhooks
+from many players: mostly media.play/pause/resume/stop/scrobble events,
+with a JPEG thumbnail part on play events like Plex sends.  Every request
+opens a new connection, as Plex does.  Reports requests/s and latency
+percentiles.  The Flask baseline needs benchmarks/requirements.txt:
+
+    python benchmarks/bench_webhook.py [--requests 3000] [--concurrency 64]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import socket
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_plex import make_jpeg
+
+EVENTS = ("media.play", "media.pause", "media.resume", "media.stop", "media.scrobble", "library.new")
+WEIGHTS = (30, 20, 15, 15, 15, 5)
+
+
+def serve_flask(port):
+    # webhooklistener.py before the asyncio listener
+    from collections import defaultdict
+    from datetime import datetime
+    from flask import Flask, request
+    from werkzeug.serving import run_simple
+    from statebus import StateBus
+
+    app = Flask(__name__)
+    stats = {'total_requests': 0, 'successful_requests': 0, 'error_requests': 0,
+             'events': defaultdict(int), 'last_reset': datetime.now()}
+    state_bus = StateBus()
+
+    def write_current_playing(data):
+        player = data.get('Player', {})
+        if player.get('title') != "Your_Headless_plexamp_player_name":
+            return
+        current_playing = {'event': data.get('event'), 'player': player,
+                           'metadata': data.get('Metadata', {}), 'timestamp': datetime.now().isoformat()}
+        current_playing = state_bus.publish(current_playing)
+        with open('currentlyplaying.json', 'w') as f:
+            json.dump(current_playing, f, indent=2)
+
+    @app.route('/webhook', methods=['POST'])
+    def webhook():
+        stats['total_requests'] += 1
+        try:
+            payload = request.form.get('payload')
+            if not payload:
+                raise ValueError("No payload found in the form data")
+            data = json.loads(payload)
+            event_type = data.get('event')
+            if not event_type:
+                raise ValueError("No event type in the received data")
+            stats['events'][event_type] += 1
+            if event_type in ['media.play', 'media.resume', 'media.pause', 'media.stop']:
+                write_current_playing(data)
+            stats['successful_requests'] += 1
+            return 'OK', 200
+        except (json.JSONDecodeError, ValueError) as e:
+            stats['error_requests'] += 1
+            return 'Bad Request: ' + str(e), 400
+
+    @app.route('/stats', methods=['GET'])
+    def get_stats():
+        return json.dumps(stats, indent=2, default=str), 200, {'Content-Type': 'application/json'}
+
+    import logging
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    state_bus.start()
+    run_simple('127.0.0.1', port, app, use_reloader=False, threaded=True)
+
+
+def serve_asyncio(port):
+    import logging
+    import webhooklistener
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(webhooklistener.WebhookListener().serve('127.0.0.1', port, on_listening=webhooklistener.players.start))
+
+
+def plex_payload(rng, players, thumbnails):
+    event = rng.choices(EVENTS, WEIGHTS)[0]
+    player = rng.choice(players)
+    album = rng.randrange(1000)
+    data = {
+        "event": event,
+        "user": True,
+        "owner": True,
+        "Account": {"id": 1, "thumb": "https://plex.tv/users/abc/avatar", "title": "listener"},
+        "Server": {"title": "plex", "uuid": "server-uuid"},
+        "Player": player,
+        "Metadata": {
+            "librarySectionType": "artist", "ratingKey": str(album * 20 + 1), "key": f"/library/metadata/{album * 20 + 1}",
+            "parentRatingKey": str(album), "grandparentRatingKey": str(album // 10), "type": "track",
+            "title": f"Track {rng.randrange(20)}", "grandparentTitle": f"Artist {album // 10}",
+            "parentTitle": f"Album {album}", "summary": "x" * rng.randrange(200, 1200),
+            "index": rng.randrange(1, 20), "parentIndex": 1, "ratingCount": rng.randrange(100000),
+            "thumb": f"/library/metadata/{album}/thumb/1700000000",
+            "parentThumb": f"/library/metadata/{album}/thumb/1700000000",
+            "grandparentThumb": f"/library/metadata/{album // 10}/thumb/1700000000",
+            "addedAt": 1700000000, "updatedAt": 1700000000,
+            "Genre": [{"tag": "Rock"}, {"tag": "Indie"}],
+        },
+    }
+    boundary = uuid.uuid4().hex
+    parts = [f'--{boundary}\r\nContent-Disposition: form-data; name="payload"\r\n'
+             f'Content-Type: application/json\r\n\r\n'.encode() + json.dumps(data).encode()]
+    if event == "media.play":
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="thumb"; filename="thumb.jpg"\r\n'
+                     f'Content-Type: image/jpeg\r\n\r\n'.encode() + rng.choice(thumbnails))
+    body = b'\r\n'.join(parts) + f'\r\n--{boundary}--\r\n'.encode()
+    head = (f"POST /webhook HTTP/1.1\r\nHost: localhost\r\nUser-Agent: PlexMediaServer\r\n"
+            f"Content-Type: multipart/form-data; boundary={boundary}\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode()
+    return head + body
+
+
+async def send(port, request):
+    start = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(request)
+    await writer.drain()
+    status = (await reader.readline()).split()[1]
+    await reader.read()
+    writer.close()
+    return time.perf_counter() - start, status == b'200'
+
+
+async def load(port, payloads, concurrency):
+    queue = list(reversed(payloads))
+    latencies, failures = [], 0
+
+    async def client():
+        nonlocal failures
+        while queue:
+            latency, ok = await send(port, queue.pop())
+            latencies.append(latency)
+            failures += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start, sorted(latencies), failures
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"listener on port {port} did not start")
+
+
+def run(kind, payloads, args):
+    port = free_port()
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, STATE_SOCKET=os.path.join(workdir, "state.sock"),
+               ARTWORK_CACHE_DIR=os.path.join(workdir, "image_cache"), METRICS_DIR=os.path.join(workdir, "metrics"))
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", kind, str(port)],
+                              cwd=workdir, env=env)
+    try:
+        wait_for(port)
+        asyncio.run(load(port, payloads[:50], args.concurrency))  # warm up
+        elapsed, latencies, failures = asyncio.run(load(port, payloads, args.concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+    def pct(q):
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+
+    print(f"{kind:<8} {len(payloads) / elapsed:8.0f} req/s   p50 {pct(0.5):7.2f} ms   p99 {pct(0.99):7.2f} ms"
+          f"   max {latencies[-1] * 1000:7.2f} ms   failed {failures}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--players", type=int, default=24)
+    parser.add_argument("--serve", nargs=2, metavar=("KIND", "PORT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        kind, port = args.serve
+        (serve_flask if kind == "flask" else serve_asyncio)(int(port))
+        return
+
+    rng = random.Random(1)
+    players = [{"local": True, "publicAddress": "10.0.0.1", "title": f"player-{i}", "uuid": uuid.UUID(int=i).hex}
+               for i in range(args.players - 1)]
+    players.append({"local": True, "publicAddress": "10.0.0.1", "title": "Your_Headless_plexamp_player_name",
+                    "uuid": uuid.UUID(int=args.players).hex})
+    thumbnails = [make_jpeg(rng.choice((300, 400, 600)), seed) for seed in range(8)]
+    payloads = [plex_payload(rng, players, thumbnails) for _ in range(args.requests)]
+    size = sum(map(len, payloads)) / len(payloads)
+    print(f"{args.requests} webhooks from {args.players} players ({size / 1024:.1f} KB avg), "
+          f"{args.concurrency} concurrent connections")
+    run("flask", payloads, args)
+    run("asyncio", payloads, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""First paint after media.play: refetching the art vs the webhook's own thumbnail.
+
+The webhook listener and the renderer share a temp artwork cache and a
+plain-file framebuffer; album art comes from the stub Plex server with a
+Wi-Fi-like delay.  For each album a media.play webhook (with a JPEG
+thumbnail part, as Plex sends) is posted, then the now-playing frame is
+rendered and the art requests it made are counted.  Also reports peak
+memory while streaming large thumbnails from other players:
+
+    python benchmarks/bench_webhook_thumb.py [--albums 10] [--latency 0.05]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import argparse
+import tempfile
+import tracemalloc
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+WORKDIR = tempfile.mkdtemp()
+os.environ.update(ARTWORK_CACHE_DIR=os.path.join(WORKDIR, "image_cache"),
+                  FRAMEBUFFER_DEVICE=os.path.join(WORKDIR, "fb0"),
+                  STATE_SOCKET=os.path.join(WORKDIR, "state.sock"))
+os.chdir(WORKDIR)
+
+from stub_plex import StubPlex, make_jpeg
+
+
+def webhook_request(event, player, thumb, jpeg):
+    data = {"event": event, "Player": {"title": player, "uuid": uuid.uuid4().hex},
+            "Metadata": {"ratingKey": thumb.split("/")[3], "title": "Track", "parentTitle": "Album",
+                         "grandparentTitle": "Artist", "thumb": thumb}}
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="payload"\r\n'
+            f'Content-Type: application/json\r\n\r\n{json.dumps(data)}\r\n'
+            f'--{boundary}\r\nContent-Disposition: form-data; name="thumb"; filename="thumb.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n').encode() + jpeg + f'\r\n--{boundary}--\r\n'.encode()
+    headers = {"content-type": f"multipart/form-data; boundary={boundary}", "content-length": str(len(body))}
+    return headers, body
+
+
+async def ingest(headers, body, chunk=16 * 1024):
+    # Feeds the body the way a socket would, a chunk at a time
+    import webhooklistener
+    reader = asyncio.StreamReader()
+
+    async def feed():
+        for start in range(0, len(body), chunk):
+            reader.feed_data(body[start:start + chunk])
+            await asyncio.sleep(0)
+        reader.feed_eof()
+
+    feeder = asyncio.create_task(feed())
+    result = await webhooklistener.read_payload(reader, headers, webhooklistener.players)
+    await feeder
+    return result
+
+
+def first_paints(fb, stub, albums, use_thumbnail):
+    import webhooklistener
+    timings, requests = [], 0
+    for album in albums:
+        thumb = f"/library/metadata/{album}/thumb"
+        headers, body = webhook_request("media.play", webhooklistener.TARGET_PLAYER, thumb, make_jpeg(600, album))
+        if not use_thumbnail:
+            # The old listener: payload only, the image part is thrown away
+            headers, body = webhook_request("media.play", webhooklistener.TARGET_PLAYER, thumb, b"")
+            body = body.replace(b"image/jpeg", b"text/plain")
+
+        data, thumbnail = asyncio.run(ingest(headers, body))
+        route = webhooklistener.players.lookup(data['Player'])
+        webhooklistener.apply_event(route, data, thumbnail)
+        route.snapshot_writer.flush()
+
+        before = len(stub.requests)
+        start = time.perf_counter()
+        state = fb.current_state()
+        frame = fb.display_image_with_track_details(fb.build_track_info(state["metadata"], {}))
+        timings.append(time.perf_counter() - start)
+        assert frame is not None
+        requests += sum("/thumb" in path or "/photo/" in path for path in stub.requests[before:])
+    return timings, requests
+
+
+def peak_memory(headers, body):
+    import webhooklistener
+    tracemalloc.start()
+    try:
+        data, thumbnail = asyncio.run(ingest(headers, body))
+    except webhooklistener.UnknownPlayer:
+        thumbnail = None
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak, thumbnail is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--albums", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub Plex response delay")
+    args = parser.parse_args()
+
+    stub = StubPlex(latency=args.latency)
+    stub.thread.start()
+    os.environ.update(PLEX_BASE_URL=stub.url, PLEX_TOKEN="token")
+    import fb
+    import webhooklistener
+    logging.getLogger().setLevel(logging.WARNING)
+
+    def report(label, result):
+        timings, requests = result
+        print(f"{label:<30} art requests {requests:3d}   first paint mean {sum(timings) / len(timings) * 1000:7.1f} ms"
+              f"   max {max(timings) * 1000:7.1f} ms")
+
+    print(f"{args.albums} media.play webhooks, Plex answers in {args.latency * 1000:.0f} ms")
+    report("payload only (refetch art)", first_paints(fb, stub, range(100, 100 + args.albums), False))
+    report("cache the webhook thumbnail", first_paints(fb, stub, range(200, 200 + args.albums), True))
+    stats = webhooklistener.get_stats()
+    print(f"listener stats: thumbnails_cached={stats['thumbnails_cached']} "
+          f"thumbnails_skipped={stats['thumbnails_skipped']}")
+
+    big = os.urandom(5 * 1024 * 1024)
+    thumb = "/library/metadata/999/thumb"
+    for label, player in (("other player, 5 MB thumbnail", "someone-else"),
+                          ("target player, 5 MB thumbnail", webhooklistener.TARGET_PLAYER)):
+        peak, kept = peak_memory(*webhook_request("media.play", player, thumb, big))
+        print(f"{label:<30} peak {peak / 1024:8.0f} KB while parsing, thumbnail kept: {kept}")
+
+
+if __name__ == "__main__":
+    main()
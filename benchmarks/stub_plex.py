@@ -0,0 +1,128 @@
+"""Local stand-in for a Plex server and Plexamp player, for benchmarks.
+
+Serves a fixed album from a background thread:
+
+    /player/timeline/poll             player timeline with the play queue id
+    /playQueues/<id>                  play queue, selected item = first track
+    /library/metadata/<key>/thumb     album art as a JPEG (ART_SIZE px square)
+    /photo/:/transcode                album art resized to ?width=&height=
+    /status/sessions                  session listing with every track
+    /library/metadata/<key>           a single track
+    /library/sections[/1/all]         one music section listing every track
+
+``StubPlex.latency`` adds a fixed delay to every response to mimic Wi-Fi;
+``StubPlex.transcode = False`` makes the transcoder return 404.
+"""
+import time
+import threading
+from io import BytesIO
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from _common import make_cover
+
+ART_SIZE = 1500
+PLAY_QUEUE_ID = "4242"
+
+
+def make_jpeg(size, seed=0):
+    buffer = BytesIO()
+    make_cover(size, seed, grid=16).save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def track_xml(index, rating_key, album_key="900"):
+    return (
+        f'<Track ratingKey="{rating_key}" playQueueItemID="{index + 1}" parentRatingKey="{album_key}" '
+        f'title="Track {index + 1}" grandparentTitle="Stub Artist" parentTitle="Stub Album" '
+        f'thumb="/library/metadata/{album_key}/thumb">'
+        f'<Media audioCodec="flac"><Part container="flac">'
+        f'<Stream streamType="2" bitDepth="24" samplingRate="96000"/>'
+        f'</Part></Media></Track>'
+    )
+
+
+class StubPlex:
+    def __init__(self, tracks=12, latency=0.0):
+        self.latency = latency
+        self.transcode = True
+        self.transcoded = {}
+        self.rating_keys = [str(1000 + i) for i in range(tracks)]
+        self.art = make_jpeg(ART_SIZE)
+        self.requests = []
+        self.bytes_sent = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests.append(self.path)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                url = urlsplit(self.path)
+                status, content_type, body = stub.route(url.path, parse_qs(url.query))
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                stub.bytes_sent += len(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        # Clients that stop reading early (streaming parsers) reset the connection
+        self.server.handle_error = lambda request, client_address: None
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def route(self, path, query):
+        if path == "/player/timeline/poll":
+            body = (f'<MediaContainer><Timeline type="music" state="playing" '
+                    f'playQueueID="{PLAY_QUEUE_ID}" ratingKey="{self.rating_keys[0]}"/></MediaContainer>')
+            return 200, "text/xml", body.encode()
+        if path == f"/playQueues/{PLAY_QUEUE_ID}":
+            tracks = "".join(track_xml(i, key) for i, key in enumerate(self.rating_keys))
+            body = f'<MediaContainer playQueueSelectedItemID="1">{tracks}</MediaContainer>'
+            return 200, "text/xml", body.encode()
+        if path == "/status/sessions":
+            tracks = "".join(track_xml(i, key) for i, key in enumerate(self.rating_keys))
+            return 200, "text/xml", f"<MediaContainer>{tracks}</MediaContainer>".encode()
+        if path == "/photo/:/transcode" and self.transcode:
+            size = (int(query["width"][0]), int(query["height"][0]))
+            if size not in self.transcoded:
+                buffer = BytesIO()
+                art = Image.open(BytesIO(self.art))
+                art.thumbnail(size, Image.LANCZOS)
+                art.save(buffer, 'JPEG', quality=90)
+                self.transcoded[size] = buffer.getvalue()
+            return 200, "image/jpeg", self.transcoded[size]
+        if path == "/library/sections":
+            body = '<MediaContainer><Directory key="1" type="artist" title="Music"/></MediaContainer>'
+            return 200, "text/xml", body.encode()
+        if path == "/library/sections/1/all":
+            start = int(query.get("X-Plex-Container-Start", ["0"])[0])
+            size = int(query.get("X-Plex-Container-Size", [str(len(self.rating_keys))])[0])
+            keys = self.rating_keys[start:start + size]
+            tracks = "".join(track_xml(self.rating_keys.index(key), key) for key in keys)
+            return 200, "text/xml", f"<MediaContainer>{tracks}</MediaContainer>".encode()
+        if path.startswith("/library/metadata/") and path.count("/") == 3:
+            rating_key = path.rsplit("/", 1)[1]
+            if rating_key not in self.rating_keys:
+                return 404, "text/plain", b"not found"
+            track = track_xml(self.rating_keys.index(rating_key), rating_key)
+            return 200, "text/xml", f"<MediaContainer size=\"1\">{track}</MediaContainer>".encode()
+        if path.endswith("/thumb"):
+            return 200, "image/jpeg", self.art
+        return 404, "text/plain", b"not found"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
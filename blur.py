@@ -0,0 +1,55 @@
+import os
+import numpy as np
+from PIL import Image, ImageFilter
+
+# Fraction of the screen resolution the blur runs at (1.0 = full size, old behaviour)
+BLUR_QUALITY = float(os.getenv("BLUR_QUALITY", 0.25))
+# "gaussian" uses PIL's GaussianBlur, "box" three separable NumPy box passes
+BLUR_METHOD = os.getenv("BLUR_METHOD", "gaussian")
+BLUR_RADIUS = 30
+# Same darkening as compositing a (0, 0, 0, 128) overlay on top
+DARKEN = (255 - 128) / 255
+
+
+def box_blur(data, radius, passes=3):
+    """Separable box blur over the first two axes; three passes approximate a Gaussian."""
+    data = data.astype(np.float32)
+    size = 2 * radius + 1
+    for _ in range(passes):
+        for axis in (0, 1):
+            pad = [(0, 0)] * data.ndim
+            pad[axis] = (radius + 1, radius)
+            padded = np.pad(data, pad, mode='edge')
+            summed = np.cumsum(padded, axis=axis)
+            upper = np.take(summed, np.arange(size, summed.shape[axis]), axis=axis)
+            lower = np.take(summed, np.arange(0, summed.shape[axis] - size), axis=axis)
+            data = (upper - lower) / size
+    return data
+
+
+def box_radius_for_sigma(sigma, passes=3):
+    # Variance of n box passes of width w is n * (w^2 - 1) / 12
+    return max(1, int(round((np.sqrt(12 * sigma * sigma / passes + 1) - 1) / 2)))
+
+
+def blurred_background(img, width, height, quality=BLUR_QUALITY, method=BLUR_METHOD, radius=BLUR_RADIUS):
+    """Blur ``img`` for use as a full-screen background.
+
+    The cover is shrunk to ``quality`` of the screen size, blurred with a
+    radius scaled by the same factor and darkened there, then upscaled.  A
+    radius-30 blur has no detail left that the bilinear upscale could lose.
+    """
+    quality = min(max(quality, 0.05), 1.0)
+    small_size = (max(1, round(width * quality)), max(1, round(height * quality)))
+    small_radius = radius * quality
+    small = img.convert('RGB').resize(small_size, Image.BILINEAR if quality < 1.0 else Image.BICUBIC)
+
+    if method == "box":
+        data = box_blur(np.asarray(small), box_radius_for_sigma(small_radius))
+    else:
+        data = np.asarray(small.filter(ImageFilter.GaussianBlur(small_radius)), dtype=np.float32)
+
+    darkened = Image.fromarray(np.clip(data * DARKEN + 0.5, 0, 255).astype(np.uint8))
+    if darkened.size == (width, height):
+        return darkened
+    return darkened.resize((width, height), Image.BILINEAR)
@@ -0,0 +1,58 @@
+import os
+import json
+import threading
+
+CARD_CACHE = os.getenv("CARD_CACHE", "card_cache.json")
+
+
+class CardCache:
+    """UID -> play URI, persisted as JSON so known cards survive a restart.
+
+    Writes go to a temporary file that is renamed over the cache, so a power
+    cut mid-write leaves the previous cache intact.
+    """
+
+    def __init__(self, path=CARD_CACHE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.cards = self._load()
+        self.stats = {'hits': 0, 'misses': 0, 'updates': 0}
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(self.cards, f)
+        os.replace(temp_path, self.path)
+
+    def get(self, uid):
+        with self.lock:
+            uri = self.cards.get(uid)
+            self.stats['hits' if uri else 'misses'] += 1
+            return uri
+
+    def put(self, uid, uri):
+        """Store ``uri`` for ``uid``; returns True if that changed the cache."""
+        with self.lock:
+            if self.cards.get(uid) == uri:
+                return False
+            self.cards[uid] = uri
+            self.stats['updates'] += 1
+            self._save()
+            return True
+
+    def remove(self, uid):
+        with self.lock:
+            if self.cards.pop(uid, None) is not None:
+                self._save()
+
+    def hit_rate(self):
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return self.stats['hits'] / lookups if lookups else 0.0
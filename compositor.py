@@ -0,0 +1,157 @@
+from collections import OrderedDict
+from PIL import Image, ImageDraw
+from framebuffer import image_to_pixels
+from typography import text_width, wrap_text
+
+# Album layers kept in memory (background + rounded art, already converted)
+MAX_CACHED_ALBUMS = 4
+
+LOSSLESS_ICON_SIZE = (50, 30)
+HIRES_ICON_SIZE = (30, 30)
+
+
+def album_art_size(width, height):
+    return int(min(width // 2, height) * 0.9)
+
+
+def resize_image_aspect_ratio(img, max_width, max_height):
+    img_ratio = img.width / img.height
+    target_ratio = max_width / max_height
+    if img_ratio > target_ratio:
+        new_width = max_width
+        new_height = int(max_width / img_ratio)
+    else:
+        new_height = max_height
+        new_width = int(max_height * img_ratio)
+    return img.resize((new_width, new_height), Image.LANCZOS)
+
+
+def load_icon(icon_path, size=(20, 20)):
+    try:
+        icon = Image.open(icon_path).convert("RGBA")
+        return icon.resize(size, Image.LANCZOS)
+    except Exception as e:
+        print(f"Error loading icon {icon_path}: {e}")
+        return None
+
+
+def add_corners(im, rad):
+    circle = Image.new('L', (rad * 2, rad * 2), 0)
+    draw = ImageDraw.Draw(circle)
+    draw.ellipse((0, 0, rad * 2, rad * 2), fill=255)
+    alpha = Image.new('L', im.size, 255)
+    w, h = im.size
+    alpha.paste(circle.crop((0, 0, rad, rad)), (0, 0))
+    alpha.paste(circle.crop((0, rad, rad, rad * 2)), (0, h - rad))
+    alpha.paste(circle.crop((rad, 0, rad * 2, rad)), (w - rad, 0))
+    alpha.paste(circle.crop((rad, rad, rad * 2, rad * 2)), (w - rad, h - rad))
+    im.putalpha(alpha)
+    return im
+
+
+class AlbumLayer:
+    """Album-invariant part of a now-playing frame."""
+
+    def __init__(self, image, pixels):
+        # RGB image the text panel is drawn on, and the same frame in framebuffer format
+        self.image = image
+        self.pixels = pixels
+
+
+class NowPlayingCompositor:
+    """Builds now-playing frames from a cached album layer plus a per-track text panel.
+
+    The blurred background and rounded album art are the same for every
+    track on an album, so they are rendered once per (album, resolution)
+    and kept as framebuffer-format pixels.  A track change only redraws the
+    right-hand text panel and drops it into a copy of the cached frame.
+    """
+
+    def __init__(self, width, height, fonts, lossless_icon_path, hires_icon_path, bpp=16,
+                 max_albums=MAX_CACHED_ALBUMS):
+        self.width = width
+        self.height = height
+        self.bpp = bpp
+        self.title_font, self.artist_font, self.details_font = fonts
+        self.max_albums = max_albums
+        self.album_layers = OrderedDict()
+
+        self.padding = 20
+        self.left_side_width = width // 2
+        self.album_art_size = album_art_size(width, height)
+        self.text_area_x = self.left_side_width + self.padding
+        self.text_area_width = width - self.text_area_x - self.padding
+
+        self.lossless_icon = load_icon(lossless_icon_path, size=LOSSLESS_ICON_SIZE)
+        self.hires_icon = load_icon(hires_icon_path, size=HIRES_ICON_SIZE)
+
+    def album_key(self, track_info):
+        return (track_info.get("album_id") or track_info.get("thumb_url"), self.width, self.height)
+
+    def has_album_layer(self, key):
+        return key in self.album_layers
+
+    def build_album_layer(self, key, img, background):
+        """Render background plus rounded art for ``key`` and cache it."""
+        frame = background.convert('RGB')
+        if frame.size != (self.width, self.height):
+            frame = frame.resize((self.width, self.height))
+        else:
+            frame = frame.copy()
+
+        album_art_x = (self.left_side_width - self.album_art_size) // 2
+        album_art_y = (self.height - self.album_art_size) // 2
+        resized_img = resize_image_aspect_ratio(img, self.album_art_size, self.album_art_size)
+        rounded_img = add_corners(resized_img.convert("RGBA"), 20)
+        frame.paste(rounded_img, (album_art_x, album_art_y), rounded_img)
+
+        layer = AlbumLayer(frame, image_to_pixels(frame, self.bpp))
+        self.album_layers[key] = layer
+        self.album_layers.move_to_end(key)
+        while len(self.album_layers) > self.max_albums:
+            self.album_layers.popitem(last=False)
+        return layer
+
+    def render_text_panel(self, layer, track_info):
+        panel = layer.image.crop((self.left_side_width, 0, self.width, self.height))
+        draw = ImageDraw.Draw(panel)
+        text_area_center = self.text_area_x + (self.text_area_width // 2) - self.left_side_width
+
+        def draw_centered_text(text, font, y, color):
+            lines = wrap_text(text, font, self.text_area_width)
+            for line in lines:
+                line_width = text_width(font, line)
+                x = text_area_center - (line_width // 2)
+                draw.text((x, y), line, font=font, fill=color)
+                y += font.size + 5
+            return y
+
+        text_y = self.padding + (self.height // 4)
+        text_y = draw_centered_text(track_info["title"], self.title_font, text_y, (255, 255, 255))
+        text_y += 20
+        text_y = draw_centered_text(track_info["artist"], self.artist_font, text_y, (200, 200, 200))
+        text_y += 20
+        text_y = draw_centered_text(track_info["album"], self.details_font, text_y, (150, 150, 150))
+        text_y += 10
+        draw_centered_text(track_info["audioData"], self.details_font, text_y, (150, 150, 150))
+
+        icon_padding = 10
+        icon_y = self.height - max(LOSSLESS_ICON_SIZE[1], HIRES_ICON_SIZE[1]) - icon_padding
+        icon_x = panel.width - icon_padding
+        if track_info["isLossless"] and self.lossless_icon:
+            icon_x -= LOSSLESS_ICON_SIZE[0]
+            panel.paste(self.lossless_icon, (icon_x, icon_y), self.lossless_icon)
+            icon_x -= icon_padding
+        if track_info["isHiRes"] and self.hires_icon:
+            icon_x -= HIRES_ICON_SIZE[0]
+            panel.paste(self.hires_icon, (icon_x, icon_y), self.hires_icon)
+        return panel
+
+    def render(self, key, track_info):
+        """Return a framebuffer-format frame for ``track_info`` on the cached album ``key``."""
+        layer = self.album_layers[key]
+        self.album_layers.move_to_end(key)
+        panel = self.render_text_panel(layer, track_info)
+        frame = layer.pixels.copy()
+        frame[:, self.left_side_width:] = image_to_pixels(panel, self.bpp)
+        return frame
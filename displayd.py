@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+import os
+import sys
+import time
+import queue
+import socket
+import threading
+from metrics import registry
+
+DISPLAY_SOCKET = os.getenv("DISPLAY_SOCKET", "/tmp/plexdap-display.sock")
+SCREENS = ("clock", "nowplaying")
+NOW_PLAYING_INTERVAL = 1  # seconds between redraw checks; state bus pushes wake it sooner
+ERROR_RETRY = 5
+
+def show(mode, socket_path=DISPLAY_SOCKET, timeout=5):
+    """Ask the display service to switch to ``mode``; returns its reply line.
+
+    The reply comes back once the new screen has been pushed to the
+    framebuffer, e.g. ``"ok nowplaying 12.3"`` (milliseconds spent drawing).
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(f"{mode}\n".encode())
+        reply = b""
+        while not reply.endswith(b"\n"):
+            chunk = client.recv(256)
+            if not chunk:
+                break
+            reply += chunk
+    return reply.decode().strip()
+
+
+class DisplayService:
+    """One resident process that keeps the clock and now-playing screens warm.
+
+    Both screens share the process, so fonts, artwork, album layers and the
+    framebuffer mapping survive a mode switch; switching only draws the
+    other screen.  Commands arrive as single lines (``clock``,
+    ``nowplaying``, ``status``) on a Unix socket.
+    """
+
+    def __init__(self, socket_path=DISPLAY_SOCKET, mode="clock"):
+        # Imported here so main.py can use show() without loading NumPy/PIL
+        import Time
+        import fb
+        self.clock = Time
+        self.now_playing = fb
+        self.socket_path = socket_path
+        self.mode = mode
+        self.commands = queue.Queue()
+        self.server = None
+        # Registered here, not at import, so main.py (which imports show) doesn't export it
+        self.draw_seconds = registry.histogram('display_draw_seconds', 'Time to draw a screen', label='screen')
+
+    def draw(self, force):
+        """Draw the active screen; returns seconds until it wants to be drawn again."""
+        try:
+            with self.draw_seconds.time(self.mode):
+                if self.mode == "clock":
+                    self.clock.display_time_on_framebuffer(self.clock.FRAMEBUFFER)
+                    return self.clock.time_until_next_minute()
+                self.now_playing.update_now_playing(force=force)
+                return NOW_PLAYING_INTERVAL
+        except Exception as e:
+            print(f"Error drawing {self.mode} screen: {e}")
+            return ERROR_RETRY
+
+    def state_changed(self):
+        # Called from the state bus thread; wakes the loop to redraw now-playing at once
+        if self.mode == "nowplaying":
+            self.commands.put((None, None))
+
+    def nfc_status_changed(self, status, timestamp):
+        # Called from the status log watcher; the clock screen shows NFC up/down
+        if self.mode == "clock":
+            self.commands.put((None, None))
+
+    def listen(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        self.server.listen(4)
+        threading.Thread(target=self._accept, name="display-ipc", daemon=True).start()
+
+    def _accept(self):
+        while True:
+            connection, _ = self.server.accept()
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _handle(self, connection):
+        with connection:
+            command = connection.makefile("r").readline().strip()
+            if command == "status":
+                reply = f"ok {self.mode}"
+            elif command in SCREENS:
+                done = queue.Queue(maxsize=1)
+                self.commands.put((command, done))
+                reply = done.get()
+            else:
+                reply = f"error unknown command {command!r}"
+            connection.sendall(f"{reply}\n".encode())
+
+    def run(self):
+        self.clock.cleanup_cache()
+        self.now_playing.start_library_index()
+        self.now_playing.start_prefetcher()
+        self.now_playing.start_state_watcher(on_change=self.state_changed)
+        self.clock.status_log.watch(self.nfc_status_changed)
+        self.listen()
+        registry.start_export("display")
+        print(f"Display service listening on {self.socket_path}")
+
+        next_draw = 0
+        while True:
+            try:
+                mode, done = self.commands.get(timeout=max(0, next_draw - time.monotonic()))
+            except queue.Empty:
+                mode, done = None, None
+
+            if mode is not None:
+                start = time.perf_counter()
+                switched = mode != self.mode
+                self.mode = mode
+                delay = self.draw(force=switched)
+                done.put(f"ok {mode} {(time.perf_counter() - start) * 1000:.1f}")
+                if switched:
+                    print(f"Switched display to {mode}")
+            else:
+                delay = self.draw(force=False)
+            next_draw = time.monotonic() + delay
+
+
+if __name__ == "__main__":
+    DisplayService(mode=sys.argv[1] if len(sys.argv) > 1 else "clock").run()
@@ -0,0 +1,234 @@
+import os
+import time
+import mmap
+import fcntl
+import struct
+import numpy as np
+
+# Constants
+FRAMEBUFFER_DEVICE = os.getenv("FRAMEBUFFER_DEVICE", "/dev/fb0")
+# Geometry used when FRAMEBUFFER_DEVICE is a plain file instead of a device,
+# e.g. FRAMEBUFFER_GEOMETRY="800x480x16"
+FRAMEBUFFER_GEOMETRY = os.getenv("FRAMEBUFFER_GEOMETRY", "800x480x16")
+
+FBIOGET_VSCREENINFO = 0x4600
+FBIOGET_FSCREENINFO = 0x4602
+VSCREENINFO_FMT = "8I12I36I"
+# char id[16]; unsigned long smem_start; __u32 smem_len, type, type_aux, visual;
+# __u16 xpanstep, ypanstep, ywrapstep; __u32 line_length
+FSCREENINFO_FMT = "16sL4I3HI"
+FSCREENINFO_SIZE = 80
+
+# Changed row spans closer than this are written as one region
+DIRTY_MERGE_GAP = 8
+
+# Shared instances, one per device path
+_framebuffers = {}
+
+
+def parse_geometry(geometry):
+    width, height, bpp = (int(part) for part in geometry.lower().split("x"))
+    return width, height, bpp
+
+
+def screen_size(device=FRAMEBUFFER_DEVICE):
+    """(width, height) of ``device`` without opening it for drawing."""
+    if os.path.exists(device) and not os.path.isfile(device):
+        fd = os.open(device, os.O_RDONLY)
+        try:
+            screen_info = fcntl.ioctl(fd, FBIOGET_VSCREENINFO, b"\0" * struct.calcsize(VSCREENINFO_FMT))
+        finally:
+            os.close(fd)
+        width, height = struct.unpack(VSCREENINFO_FMT, screen_info)[:2]
+        return width, height
+    width, height, _ = parse_geometry(FRAMEBUFFER_GEOMETRY)
+    return width, height
+
+
+def rgb_to_rgb565(img_data):
+    r = img_data[:, :, 0].astype(np.uint16)
+    g = img_data[:, :, 1].astype(np.uint16)
+    b = img_data[:, :, 2].astype(np.uint16)
+    return ((r & 0xF8) << 8) | ((g & 0xFC) << 3) | (b >> 3)
+
+
+def rgb_to_xrgb8888(img_data):
+    r = img_data[:, :, 0].astype(np.uint32)
+    g = img_data[:, :, 1].astype(np.uint32)
+    b = img_data[:, :, 2].astype(np.uint32)
+    return (r << 16) | (g << 8) | b
+
+
+def image_to_pixels(img, bpp):
+    img_data = np.asarray(img.convert('RGB'), dtype=np.uint8)
+    if bpp == 16:
+        return rgb_to_rgb565(img_data)
+    if bpp == 32:
+        return rgb_to_xrgb8888(img_data)
+    raise ValueError(f"Unsupported bits per pixel: {bpp}")
+
+
+def find_dirty_regions(previous, frame, merge_gap=DIRTY_MERGE_GAP):
+    """Return (x0, y0, x1, y1) boxes covering every pixel that differs."""
+    diff = previous != frame
+    changed_rows = np.flatnonzero(diff.any(axis=1))
+    if not changed_rows.size:
+        return []
+    breaks = np.flatnonzero(np.diff(changed_rows) > merge_gap + 1)
+    starts = np.concatenate(([changed_rows[0]], changed_rows[breaks + 1]))
+    ends = np.concatenate((changed_rows[breaks], [changed_rows[-1]])) + 1
+    regions = []
+    for y0, y1 in zip(starts, ends):
+        changed_cols = np.flatnonzero(diff[y0:y1].any(axis=0))
+        regions.append((int(changed_cols[0]), int(y0), int(changed_cols[-1]) + 1, int(y1)))
+    return regions
+
+
+class Framebuffer:
+    """Memory-mapped framebuffer, opened once and written in place.
+
+    Geometry comes from the FBIOGET_VSCREENINFO ioctl.  When the path is a
+    plain file (tests, benchmarks, machines without a display) the ioctl
+    fails and ``geometry`` (width, height, bpp) is used instead.
+    """
+
+    def __init__(self, device=FRAMEBUFFER_DEVICE, geometry=None):
+        self.device = device
+        self.fd = None
+        self.map = None
+        self.pixels = None
+        self.is_device = False
+        self.width = self.height = self.bpp = self.stride = 0
+        # Last frame pushed by this process, used to diff partial updates
+        self.last_frame = None
+        self.stats = {
+            'updates': 0,
+            'full_writes': 0,
+            'bytes_written': 0,
+            'bytes_skipped': 0,
+            'update_time': 0.0,
+        }
+        self._open(geometry)
+
+    def _open(self, geometry):
+        is_char_device = os.path.exists(self.device) and not os.path.isfile(self.device)
+        if is_char_device:
+            self.fd = os.open(self.device, os.O_RDWR)
+            self.width, self.height, self.bpp, self.stride = self._query_geometry()
+            self.is_device = True
+        else:
+            if geometry is None:
+                geometry = parse_geometry(FRAMEBUFFER_GEOMETRY)
+            self.width, self.height, self.bpp = geometry
+            self.stride = self.width * self.bpp // 8
+            self.fd = os.open(self.device, os.O_RDWR | os.O_CREAT, 0o644)
+            if os.fstat(self.fd).st_size < self.stride * self.height:
+                os.ftruncate(self.fd, self.stride * self.height)
+
+        if self.bpp not in (16, 32):
+            self.close()
+            raise ValueError(f"Unsupported bits per pixel: {self.bpp}")
+
+        size = self.stride * self.height
+        self.map = mmap.mmap(self.fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        dtype = np.uint16 if self.bpp == 16 else np.uint32
+        row_pixels = self.stride // np.dtype(dtype).itemsize
+        # Rows may be padded past the visible width; expose only the visible part
+        self.pixels = np.frombuffer(self.map, dtype=dtype, count=row_pixels * self.height)
+        self.pixels = self.pixels.reshape(self.height, row_pixels)[:, :self.width]
+
+    def _query_geometry(self):
+        screen_info = fcntl.ioctl(self.fd, FBIOGET_VSCREENINFO, b"\0" * struct.calcsize(VSCREENINFO_FMT))
+        data = struct.unpack(VSCREENINFO_FMT, screen_info)
+        width, height, bpp = data[0], data[1], data[6]
+        stride = width * bpp // 8
+        try:
+            fix_info = fcntl.ioctl(self.fd, FBIOGET_FSCREENINFO, b"\0" * FSCREENINFO_SIZE)
+            line_length = struct.unpack_from(FSCREENINFO_FMT, fix_info)[-1]
+            if line_length >= stride:
+                stride = line_length
+        except OSError:
+            pass
+        return width, height, bpp, stride
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+    @property
+    def frame_bytes(self):
+        return self.width * self.height * self.bpp // 8
+
+    def _as_frame(self, frame):
+        frame = np.asarray(frame, dtype=self.pixels.dtype)
+        if frame.ndim == 1:
+            frame = frame.reshape(self.height, self.width)
+        return frame
+
+    def write(self, frame):
+        """Copy a NumPy frame (RGB565 or XRGB8888 matching ``bpp``) into the mapping."""
+        frame = self._as_frame(frame)
+        np.copyto(self.pixels, frame)
+        self.last_frame = frame.copy()
+
+    def write_image(self, img):
+        self.write(self._image_pixels(img))
+
+    def update(self, frame):
+        """Write only the regions that changed since the last pushed frame.
+
+        Returns a dict with the regions written, bytes written and the time
+        spent diffing and copying, and adds the same numbers to ``stats``.
+        """
+        start = time.perf_counter()
+        frame = self._as_frame(frame)
+        if self.last_frame is None:
+            regions = [(0, 0, self.width, self.height)]
+            np.copyto(self.pixels, frame)
+            self.last_frame = frame.copy()
+            self.stats['full_writes'] += 1
+        else:
+            regions = find_dirty_regions(self.last_frame, frame)
+            for x0, y0, x1, y1 in regions:
+                self.pixels[y0:y1, x0:x1] = frame[y0:y1, x0:x1]
+                self.last_frame[y0:y1, x0:x1] = frame[y0:y1, x0:x1]
+
+        bytes_per_pixel = self.bpp // 8
+        bytes_written = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regions) * bytes_per_pixel
+        elapsed = time.perf_counter() - start
+
+        self.stats['updates'] += 1
+        self.stats['bytes_written'] += bytes_written
+        self.stats['bytes_skipped'] += self.frame_bytes - bytes_written
+        self.stats['update_time'] += elapsed
+        return {'regions': regions, 'bytes_written': bytes_written, 'elapsed': elapsed}
+
+    def update_image(self, img):
+        return self.update(self._image_pixels(img))
+
+    def invalidate(self):
+        """Forget the last frame so the next update rewrites the whole screen."""
+        self.last_frame = None
+
+    def _image_pixels(self, img):
+        if img.size != (self.width, self.height):
+            img = img.resize((self.width, self.height))
+        return image_to_pixels(img, self.bpp)
+
+    def close(self):
+        self.pixels = None
+        self.last_frame = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def get_framebuffer(device=FRAMEBUFFER_DEVICE, geometry=None):
+    framebuffer = _framebuffers.get(device)
+    if framebuffer is None:
+        framebuffer = Framebuffer(device, geometry)
+        _framebuffers[device] = framebuffer
+    return framebuffer
@@ -0,0 +1,202 @@
+import os
+import time
+import sqlite3
+import threading
+
+LIBRARY_DB = os.getenv("LIBRARY_DB", "library.db")
+SYNC_INTERVAL = 900  # seconds between incremental syncs
+PAGE_SIZE = 500
+# Tracks whose listing had no Stream element get a per-track metadata fetch;
+# at most this many per sync so a first sync of a big library stays gentle
+DETAIL_BATCH = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    rating_key TEXT PRIMARY KEY,
+    parent_rating_key TEXT,
+    container TEXT,
+    codec TEXT,
+    bit_depth INTEGER,
+    sampling_rate INTEGER,
+    thumb TEXT,
+    updated_at INTEGER,
+    detailed_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS sections (
+    key TEXT PRIMARY KEY,
+    updated_at INTEGER
+);
+"""
+
+
+def _int(value):
+    return int(value) if value not in (None, "") else None
+
+
+def track_row(track, detailed=False):
+    """Column values for a ``Track`` element, None where the listing has no data.
+
+    ``detailed_at`` is set when the element carries its full stream details,
+    or when it came from a per-track fetch (``detailed``), even if the file
+    has no bit depth at all (MP3, AAC).
+    """
+    media = track.find("Media")
+    part = media.find("Part") if media is not None else None
+    stream = None
+    if part is not None:
+        for candidate in part.findall("Stream"):
+            if candidate.get("streamType", "2") == "2":
+                stream = candidate
+                break
+    return (
+        track.get("ratingKey"),
+        track.get("parentRatingKey"),
+        part.get("container") if part is not None else None,
+        (stream.get("codec") if stream is not None else None) or (media.get("audioCodec") if media is not None else None),
+        _int(stream.get("bitDepth")) if stream is not None else None,
+        _int(stream.get("samplingRate")) if stream is not None else None,
+        track.get("thumb"),
+        _int(track.get("updatedAt")) or 0,
+        int(time.time()) if detailed or stream is not None else None,
+    )
+
+
+class LibraryIndex:
+    """Local SQLite mirror of the audio format of every track in the Plex library.
+
+    ``sync`` walks the music sections with an ``updatedAt`` filter, so after
+    the first run only changed tracks come over the wire.  ``lookup`` never
+    touches the network and survives fb.py being restarted.
+    """
+
+    def __init__(self, client, path=LIBRARY_DB):
+        self.client = client
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+        self._migrate()
+        # fill_details walks the backlog by rating_key from here, wrapping around
+        self.detail_cursor = ""
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def _migrate(self):
+        columns = [row[1] for row in self.db.execute("PRAGMA table_info(tracks)")]
+        if "detailed_at" not in columns:
+            with self.db:
+                self.db.execute("ALTER TABLE tracks ADD COLUMN detailed_at INTEGER")
+                self.db.execute("UPDATE tracks SET detailed_at = 0 WHERE bit_depth IS NOT NULL")
+
+    def lookup(self, rating_key):
+        """Stream details for a track, or None if they haven't been fetched yet.
+
+        ``bit_depth``/``sampling_rate`` are None for files that have none.
+        """
+        with self.lock:
+            row = self.db.execute(
+                "SELECT container, codec, bit_depth, sampling_rate, thumb FROM tracks "
+                "WHERE rating_key = ? AND detailed_at IS NOT NULL",
+                (rating_key,),
+            ).fetchone()
+        if row is None:
+            return None
+        container, codec, bit_depth, sampling_rate, thumb = row
+        return {
+            "container": container,
+            "codec": codec,
+            "bit_depth": bit_depth,
+            "sampling_rate": sampling_rate,
+            "thumb": thumb,
+        }
+
+    def store(self, track):
+        """Store a track from a full metadata fetch."""
+        with self.lock, self.db:
+            self._upsert([track_row(track, detailed=True)])
+
+    def _upsert(self, rows):
+        self.db.executemany(
+            "INSERT OR REPLACE INTO tracks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+
+    def music_sections(self):
+        url = f"{self.client.base_url}/library/sections"
+        params = {'X-Plex-Token': self.client.token}
+        return [directory.get("key") for directory in self.client.iter_listing(url, params)
+                if directory.tag == "Directory" and directory.get("type") == "artist"]
+
+    def sync_section(self, key):
+        with self.lock:
+            row = self.db.execute("SELECT updated_at FROM sections WHERE key = ?", (key,)).fetchone()
+        since = row[0] if row else 0
+        newest = since
+        synced = 0
+        start = 0
+        while True:
+            # updatedAt>>= is Plex's "greater than" filter
+            url = f"{self.client.base_url}/library/sections/{key}/all?type=10&updatedAt>>={since}"
+            params = {
+                'X-Plex-Token': self.client.token,
+                'X-Plex-Container-Start': start,
+                'X-Plex-Container-Size': PAGE_SIZE,
+            }
+            rows = [track_row(track) for track in self.client.iter_listing(url, params) if track.tag == "Track"]
+            if rows:
+                newest = max(newest, max(row[7] for row in rows))
+                with self.lock, self.db:
+                    self._upsert(rows)
+                synced += len(rows)
+            if len(rows) < PAGE_SIZE:
+                break
+            start += PAGE_SIZE
+
+        with self.lock, self.db:
+            self.db.execute("INSERT OR REPLACE INTO sections VALUES (?, ?)", (key, newest))
+        return synced
+
+    def fill_details(self, limit=DETAIL_BATCH):
+        """Fetch full metadata for tracks whose listing lacked their stream details.
+
+        Each batch continues after the last rating_key of the one before, so
+        tracks whose fetch fails are retried on the next pass over the
+        backlog instead of being picked first every time.
+        """
+        with self.lock:
+            keys = [row[0] for row in self.db.execute(
+                "SELECT rating_key FROM tracks WHERE detailed_at IS NULL AND rating_key > ? "
+                "ORDER BY rating_key LIMIT ?", (self.detail_cursor, limit))]
+        # A short batch reached the end of the backlog; start over next time
+        self.detail_cursor = keys[-1] if len(keys) == limit else ""
+        filled = 0
+        for rating_key in keys:
+            if self.stop_event.is_set():
+                break
+            track = self.client.get_track(rating_key)
+            if track is not None:
+                self.store(track)
+                filled += 1
+        return filled
+
+    def sync(self):
+        start = time.time()
+        synced = sum(self.sync_section(key) for key in self.music_sections())
+        filled = self.fill_details()
+        print(f"Library index: {synced} track(s) updated, {filled} detailed in {time.time() - start:.1f}s")
+        return synced
+
+    def start(self, interval=SYNC_INTERVAL):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, args=(interval,), name="library-sync", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self, interval):
+        while not self.stop_event.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Error syncing library index: {e}")
+            self.stop_event.wait(interval)
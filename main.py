@@ -1,31 +1,44 @@
 import time
-import subprocess
-import requests
 import json
+import signal
+import asyncio
 import logging
+import subprocess
+import concurrent.futures
 from pathlib import Path
-import board
-import busio
-from adafruit_pn532.i2c import PN532_I2C
+import displayd
+import nfc
+import statebus
+from nfcreader import NFCReader
+from cardcache import CardCache
+from playerclient import PlayerClient, PLAYER_URL
+from nfcstatus import StatusLog
+from metrics import registry
+from snapshot import SNAPSHOT_FILE
 
 # Set up logging
 logging.basicConfig(filename='nfc_plex_integration.log', level=logging.DEBUG, 
                     format='%(asctime)s - %(levelname)s - %(message)s')
 
-# JSON file to log NFC errors
-error_log_file = 'nfc_errors.json'
+# NFC status log (nfc_errors.json), read by the clock screen
+status_log = StatusLog()
+
+CURRENTLY_PLAYING_FILE = SNAPSHOT_FILE
+REPRESENT_WINDOW = 180  # seconds a removed card can come back and just resume
+# A child that exits within QUICK_EXIT seconds of starting is restarted after
+# RESTART_DELAY, doubling up to MAX_RESTART_DELAY, and given up on after
+# MAX_QUICK_EXITS in a row; one that ran longer starts over at RESTART_DELAY
+RESTART_DELAY = 1
+MAX_RESTART_DELAY = 60
+QUICK_EXIT = 10
+MAX_QUICK_EXITS = 6
+CHILD_STOP_TIMEOUT = 10  # seconds a child gets to exit on SIGTERM before it is killed
 
-# Function to log messages into a JSON file
+# Function to log messages into the NFC status log
 def log_nfc_status(status_message, is_error=False):
-    log_data = {
-        "status": status_message,
-        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())
-    }
     log_type = "error" if is_error else "info"
-    
     try:
-        with open(error_log_file, 'a') as f:
-            f.write(json.dumps(log_data) + '\n')
+        status_log.append(status_message, is_error)
         if is_error:
             logging.error(f"NFC {log_type} logged: {status_message}")
         else:
@@ -36,10 +49,7 @@ def log_nfc_status(status_message, is_error=False):
 # Initialize PN532 with error handling and logging success
 def init_nfc_module():
     try:
-        i2c = busio.I2C(board.SCL, board.SDA)
-        pn532 = PN532_I2C(i2c, debug=False)
-        # Configure PN532
-        pn532.SAM_configuration()
+        pn532 = nfc.init_pn532()
         log_nfc_status("NFC is up!")
         return pn532
     except Exception as e:
@@ -48,33 +58,9 @@ def init_nfc_module():
         return None
 
 
-def check_nfc_card(pn532):
-    # Check if a card is available to read
-    if pn532 is not None:
-        try:
-            uid = pn532.read_passive_target(timeout=0.1)
-            return ':'.join([hex(i)[2:].zfill(2) for i in uid]) if uid else None
-        except Exception as e:
-            error_message = f"Error reading NFC card: {str(e)}"
-            log_nfc_error(error_message)
-            return None
-    return None
-
-def run_script(script_name, use_venv=False):
-    cmd = [".venv/bin/python" if use_venv else "python", script_name]
-    logging.info(f"Starting script: {' '.join(cmd)}")
-    return subprocess.Popen(cmd)
-
-def open_url(url):
-    try:
-        response = requests.get(url, timeout=1)
-        logging.info(f"Opened URL: {url}, Status: {response.status_code}")
-    except requests.RequestException as e:
-        logging.error(f"Failed to open URL: {url}, Error: {str(e)}")
-
 def check_media_status():
     try:
-        with open('currentlyplaying.json', 'r') as f:
+        with open(CURRENTLY_PLAYING_FILE, 'r') as f:
             data = json.load(f)
         status = data.get('event')
         logging.debug(f"Current media status: {status}")
@@ -83,93 +69,218 @@ def check_media_status():
         logging.error(f"Error reading media status: {str(e)}")
         return None
 
-def ensure_script_running(process, script_name):
-    if process is None or process.poll() is not None:
-        logging.info(f"{script_name} is not running, starting it now")
-        return run_script(script_name)
-    return process
-
-def handle_nfc_card(current_card_id, last_card_id, time_process, fb_process):
-    if current_card_id != last_card_id:
-        logging.info(f"New card detected: {current_card_id}")
-        Path("card_id.txt").write_text(current_card_id)
-        subprocess.run([".venv/bin/python", "nfc.py"])
-        if time_process:
-            logging.info("Stopping Time.py")
-            time_process.terminate()
-            time_process.wait()
-        fb_process = ensure_script_running(fb_process, "fb.py")
-        time_process = None
-    return current_card_id, time_process, fb_process
+def show_screen(mode):
+    try:
+        reply = displayd.show(mode)
+        logging.info(f"Display: {reply}")
+    except OSError as e:
+        logging.error(f"Failed to switch display to {mode}: {str(e)}")
 
-def main():
-    last_card_id = None
-    card_removed_time = None
-    time_process = run_script("Time.py")
-    fb_process = None
-    last_media_status = None
 
-    webhook_process = run_script("webhooklistener.py")
+class ThreadsafeQueue:
+    """Lets the NFC reader thread publish straight into an asyncio.Queue."""
 
-    # Initialize NFC module
-    pn532 = init_nfc_module()
+    def __init__(self, loop, events):
+        self.loop = loop
+        self.events = events
 
-    while True:
-        try:
-            current_card_id = check_nfc_card(pn532)
-            media_status = check_media_status()
-
-            if current_card_id:
-                last_card_id, time_process, fb_process = handle_nfc_card(
-                    current_card_id, last_card_id, time_process, fb_process
-                )
-                card_removed_time = None
-            elif last_card_id:
-                logging.info("NFC card removed")
-                open_url("http://localhost:32500/player/playback/pause")
-                if fb_process:
-                    logging.info("Stopping fb.py")
-                    fb_process.terminate()
-                    fb_process.wait()
-                time_process = ensure_script_running(time_process, "Time.py")
-                card_removed_time = time.time()
-                last_card_id = None
-
-            if media_status != last_media_status:
-                logging.info(f"Media status changed from {last_media_status} to {media_status}")
-                last_media_status = media_status
-                if media_status in ['media.play', 'media.resume']:
-                    if time_process:
-                        logging.info("Stopping Time.py")
-                        time_process.terminate()
-                        time_process.wait()
-                    fb_process = ensure_script_running(fb_process, "fb.py")
-                elif media_status in ['media.pause', 'media.stop'] and not current_card_id:
-                    if fb_process:
-                        logging.info("Stopping fb.py")
-                        fb_process.terminate()
-                        fb_process.wait()
-                    time_process = ensure_script_running(time_process, "Time.py")
-
-            if card_removed_time and time.time() - card_removed_time <= 180:
-                new_card_id = check_nfc_card(pn532)
-                if new_card_id == Path("card_id.txt").read_text().strip():
-                    logging.info(f"Card re-presented within 3 minutes: {new_card_id}")
-                    last_card_id = new_card_id
-                    card_removed_time = None
-                    if media_status == 'media.play':
-                        if time_process:
-                            time_process.terminate()
-                            time_process.wait()
-                        fb_process = ensure_script_running(fb_process, "fb.py")
-                    else:
-                        open_url("http://localhost:32500/player/playback/play")
-
-            time.sleep(0.1)
+    def put(self, event):
+        self.loop.call_soon_threadsafe(self.events.put_nowait, event)
+
+
+class Controller:
+    """The NFC/Plex controller as independent asyncio tasks.
+
+    Card presence, media-state changes (pushed over the state bus) and
+    child-process supervision each run in their own task.  The PN532 stays
+    on the NFCReader thread, which pushes events into the loop; player
+    commands are queued on a PlayerClient; everything else that blocks
+    (file reads, display IPC) runs in a thread pool, so a hung player
+    command cannot hold up card detection or the pause that follows a card
+    removal.
+    """
+
+    def __init__(self, reader, player=None, scripts=("displayd.py",),
+                 show=show_screen, media_status=check_media_status, state_socket=statebus.STATE_SOCKET):
+        self.reader = reader
+        self.state_socket = state_socket
+        # Commands queue without blocking; playMedia has its own lane in the client
+        self.player = player if player is not None else PlayerClient(PLAYER_URL)
+        self.scripts = scripts
+        self.show = show
+        self.media_status = media_status
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="controller")
+        self.current_card_id = None
+        self.current_card_uri = None
+        self.removed_card_id = None
+        self.card_removed_time = None
+        self.last_media_status = None
+        self.children = {}  # script name -> running asyncio subprocess
+
+    async def blocking(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def nfc_presence(self, events):
+        while True:
+            event = await events.get()
+            # One bad event must not take card handling down with it
+            try:
+                await self.card_event(event)
+            except Exception as e:
+                logging.error(f"Error handling {event}: {str(e)}")
 
+    async def card_event(self, event):
+        if event.kind == "present":
+            await self.card_presented(event.uid, event.uri)
+        elif event.kind == "rewritten" and event.uid == self.current_card_id:
+            logging.info(f"Card {event.uid} was rewritten, switching to {event.uri}")
+            self.current_card_uri = event.uri
+            self.player.play_media(event.uri)
+        elif event.kind == "removed":
+            await self.card_removed()
+
+    async def card_presented(self, card_id, card_uri):
+        self.current_card_id, self.current_card_uri = card_id, card_uri
+        if (card_id == self.removed_card_id and self.card_removed_time
+                and time.time() - self.card_removed_time <= REPRESENT_WINDOW):
+            logging.info(f"Card re-presented within 3 minutes: {card_id}")
+            self.card_removed_time = None
+            if self.last_media_status != 'media.play':
+                self.player.command("play")
+            await self.blocking(self.show, "nowplaying")
+            return
+
+        logging.info(f"New card detected: {card_id}")
+        self.card_removed_time = None
+        await self.blocking(Path("card_id.txt").write_text, card_id)
+        if card_uri:
+            self.player.play_media(card_uri)
+            latency = self.reader.record_request()
+            if latency is not None and self.reader.cache is not None:
+                logging.info(f"Tap-to-request latency: {latency * 1000:.0f} ms, "
+                             f"card cache hit rate: {self.reader.cache.hit_rate():.0%}")
+        else:
+            logging.error(f"No play URI could be read from card {card_id}")
+        await self.blocking(self.show, "nowplaying")
+
+    async def card_removed(self):
+        logging.info("NFC card removed")
+        self.removed_card_id = self.current_card_id
+        self.current_card_id = self.current_card_uri = None
+        self.card_removed_time = time.time()
+        self.player.command("pause")
+        await self.blocking(self.show, "clock")
+
+    async def media_state(self):
+        """Follow media status: the snapshot file once, then states pushed by the webhook listener."""
+        try:
+            await self.media_status_changed(await self.blocking(self.media_status))
         except Exception as e:
-            logging.error(f"An error occurred: {str(e)}")
-            time.sleep(1)
+            logging.error(f"Error reading initial media status: {str(e)}")
+        last_seq = None
+        async for state in statebus.watch_states(self.state_socket):
+            # The bus resends its latest state on every reconnect
+            if state.get('seq') == last_seq:
+                continue
+            last_seq = state.get('seq')
+            try:
+                await self.media_status_changed(state.get('event'))
+            except Exception as e:
+                logging.error(f"Error handling media status {state.get('event')}: {str(e)}")
+
+    async def media_status_changed(self, media_status):
+        if media_status == self.last_media_status:
+            return
+        logging.info(f"Media status changed from {self.last_media_status} to {media_status}")
+        self.last_media_status = media_status
+        if media_status in ['media.play', 'media.resume']:
+            await self.blocking(self.show, "nowplaying")
+        elif media_status in ['media.pause', 'media.stop'] and not self.current_card_id:
+            await self.blocking(self.show, "clock")
+
+    async def supervise(self, script_name):
+        """Keep a child script running, restarting it with backoff whenever it exits."""
+        delay = RESTART_DELAY
+        quick_exits = 0
+        while True:
+            logging.info(f"Starting script: python {script_name}")
+            started = time.monotonic()
+            try:
+                process = await asyncio.create_subprocess_exec("python", script_name)
+            except OSError as e:
+                logging.error(f"Failed to start {script_name}: {str(e)}")
+            else:
+                self.children[script_name] = process
+                returncode = await process.wait()
+                del self.children[script_name]
+                logging.info(f"{script_name} exited with {returncode}")
+
+            if time.monotonic() - started >= QUICK_EXIT:
+                delay, quick_exits = RESTART_DELAY, 0
+            else:
+                quick_exits += 1
+                if quick_exits >= MAX_QUICK_EXITS:
+                    logging.error(f"{script_name} exited right after starting {quick_exits} times in a row, "
+                                  f"not restarting it")
+                    return
+            logging.info(f"Restarting {script_name} in {delay} s")
+            await asyncio.sleep(delay)
+            if quick_exits:
+                delay = min(delay * 2, MAX_RESTART_DELAY)
+
+    async def stop_children(self):
+        """Terminate the supervised scripts, killing any that outstay CHILD_STOP_TIMEOUT."""
+        children = list(self.children.items())
+        for script_name, process in children:
+            if process.returncode is None:
+                logging.info(f"Stopping {script_name}")
+                process.terminate()
+        for script_name, process in children:
+            try:
+                await asyncio.wait_for(process.wait(), CHILD_STOP_TIMEOUT)
+            except asyncio.TimeoutError:
+                logging.error(f"{script_name} did not stop, killing it")
+                process.kill()
+                await process.wait()
+        self.children.clear()
+
+    async def run(self):
+        loops = [self.media_state()]
+        loops += [self.supervise(script) for script in self.scripts]
+        if self.reader is not None:
+            # Subscribe before the reader thread starts so the first card isn't missed
+            events = asyncio.Queue()
+            self.reader.subscribe(ThreadsafeQueue(asyncio.get_running_loop(), events))
+            self.reader.start()
+            loops.append(self.nfc_presence(events))
+        tasks = [asyncio.create_task(coroutine) for coroutine in loops]
+        # systemd stops us with SIGTERM; cancelling runs the cleanup below
+        loop = asyncio.get_running_loop()
+        try:
+            loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except RuntimeError:
+            pass  # not on the main thread; whoever runs us there handles signals
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            loop.remove_signal_handler(signal.SIGTERM)
+            # Whether cancelled or failed, nothing we started outlives the controller
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.stop_children()
+
+
+def main():
+    # Initialize NFC module; the reader service owns it from here on
+    pn532 = init_nfc_module()
+    reader = NFCReader(pn532, cache=CardCache()) if pn532 is not None else None
+    # NFC read and tap timings, served by the webhook listener's /metrics
+    registry.start_export("nfc")
+    try:
+        asyncio.run(Controller(reader).run())
+    except asyncio.CancelledError:
+        logging.info("Stopped")
 
 if __name__ == "__main__":
     subprocess.run(["fbset", "-fb", "/dev/fb0", "-g", "800", "480", "800", "480", "16"], check=True)
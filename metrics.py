@@ -0,0 +1,397 @@
+import os
+import glob
+import time
+import bisect
+import threading
+import collections
+from contextlib import contextmanager
+
+# Each process writes its metrics here; the webhook listener serves them all
+METRICS_DIR = os.getenv("METRICS_DIR", "/tmp/plexdap-metrics")
+EXPORT_INTERVAL = 15
+WINDOW = 60  # seconds covered by rates and recent quantiles
+WINDOW_SLOTS = 6
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# For work that usually takes well under a millisecond
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025) + LATENCY_BUCKETS
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class LatencyHistogram:
+    """Cumulative-bucket latency histogram (seconds), Prometheus style."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    def subtract(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] -= count
+        self.count -= other.count
+        self.sum -= other.sum
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class PerThread:
+    """One ``factory()`` value per thread, so writers never share or lock state.
+
+    Readers walk every thread's value.  Each value is only ever written by
+    its own thread, so a reader sees at worst a slightly stale number.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = self.factory()
+            # The only lock: taken once per thread, on its first write
+            with self.lock:
+                self.shards.append(shard)
+            return shard
+
+    def all(self):
+        with self.lock:
+            return list(self.shards)
+
+
+class Window:
+    """Rolling view of a cumulative value, kept entirely on the read side.
+
+    Each read records a sample (at most one per slot) and diffs the current
+    value against the newest sample at least ``window`` seconds old, so
+    writers never look at the clock.
+    """
+
+    def __init__(self, window, zero):
+        self.window = window
+        self.samples = collections.deque([(time.monotonic(), zero)])
+        self.lock = threading.Lock()
+
+    def since(self, value):
+        """(oldest value in the window, seconds it covers) after recording ``value``."""
+        now = time.monotonic()
+        with self.lock:
+            if now - self.samples[-1][0] >= self.window / WINDOW_SLOTS:
+                self.samples.append((now, value))
+            while len(self.samples) > 1 and now - self.samples[1][0] >= self.window:
+                self.samples.popleft()
+            start, old = self.samples[0]
+        return old, max(now - start, 1.0)
+
+
+class Counter:
+    """Monotonic counter, optionally split by one label, with a rolling rate."""
+
+    def __init__(self, name, help, label=None, window=WINDOW):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.window = window
+        # label value -> count, one dict per thread
+        self.shards = PerThread(dict)
+        self.history = Window(window, {})
+
+    def inc(self, label_value=None, amount=1):
+        shard = self.shards.get()
+        shard[label_value] = shard.get(label_value, 0) + amount
+
+    def totals(self):
+        totals = collections.Counter()
+        for shard in self.shards.all():
+            # list() copies the items in one step, safe against the owner inserting
+            for label_value, count in list(shard.items()):
+                totals[label_value] += count
+        return dict(totals)
+
+    def total(self, label_value=None):
+        return self.totals().get(label_value, 0)
+
+    def rates(self):
+        """Per-second rate of each label value over about the last ``window`` seconds."""
+        totals = self.totals()
+        old, seconds = self.history.since(totals)
+        return {label_value: (count - old.get(label_value, 0)) / seconds for label_value, count in totals.items()}
+
+    def labels(self, label_value):
+        return {self.label: label_value} if self.label else {}
+
+    def families(self):
+        labels = self.labels
+        totals = sorted(self.totals().items(), key=lambda item: str(item[0]))
+        rates = sorted(self.rates().items(), key=lambda item: str(item[0]))
+        rate_name = self.name[:-len('_total')] if self.name.endswith('_total') else self.name
+        yield self.name, 'counter', self.help, [(self.name, labels(value), total) for value, total in totals]
+        yield (f"{rate_name}_per_second", 'gauge', f"{self.help}, per second over the last {self.window}s",
+               [(f"{rate_name}_per_second", labels(value), rate) for value, rate in rates])
+
+
+class Histogram:
+    """Latency histogram, optionally split by one label.
+
+    Keeps an all-time histogram for Prometheus; ``recent`` diffs it against
+    an older copy for quantiles that follow the last ``window`` seconds.
+    """
+
+    def __init__(self, name, help, label=None, buckets=LATENCY_BUCKETS, window=WINDOW):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self.window = window
+        # label value -> LatencyHistogram, one dict per thread
+        self.shards = PerThread(dict)
+        self.history = Window(window, {})
+
+    def observe(self, seconds, label_value=None):
+        shard = self.shards.get()
+        histogram = shard.get(label_value)
+        if histogram is None:
+            histogram = shard[label_value] = LatencyHistogram(self.buckets)
+        histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, label_value=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, label_value)
+
+    def label_values(self):
+        return sorted({value for shard in self.shards.all() for value in list(shard)}, key=str)
+
+    def total(self, label_value=None):
+        merged = LatencyHistogram(self.buckets)
+        for shard in self.shards.all():
+            histogram = shard.get(label_value)
+            if histogram is not None:
+                merged.merge(histogram)
+        return merged
+
+    def recent(self, label_value=None):
+        """Histogram of roughly the last ``window`` seconds of observations."""
+        totals = {value: self.total(value) for value in self.label_values()}
+        old, _ = self.history.since(totals)
+        recent = LatencyHistogram(self.buckets)
+        if label_value in totals:
+            recent.merge(totals[label_value])
+        if label_value in old:
+            recent.subtract(old[label_value])
+        return recent
+
+    def labels(self, label_value):
+        return {self.label: label_value} if self.label else {}
+
+    def summary(self, label_value=None):
+        recent = self.recent(label_value)
+        summary = {'count': self.total(label_value).count, 'recent_count': recent.count}
+        for q in QUANTILES:
+            summary[f"p{round(q * 100)}"] = recent.quantile(q)
+        return summary
+
+    def families(self):
+        samples, recent_samples = [], []
+        for label_value in self.label_values():
+            labels = self.labels(label_value)
+            total = self.total(label_value)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), total.counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", dict(labels, le=format_value(bound)), cumulative))
+            samples.append((f"{self.name}_sum", labels, total.sum))
+            samples.append((f"{self.name}_count", labels, total.count))
+            recent = self.recent(label_value)
+            for q in QUANTILES:
+                recent_samples.append((f"{self.name}_recent", dict(labels, quantile=str(q)), recent.quantile(q)))
+        yield self.name, 'histogram', self.help, samples
+        yield (f"{self.name}_recent", 'gauge', f"{self.help}, bucket bound of the quantile over the last {self.window}s",
+               recent_samples)
+
+
+class Gauge:
+    """A value read from ``fn`` at collection time: a number, or a dict keyed by label value."""
+
+    def __init__(self, name, help, fn, label=None, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.label = label
+        self.kind = kind
+
+    def families(self):
+        value = self.fn()
+        if isinstance(value, dict):
+            samples = [(self.name, {self.label: label_value}, number)
+                       for label_value, number in sorted(value.items(), key=lambda item: str(item[0]))]
+        else:
+            samples = [(self.name, {}, value)] if value is not None else []
+        yield self.name, self.kind, self.help, samples
+
+
+def format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, int):
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Registry:
+    """Named metrics for one process, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.exporter = None
+
+    def _register(self, metric):
+        with self.lock:
+            # Registering a name twice hands back the first one
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, label=None, window=WINDOW):
+        return self._register(Counter(name, help, label, window))
+
+    def histogram(self, name, help, label=None, buckets=LATENCY_BUCKETS, window=WINDOW):
+        return self._register(Histogram(name, help, label, buckets, window))
+
+    def gauge(self, name, help, fn, label=None, kind='gauge'):
+        return self._register(Gauge(name, help, fn, label, kind))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            for family, kind, help, samples in metric.families():
+                if not samples:
+                    continue
+                lines.append(f"# HELP {family} {help}")
+                lines.append(f"# TYPE {family} {kind}")
+                for name, labels, value in samples:
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+    def start_export(self, component, directory=METRICS_DIR, interval=EXPORT_INTERVAL):
+        """Write this process's metrics to ``directory/<component>.prom`` every ``interval`` seconds."""
+        if self.exporter is not None:
+            return self.exporter
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{component}.prom")
+
+        def run():
+            while True:
+                try:
+                    self.export(path)
+                except OSError as e:
+                    print(f"Error exporting metrics to {path}: {e}")
+                time.sleep(interval)
+
+        self.exporter = threading.Thread(target=run, name="metrics-export", daemon=True)
+        self.exporter.start()
+        return self.exporter
+
+
+def read_exported(directory=METRICS_DIR, max_age=EXPORT_INTERVAL * 4):
+    """Metrics text exported by the other processes, skipping any that stopped updating."""
+    texts = []
+    now = time.time()
+    for path in sorted(glob.glob(os.path.join(directory, "*.prom"))):
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                continue
+            with open(path) as f:
+                texts.append(f.read())
+        except OSError:
+            continue
+    return "".join(texts)
+
+
+def merge_families(*texts):
+    """Join metrics texts from several processes, one HELP/TYPE and one block per family.
+
+    A family declared by two processes is merged under its first
+    declaration; a sample line seen twice (same name and labels) keeps the
+    first value.
+    """
+    families = {}
+    order = []
+    family = None
+    for text in texts:
+        for line in text.splitlines():
+            if not line:
+                continue
+            if line.startswith('# '):
+                parts = line.split(' ', 3)
+                if len(parts) < 3:
+                    continue
+                family = parts[2]
+                if family not in families:
+                    families[family] = {'help': None, 'type': None, 'samples': {}}
+                    order.append(family)
+                key = parts[1].lower()
+                if key in ('help', 'type') and families[family][key] is None:
+                    families[family][key] = line
+                continue
+            if family is None:
+                continue
+            series = line.rsplit(' ', 1)[0]
+            families[family]['samples'].setdefault(series, line)
+    lines = []
+    for family in order:
+        entry = families[family]
+        if not entry['samples']:
+            continue
+        lines.extend(line for line in (entry['help'], entry['type']) if line)
+        lines.extend(entry['samples'].values())
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+# Shared by everything in this process
+registry = Registry()
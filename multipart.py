@@ -0,0 +1,165 @@
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class Part:
+    def __init__(self, headers):
+        self.headers = headers
+        self.name = None
+        self.filename = None
+        disposition = headers.get('content-disposition', '')
+        for param in disposition.split(';')[1:]:
+            key, _, value = param.strip().partition('=')
+            value = value.strip().strip('"')
+            if key.lower() == 'name':
+                self.name = value
+            elif key.lower() == 'filename':
+                self.filename = value
+        self.content_type = headers.get('content-type')
+
+    def __repr__(self):
+        return f"Part(name={self.name!r}, filename={self.filename!r})"
+
+
+class BufferSink:
+    """Collects a part in memory, refusing parts larger than ``limit`` bytes."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.limit:
+            raise ValueError(f"Form field larger than {self.limit} bytes")
+        self.chunks.append(bytes(data))
+
+    def close(self):
+        pass
+
+    def getvalue(self):
+        return b''.join(self.chunks)
+
+
+def boundary_from(content_type):
+    """The boundary parameter of a multipart Content-Type header, or None."""
+    kind, _, params = (content_type or '').partition(';')
+    if kind.strip().lower() != 'multipart/form-data':
+        return None
+    for param in params.split(';'):
+        key, _, value = param.strip().partition('=')
+        if key.lower() == 'boundary' and value:
+            return value.strip('"')
+    return None
+
+
+class MultipartParser:
+    """Incremental multipart/form-data parser.
+
+    Body bytes are passed to ``feed`` as they arrive off the socket.  For
+    each part ``on_part(part)`` is called once its headers are in and
+    returns a sink (anything with ``write``/``close``) for the part's body,
+    or None to skip the body without keeping any of it.  Only a boundary's
+    worth of bytes is held back between calls.
+    """
+
+    def __init__(self, boundary, on_part):
+        if isinstance(boundary, str):
+            boundary = boundary.encode('latin-1')
+        self.delimiter = b'\r\n--' + boundary
+        self.on_part = on_part
+        # The first boundary has no CRLF in front of it
+        self.buffer = bytearray(b'\r\n')
+        self.state = 'preamble'
+        self.sink = None
+        self.parts = 0
+        self.stopped = False
+
+    @property
+    def done(self):
+        return self.state == 'done'
+
+    def feed(self, data):
+        if self.stopped:
+            return
+        self.buffer += data
+        while not self.stopped and self._step():
+            pass
+        if self.stopped:
+            self.buffer.clear()
+
+    def stop(self):
+        """Ignore the rest of the body; safe to call from a sink or ``on_part``."""
+        self.stopped = True
+
+    def close(self):
+        """Call at the end of the body; raises ValueError if it was cut short."""
+        if self.state != 'done' and not self.stopped:
+            raise ValueError("Multipart body ended before the closing boundary")
+
+    def _step(self):
+        buffer = self.buffer
+        if self.state == 'preamble':
+            index = buffer.find(self.delimiter)
+            if index < 0:
+                del buffer[:max(0, len(buffer) - len(self.delimiter) + 1)]
+                return False
+            del buffer[:index + len(self.delimiter)]
+            self.state = 'delimiter'
+            return True
+
+        if self.state == 'delimiter':
+            if len(buffer) < 2:
+                return False
+            if buffer[:2] == b'--':
+                buffer.clear()
+                self.state = 'done'
+                return False
+            end = buffer.find(b'\r\n')
+            if end < 0:
+                return False
+            del buffer[:end + 2]  # CRLF, after any transport padding
+            self.state = 'headers'
+            return True
+
+        if self.state == 'headers':
+            if buffer[:2] == b'\r\n':
+                head, end = b'', 2
+            else:
+                index = buffer.find(b'\r\n\r\n')
+                if index < 0:
+                    if len(buffer) > MAX_HEADER_BYTES:
+                        raise ValueError("Multipart part headers too large")
+                    return False
+                head, end = bytes(buffer[:index]), index + 4
+            del buffer[:end]
+            headers = {}
+            for line in head.decode('latin-1').split('\r\n'):
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            self.parts += 1
+            self.sink = self.on_part(Part(headers))
+            self.state = 'body'
+            return True
+
+        if self.state == 'body':
+            index = buffer.find(self.delimiter)
+            if index < 0:
+                # Everything but a possible partial delimiter at the end is body
+                safe = len(buffer) - len(self.delimiter) + 1
+                if safe > 0:
+                    if self.sink is not None:
+                        self.sink.write(buffer[:safe])
+                    del buffer[:safe]
+                return False
+            if self.sink is not None:
+                self.sink.write(buffer[:index])
+                self.sink.close()
+                self.sink = None
+            del buffer[:index + len(self.delimiter)]
+            self.state = 'delimiter'
+            return True
+
+        # done: ignore the epilogue
+        buffer.clear()
+        return False
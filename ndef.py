@@ -0,0 +1,137 @@
+"""NDEF message parsing over memoryview, so record payloads are never copied.
+
+Only what reading play URIs off tags needs: records are iterated lazily,
+chunked records are reassembled and URI records (well-known "U", absolute
+URIs and URIs inside smart posters) are decoded.  Malformed input raises
+ValueError.
+"""
+
+# TNF values
+TNF_EMPTY = 0x00
+TNF_WELL_KNOWN = 0x01
+TNF_MEDIA = 0x02
+TNF_ABSOLUTE_URI = 0x03
+TNF_EXTERNAL = 0x04
+TNF_UNKNOWN = 0x05
+TNF_UNCHANGED = 0x06
+
+# Record header flags
+FLAG_MB = 0x80  # message begin
+FLAG_ME = 0x40  # message end
+FLAG_CF = 0x20  # chunk flag
+FLAG_SR = 0x10  # short record: 1-byte payload length
+FLAG_IL = 0x08  # ID length present
+
+# URI identifier codes 0x00-0x23 (NFC Forum URI RTD)
+URI_PREFIXES = (
+    "", "http://www.", "https://www.", "http://", "https://", "tel:", "mailto:",
+    "ftp://anonymous:anonymous@", "ftp://ftp.", "ftps://", "sftp://", "smb://",
+    "nfs://", "ftp://", "dav://", "news:", "telnet://", "imap:", "rtsp://",
+    "urn:", "pop:", "sip:", "sips:", "tftp:", "btspp://", "btl2cap://",
+    "btgoep://", "tcpobex://", "irdaobex://", "file://", "urn:epc:id:",
+    "urn:epc:tag:", "urn:epc:pat:", "urn:epc:raw:", "urn:epc:", "urn:nfc:",
+)
+
+
+class NDEFRecord:
+    def __init__(self, tnf, record_type, record_id, payload, flags):
+        self.tnf = tnf
+        self.type = record_type  # bytes
+        self.id = record_id  # bytes
+        self.payload = payload  # memoryview into the message (bytes for chunked records)
+        self.flags = flags
+
+    def __repr__(self):
+        return f"NDEFRecord(tnf={self.tnf}, type={self.type!r}, payload={len(self.payload)} bytes)"
+
+
+def _read_record(view, offset):
+    """Parse the record header at ``offset``; returns (tnf, type, id, payload, flags, next offset)."""
+    end = len(view)
+    if offset >= end:
+        raise ValueError("NDEF message ended without an ME record")
+    flags = view[offset]
+    tnf = flags & 0x07
+    if offset + 2 > end:
+        raise ValueError("Truncated NDEF record header")
+    type_length = view[offset + 1]
+    position = offset + 2
+    if flags & FLAG_SR:
+        if position + 1 > end:
+            raise ValueError("Truncated NDEF record header")
+        payload_length = view[position]
+        position += 1
+    else:
+        if position + 4 > end:
+            raise ValueError("Truncated NDEF record header")
+        payload_length = int.from_bytes(view[position:position + 4], 'big')
+        position += 4
+    id_length = 0
+    if flags & FLAG_IL:
+        if position + 1 > end:
+            raise ValueError("Truncated NDEF record header")
+        id_length = view[position]
+        position += 1
+
+    type_end = position + type_length
+    id_end = type_end + id_length
+    payload_end = id_end + payload_length
+    if payload_end > end:
+        raise ValueError("NDEF record runs past the end of the message")
+    if tnf == TNF_EMPTY and (type_length or id_length or payload_length):
+        raise ValueError("Empty NDEF record with content")
+    return (tnf, bytes(view[position:type_end]), bytes(view[type_end:id_end]),
+            view[id_end:payload_end], flags, payload_end)
+
+
+def iter_records(message):
+    """Lazily yield the ``NDEFRecord``s of an NDEF message (bytes-like)."""
+    view = memoryview(message)
+    offset = 0
+    first = True
+    while True:
+        tnf, record_type, record_id, payload, flags, offset = _read_record(view, offset)
+        if first and not flags & FLAG_MB:
+            raise ValueError("First NDEF record lacks the MB flag")
+        first = False
+        if tnf == TNF_UNCHANGED:
+            raise ValueError("Unchanged TNF outside a chunked record")
+
+        if flags & FLAG_CF:
+            # Chunked payload: the following TNF_UNCHANGED chunks carry the rest
+            chunks = [payload]
+            while flags & FLAG_CF:
+                if flags & FLAG_ME:
+                    raise ValueError("Chunked NDEF record ends the message")
+                chunk_tnf, chunk_type, _, payload, flags, offset = _read_record(view, offset)
+                if chunk_tnf != TNF_UNCHANGED or chunk_type:
+                    raise ValueError("Malformed NDEF record chunk")
+                chunks.append(payload)
+            payload = memoryview(b''.join(chunks))
+
+        yield NDEFRecord(tnf, record_type, record_id, payload, flags)
+        if flags & FLAG_ME:
+            return
+
+
+def decode_uri_payload(payload):
+    """Expand the identifier code of a URI record payload."""
+    if len(payload) < 1:
+        raise ValueError("Empty URI record")
+    code = payload[0]
+    prefix = URI_PREFIXES[code] if code < len(URI_PREFIXES) else ""
+    return prefix + str(payload[1:], 'utf-8', 'ignore')
+
+
+def find_uri(message):
+    """The first URI in an NDEF message, looking inside smart posters; None if there is none."""
+    for record in iter_records(message):
+        if record.tnf == TNF_WELL_KNOWN and record.type == b'U':
+            return decode_uri_payload(record.payload)
+        if record.tnf == TNF_ABSOLUTE_URI:
+            return record.type.decode('utf-8', errors='ignore')
+        if record.tnf == TNF_WELL_KNOWN and record.type == b'Sp':
+            uri = find_uri(record.payload)
+            if uri is not None:
+                return uri
+    return None
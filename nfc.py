@@ -1,10 +1,8 @@
-import board
-import busio
-from adafruit_pn532.i2c import PN532_I2C
 import time
 import re
 import sys
 import urllib.request
+import ndef
 
 # Define Key B (default for many cards is FFFFFFFFFFFF)
 KEY_B = b'\xFF\xFF\xFF\xFF\xFF\xFF'
@@ -14,84 +12,155 @@ TLV_TAG_NULL = 0x00
 TLV_TAG_NDEF = 0x03
 TLV_TAG_TERMINATOR = 0xFE
 
-# I2C setup for Raspberry Pi
-i2c = busio.I2C(board.SCL, board.SDA)
+MIFARE_CLASSIC_BLOCKS = 64  # 1K card
+NTAG_MAX_PAGE = 231  # NTAG216; the capability container usually narrows this
+READ_RETRIES = 4
+RETRY_DELAY = 0.01  # doubles per failed attempt up to RETRY_DELAY_MAX
+RETRY_DELAY_MAX = 0.2
+
+def init_pn532():
+    # Hardware libraries are only importable on the Pi; simulated readers don't need them
+    import board
+    import busio
+    from adafruit_pn532.i2c import PN532_I2C
+
+    # I2C setup for Raspberry Pi
+    i2c = busio.I2C(board.SCL, board.SDA)
+
+    # PN532 setup
+    pn532 = PN532_I2C(i2c, debug=False)
+    pn532.SAM_configuration()
+    return pn532
+
+def ndef_tlv_bounds(data):
+    """Locate the NDEF TLV in the start of a tag's data area.
+
+    Returns ``(start, end)`` byte offsets of the whole TLV once its header
+    has been read (``end`` may lie beyond the data read so far), None if
+    more data is needed to tell, and raises ValueError if the terminator
+    TLV comes first.  Other TLVs (lock/memory control, proprietary) are
+    skipped by their length.
+    """
+    i = 0
+    while i < len(data):
+        tag = data[i]
+        if tag == TLV_TAG_NULL:
+            i += 1
+            continue
+        if tag == TLV_TAG_TERMINATOR:
+            raise ValueError("No NDEF TLV on tag")
+        if i + 1 >= len(data):
+            return None
+        length = data[i + 1]
+        header = 2
+        if length == 0xFF:  # 3-byte length
+            if i + 3 >= len(data):
+                return None
+            length = int.from_bytes(data[i + 2:i + 4], 'big')
+            header = 4
+        if tag == TLV_TAG_NDEF:
+            return i, i + header + length
+        i += header + length
+    return None
 
-# PN532 setup
-pn532 = PN532_I2C(i2c, debug=False)
-pn532.SAM_configuration()
+def with_retries(operation, retries=READ_RETRIES, delay=RETRY_DELAY):
+    """Call ``operation`` until it returns something truthy, backing off exponentially."""
+    for attempt in range(retries):
+        try:
+            result = operation()
+            if result:
+                return result
+        except Exception:
+            pass
+        if attempt < retries - 1:
+            time.sleep(delay)
+            delay = min(delay * 2, RETRY_DELAY_MAX)
+    return None
 
-def read_ndef_data(uid):
-    ndef_data = b''
-    for block_num in range(4, 64):  # Read from block 4 to 63
-        retry_count = 0
-        while retry_count < 3:  # Retry up to 3 times
+def collect_ndef_tlv(blocks):
+    """Consume ``blocks`` (data-area chunks) only until the NDEF TLV is complete."""
+    data = bytearray()
+    bounds = None
+    for block_data in blocks:
+        if block_data is None:
+            return None
+        data += block_data
+        if bounds is None:
             try:
-                if pn532.mifare_classic_authenticate_block(uid, block_num, 0x61, KEY_B):
-                    block_data = pn532.mifare_classic_read_block(block_num)
-                    if block_data is not None:
-                        ndef_data += block_data
-                        break  # Successfully read the block, move to the next
-                    else:
-                        retry_count += 1
-                else:
-                    retry_count += 1
-            except Exception:
-                retry_count += 1
-            
-            time.sleep(0.1)  # Short delay before retry
-        
-        if retry_count == 3:
-            continue  # Skip this block if all retries failed
-        
-        # Check for NDEF message end
-        if TLV_TAG_TERMINATOR in block_data:
-            break
-
-    return ndef_data
+                bounds = ndef_tlv_bounds(data)
+            except ValueError:
+                return None
+        if bounds is not None and len(data) >= bounds[1]:
+            return bytes(data[bounds[0]:bounds[1]])
+    return bytes(data[bounds[0]:]) if bounds else None
+
+def mifare_classic_blocks(pn532, uid):
+    """Yield MIFARE Classic data blocks, authenticating once per sector and skipping trailers."""
+    for block_num in range(4, MIFARE_CLASSIC_BLOCKS):
+        if block_num % 4 == 3:  # sector trailer holds keys and access bits, not data
+            continue
+        authenticate = lambda: pn532.mifare_classic_authenticate_block(uid, block_num, 0x61, KEY_B)
+        if block_num % 4 == 0 and not with_retries(authenticate):
+            yield None
+            return
+
+        def read_block():
+            block_data = pn532.mifare_classic_read_block(block_num)
+            if block_data is None:
+                # A failed read drops the sector's authentication
+                authenticate()
+            return block_data
+
+        yield with_retries(read_block)
+
+def ntag_blocks(pn532):
+    """Yield NTAG21x data area in 16-byte READs of four pages each.
+
+    The first READ starts at the capability container (page 3), which gives
+    the data area size and the first 12 bytes of data in one transaction.
+    """
+    # adafruit's ntag2xx_read_block keeps only 4 of the 16 bytes READ returns;
+    # mifare_classic_read_block issues the same READ and keeps all of them
+    read = lambda page: with_retries(lambda: pn532.mifare_classic_read_block(page))
+    block_data = read(3)
+    if block_data is None:
+        yield None
+        return
+    last_page = NTAG_MAX_PAGE
+    if block_data[0] == 0xE1:
+        last_page = 4 + block_data[2] * 2  # CC size byte counts 8-byte units
+    yield block_data[4:16]
+    for page in range(7, last_page, 4):
+        block_data = read(page)
+        yield block_data[:16] if block_data is not None else None
+
+def read_ndef_data(pn532, uid):
+    """Read the NDEF TLV (tag, length and message) from a MIFARE Classic or NTAG21x card.
+
+    Only as many blocks as the TLV length needs are read; 7-byte UIDs are
+    treated as NTAG21x, anything else as MIFARE Classic 1K.
+    """
+    if len(uid) == 7:
+        return collect_ndef_tlv(ntag_blocks(pn532))
+    return collect_ndef_tlv(mifare_classic_blocks(pn532, uid))
 
 def parse_ndef_message(ndef_data):
-    if ndef_data[0] != TLV_TAG_NDEF:
-        return None
-
-    # NDEF message length (skip TLV tag and length field)
-    ndef_length = ndef_data[1]
-    if ndef_length == 0xFF:  # 3-byte length
-        ndef_start = 4
-    else:
-        ndef_start = 2
-
-    # Extract the entire NDEF message
-    ndef_message = ndef_data[ndef_start:]  # Read all data after length field
-
-    # Parse the NDEF record
-    return parse_ndef_record(ndef_message)
-
-def parse_ndef_record(record):
-    if len(record) < 3:
-        return None
-    
-    type_length = record[1]
-    
-    if len(record) < 3 + type_length:
+    """Play URI from the NDEF TLV returned by read_ndef_data, or None."""
+    try:
+        bounds = ndef_tlv_bounds(ndef_data)
+        if bounds is None:
+            return None
+        tlv_start, tlv_end = bounds
+        header = 4 if ndef_data[tlv_start + 1] == 0xFF else 2
+        uri = ndef.find_uri(memoryview(ndef_data)[tlv_start + header:tlv_end])
+    except ValueError:
         return None
-    
-    record_type = record[3:3 + type_length]
-    payload = record[3 + type_length:]  # Read all remaining data as payload
-    
-    if record_type == b'U':
-        return decode_uri(payload)
-    return None
+    return local_play_uri(uri) if uri else None
 
 def decode_uri(uri_bytes):
-    uri_prefix_map = {
-        0x00: '', 0x01: 'http://www.', 0x02: 'https://www.',
-        0x03: 'http://', 0x04: 'https://',
-    }
-    prefix_code = uri_bytes[0]
-    uri_body = uri_bytes[1:].decode('utf-8', errors='ignore')
-    full_uri = uri_prefix_map.get(prefix_code, '') + uri_body
-    
+    return local_play_uri(ndef.decode_uri_payload(uri_bytes))
+
+def local_play_uri(full_uri):
     # Remove all "@" symbols
     cleaned_uri = full_uri.replace("@", "")
     
@@ -105,13 +174,22 @@ def clean_url(url):
     cleaned_url = re.sub(r'[\x00-\x1f\x7f]', '', url)  # Remove control characters
     return cleaned_url
 
+def read_card_uri(pn532, uid):
+    """Read the NDEF message on the card and return its cleaned play URI, or None."""
+    ndef_data = read_ndef_data(pn532, uid)
+    if not ndef_data:
+        return None
+    decoded_uri = parse_ndef_message(ndef_data)
+    return clean_url(decoded_uri) if decoded_uri else None
+
 def main():
     print("Waiting for NFC card...", file=sys.stderr)
+    pn532 = init_pn532()
     
     while True:
         uid = pn532.read_passive_target(timeout=0.5)
         if uid is not None:
-            ndef_data = read_ndef_data(uid)
+            ndef_data = read_ndef_data(pn532, uid)
             if ndef_data:
                 decoded_uri = parse_ndef_message(ndef_data)
                 if decoded_uri:
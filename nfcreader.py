@@ -0,0 +1,267 @@
+import time
+import queue
+import logging
+import threading
+import collections
+import nfc
+from metrics import registry
+
+POLL_TIMEOUT = 0.1  # seconds read_passive_target waits for a card
+# Poll fast right after a card comes or goes, then slow down linearly over
+# POLL_DECAY seconds: to PRESENT_INTERVAL while a card sits on the reader
+# (removal still pauses promptly), to IDLE_INTERVAL when the reader is empty
+POLL_INTERVAL = 0.05
+PRESENT_INTERVAL = 0.25
+IDLE_INTERVAL = 1.0
+POLL_DECAY = 60
+# Consecutive reads needed before a new card / an empty reader is believed
+PRESENT_READS = 1
+REMOVED_READS = 2
+
+read_seconds = registry.histogram('nfc_read_seconds', 'Time to read the URI off a card')
+tap_seconds = registry.histogram('nfc_tap_to_request_seconds', 'Time from card tap to playback request')
+# result is "hit", "miss" or "stale" (a hit whose card turned out to be rewritten)
+card_cache_lookups = registry.counter('nfc_card_cache_lookups_total', 'Card cache lookups by result', 'result')
+
+
+def format_uid(uid):
+    return ':'.join([hex(i)[2:].zfill(2) for i in uid])
+
+
+class CardEvent:
+    def __init__(self, kind, uid, uri=None, cached=False):
+        # kind is "present", "rewritten" (a cached URI turned out stale) or "removed"
+        self.kind = kind
+        self.uid = uid
+        self.uri = uri
+        self.cached = cached
+        self.time = time.time()
+
+    def __repr__(self):
+        return f"CardEvent({self.kind!r}, {self.uid!r}, {self.uri!r}, cached={self.cached})"
+
+
+class TransactionCounter:
+    """Wraps a PN532 and timestamps every call made through it.
+
+    Only the last minute of timestamps is kept; calls come from the reader
+    thread, which drops the old ones as it adds each new one.
+    """
+
+    def __init__(self, pn532, clock=time.monotonic):
+        self.pn532 = pn532
+        self.clock = clock
+        self.times = collections.deque()
+        self.total = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self.pn532, name)
+        if not callable(attribute):
+            return attribute
+
+        def counted(*args, **kwargs):
+            now = self.clock()
+            self.total += 1
+            self.times.append(now)
+            while self.times[0] < now - 60:
+                self.times.popleft()
+            return attribute(*args, **kwargs)
+        return counted
+
+    def per_minute(self):
+        # Read from other threads (the metrics export), so count rather than trim
+        cutoff = self.clock() - 60
+        return sum(1 for t in list(self.times) if t >= cutoff)
+
+
+class NFCReader:
+    """Owns the PN532 and is the only code that talks to it.
+
+    A background thread polls for a card, reads the NDEF play URI in-process
+    when a new card arrives and publishes ``CardEvent``s to every subscriber
+    queue.  ``pn532`` is any object with the adafruit PN532 API, so a
+    ``nfcsim.SimulatedPN532`` can stand in for the hardware.
+
+    With a ``cardcache.CardCache`` a known card is published straight from
+    the cache; the tag is then re-read on the same thread (nothing else may
+    use the PN532) and a "rewritten" event follows if its URI changed.
+
+    Presence is debounced: a new card must be seen ``present_reads`` polls
+    in a row and a card only counts as removed after ``removed_reads``
+    empty polls, so a tag at the edge of the field does not flap.  The poll
+    rate adapts as described at POLL_DECAY; ``clock`` can be replaced to
+    drive the state machine without waiting.
+    """
+
+    def __init__(self, pn532, poll_timeout=POLL_TIMEOUT, poll_interval=POLL_INTERVAL, cache=None,
+                 present_interval=PRESENT_INTERVAL, idle_interval=IDLE_INTERVAL, decay=POLL_DECAY,
+                 present_reads=PRESENT_READS, removed_reads=REMOVED_READS, clock=time.monotonic):
+        self.pn532 = TransactionCounter(pn532, clock)
+        self.cache = cache
+        self.poll_timeout = poll_timeout
+        self.poll_interval = poll_interval
+        self.present_interval = present_interval
+        self.idle_interval = idle_interval
+        self.decay = decay
+        self.present_reads = present_reads
+        self.removed_reads = removed_reads
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.current_uid = None
+        self.current_uri = None
+        self.candidate_uid = None
+        self.sightings = 0
+        self.misses = 0
+        self.last_activity = clock()
+        self.tapped_at = None
+        self.stats = {'taps': 0, 'requests': 0, 'last_latency': 0.0, 'latency_total': 0.0,
+                      'polls': 0, 'debounced': 0}
+        self.stop_event = threading.Event()
+        self.thread = None
+        registry.gauge('nfc_transactions_per_minute', 'PN532 calls over the last minute',
+                       self.transactions_per_minute)
+
+    def subscribe(self, events=None):
+        """Register ``events`` (anything with ``put``, a new queue.Queue by default) for CardEvents."""
+        if events is None:
+            events = queue.Queue()
+        with self.lock:
+            self.subscribers.append(events)
+        return events
+
+    def unsubscribe(self, events):
+        with self.lock:
+            self.subscribers.remove(events)
+
+    def publish(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for events in subscribers:
+            events.put(event)
+
+    def current_card(self):
+        with self.lock:
+            return self.current_uid, self.current_uri
+
+    def record_request(self):
+        """Note that playback was requested for the current card; returns tap-to-request seconds."""
+        with self.lock:
+            if self.tapped_at is None:
+                return None
+            latency = time.monotonic() - self.tapped_at
+            self.tapped_at = None
+            self.stats['requests'] += 1
+            self.stats['last_latency'] = latency
+            self.stats['latency_total'] += latency
+        tap_seconds.observe(latency)
+        return latency
+
+    def read_uri(self, uid):
+        try:
+            with read_seconds.time():
+                return nfc.read_card_uri(self.pn532, uid)
+        except Exception as e:
+            logging.error(f"Error reading NDEF data: {str(e)}")
+            return None
+
+    def poll(self):
+        """Check the reader once; publishes and returns an event if the card changed."""
+        try:
+            uid = self.pn532.read_passive_target(timeout=self.poll_timeout)
+        except Exception as e:
+            logging.error(f"Error reading NFC card: {str(e)}")
+            uid = None
+        tapped_at = time.monotonic()
+        uid_text = format_uid(uid) if uid else None
+        self.stats['polls'] += 1
+
+        if uid_text == self.current_uid:
+            if self.misses or self.sightings:
+                self.stats['debounced'] += 1
+            self.misses = 0
+            self.candidate_uid, self.sightings = None, 0
+            return None
+        if uid_text is None:
+            self.candidate_uid, self.sightings = None, 0
+            self.misses += 1
+            if self.misses < self.removed_reads:
+                return None
+            self.misses = 0
+            event = CardEvent("removed", self.current_uid)
+            self._set_card(None, None, None)
+            self.publish(event)
+            return event
+
+        self.misses = 0
+        if uid_text != self.candidate_uid:
+            self.candidate_uid, self.sightings = uid_text, 0
+        self.sightings += 1
+        if self.sightings < self.present_reads:
+            return None
+        self.candidate_uid, self.sightings = None, 0
+
+        cached_uri = self.cache.get(uid_text) if self.cache else None
+        if self.cache:
+            card_cache_lookups.inc('hit' if cached_uri else 'miss')
+        if cached_uri:
+            event = CardEvent("present", uid_text, cached_uri, cached=True)
+            self._set_card(uid_text, cached_uri, tapped_at)
+            self.publish(event)
+            self.verify(uid, uid_text, cached_uri)
+            return event
+
+        uri = self.read_uri(uid)
+        if uri and self.cache:
+            self.cache.put(uid_text, uri)
+        event = CardEvent("present", uid_text, uri)
+        self._set_card(uid_text, uri, tapped_at)
+        self.publish(event)
+        return event
+
+    def verify(self, uid, uid_text, cached_uri):
+        """Re-read a card that was served from the cache and fix the cache if it was rewritten."""
+        uri = self.read_uri(uid)
+        if not uri or uri == cached_uri:
+            return
+        logging.info(f"Card {uid_text} was rewritten: {cached_uri} -> {uri}")
+        card_cache_lookups.inc('stale')
+        self.cache.put(uid_text, uri)
+        with self.lock:
+            if self.current_uid != uid_text:
+                return
+            self.current_uri = uri
+        self.publish(CardEvent("rewritten", uid_text, uri))
+
+    def next_interval(self):
+        """Seconds to wait before the next poll."""
+        if self.misses or self.sightings:
+            return self.poll_interval  # settle a pending debounce quickly
+        slowest = self.present_interval if self.current_uid else self.idle_interval
+        settled = min(1.0, (self.clock() - self.last_activity) / self.decay) if self.decay else 1.0
+        return self.poll_interval + (slowest - self.poll_interval) * settled
+
+    def transactions_per_minute(self):
+        return self.pn532.per_minute()
+
+    def _set_card(self, uid_text, uri, tapped_at):
+        self.last_activity = self.clock()
+        with self.lock:
+            self.current_uid = uid_text
+            self.current_uri = uri
+            self.tapped_at = tapped_at
+            if uid_text is not None:
+                self.stats['taps'] += 1
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="nfc-reader", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.poll()
+            self.stop_event.wait(self.next_interval())
@@ -0,0 +1,153 @@
+"""Simulated PN532 and tag images, for running the NFC code without hardware."""
+import time
+import collections
+from ndef import URI_PREFIXES
+
+# Trailer as read back: key A always reads as zeros; GPB 0x40 ('@') is what
+# local_play_uri strips from URIs that ran across a trailer
+DEFAULT_TRAILER = bytes(6) + b'\xFF\x07\x80\x40' + b'\xFF' * 6
+
+
+def uri_record(uri):
+    # Longest matching identifier code, as tag writers do
+    prefix_code = 0
+    for code, prefix in enumerate(URI_PREFIXES):
+        if uri.startswith(prefix) and len(prefix) > len(URI_PREFIXES[prefix_code]):
+            prefix_code = code
+    payload = bytes([prefix_code]) + uri[len(URI_PREFIXES[prefix_code]):].encode()
+    if len(payload) < 256:
+        return bytes([0xD1, 0x01, len(payload)]) + b'U' + payload
+    return bytes([0xC1, 0x01]) + len(payload).to_bytes(4, 'big') + b'U' + payload
+
+
+def ndef_tlv(message):
+    if len(message) < 0xFF:
+        length = bytes([len(message)])
+    else:
+        length = b'\xFF' + len(message).to_bytes(2, 'big')
+    return b'\x03' + length + message + b'\xFE'
+
+
+def mifare_classic_image(uri, blocks=64):
+    """1K MIFARE Classic memory with an NDEF URI message starting at block 4."""
+    data = ndef_tlv(uri_record(uri))
+    image = {}
+    offset = 0
+    for block in range(blocks):
+        if block % 4 == 3:
+            image[block] = DEFAULT_TRAILER
+        elif block == 0:
+            image[block] = bytes(16)
+        elif block < 4:
+            # MAD sector; contents don't matter to the reader
+            image[block] = bytes(16)
+        else:
+            image[block] = data[offset:offset + 16].ljust(16, b'\x00')
+            offset += 16
+    return image
+
+
+def ntag_image(uri, pages=135):
+    """NTAG21x memory (4-byte pages) with the NDEF TLV starting at page 4."""
+    data = ndef_tlv(uri_record(uri))
+    image = {page: bytes(4) for page in range(pages)}
+    image[3] = bytes([0xE1, 0x10, (pages - 9) * 4 // 8, 0x00])  # capability container
+    for index in range(0, len(data), 4):
+        image[4 + index // 4] = data[index:index + 4].ljust(4, b'\x00')
+    return image
+
+
+class SimulatedTag:
+    def __init__(self, uid, memory, kind='mifare_classic'):
+        self.uid = bytes(uid)
+        self.memory = memory
+        self.kind = kind
+
+
+class SimulatedPN532:
+    """Stands in for adafruit_pn532's PN532_I2C.
+
+    ``present``/``remove`` set what is on the reader and ``script`` queues
+    what each following ``read_passive_target`` sees.  ``fail_reads`` makes
+    the next reads fail, ``latency`` adds a per-transaction delay and
+    ``transactions`` counts bus round trips by command.
+    """
+
+    def __init__(self, latency=0.0):
+        self.tag = None
+        self.latency = latency
+        self.fail_reads = 0
+        self.authenticated_sector = None
+        self.transactions = {}
+        self.steps = collections.deque()
+
+    def _transaction(self, name):
+        self.transactions[name] = self.transactions.get(name, 0) + 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    @property
+    def transaction_count(self):
+        return sum(self.transactions.values())
+
+    def present(self, tag):
+        self.tag = tag
+        self.authenticated_sector = None
+
+    def remove(self):
+        self.tag = None
+        self.authenticated_sector = None
+
+    def script(self, steps):
+        """Queue a tag (or None for an empty field) per upcoming poll; the last one stays."""
+        self.steps.extend(steps)
+
+    def SAM_configuration(self):
+        self._transaction('SAM_configuration')
+
+    def read_passive_target(self, timeout=1):
+        self._transaction('read_passive_target')
+        if self.steps:
+            self.tag = self.steps.popleft()
+        if self.tag is None:
+            if timeout and not self.latency:
+                time.sleep(min(timeout, 0.001))
+            return None
+        self.authenticated_sector = None
+        return bytearray(self.tag.uid)
+
+    def mifare_classic_authenticate_block(self, uid, block_number, key_number, key):
+        self._transaction('authenticate')
+        if self.tag is None or self.tag.kind != 'mifare_classic' or bytes(uid) != self.tag.uid:
+            self.authenticated_sector = None
+            return False
+        self.authenticated_sector = block_number // 4
+        return True
+
+    def mifare_classic_read_block(self, block_number):
+        # On an NTAG this is a plain READ returning four pages
+        self._transaction('read_block')
+        if self.tag is None:
+            return None
+        if self.tag.kind == 'ntag':
+            pages = [self.tag.memory.get(block_number + i, bytes(4)) for i in range(4)]
+        elif self.authenticated_sector != block_number // 4:
+            return None
+        if self.fail_reads:
+            self.fail_reads -= 1
+            if self.tag.kind == 'mifare_classic':
+                self.authenticated_sector = None
+            return None
+        if self.tag.kind == 'ntag':
+            return bytearray(b''.join(pages))
+        return bytearray(self.tag.memory.get(block_number, bytes(16)))
+
+    def ntag2xx_read_block(self, block_number):
+        # adafruit_pn532 returns only the first of the four pages READ fetches
+        self._transaction('ntag_read')
+        if self.tag is None or self.tag.kind != 'ntag':
+            return None
+        if self.fail_reads:
+            self.fail_reads -= 1
+            return None
+        return bytearray(self.tag.memory.get(block_number, bytes(4)))
@@ -0,0 +1,100 @@
+import os
+import json
+import time
+import threading
+
+NFC_STATUS_FILE = os.getenv("NFC_STATUS_FILE", "nfc_errors.json")
+MAX_BYTES = 64 * 1024  # rotate to <file>.1 beyond this
+TAIL_BYTES = 1024  # enough for the last few status lines
+WATCH_INTERVAL = 1
+
+
+class StatusLog:
+    """Append-only JSON-lines NFC status log with a cheap "latest status" read.
+
+    Lines are appended in time order, so the latest status is the last line:
+    ``latest`` seeks to the end of the file instead of parsing all of it,
+    and skips even that while the file's size and mtime are unchanged.  The
+    log rotates to a single backup at ``max_bytes``; the new file starts
+    with the current status so it is never empty.
+    """
+
+    def __init__(self, path=NFC_STATUS_FILE, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.cached_key = None
+        self.cached = (None, None)
+        self.subscribers = []
+
+    def append(self, status, is_error=False):
+        entry = {
+            "status": status,
+            "timestamp": time.strftime('%Y-%m-%d %H:%M:%S', time.localtime()),
+            "error": is_error,
+        }
+        line = json.dumps(entry) + '\n'
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+                size = f.tell()
+            if size > self.max_bytes:
+                os.replace(self.path, f"{self.path}.1")
+                with open(self.path, 'w') as f:
+                    f.write(line)
+            subscribers = list(self.subscribers)
+        for callback in subscribers:
+            callback(status, entry["timestamp"])
+
+    def latest(self):
+        """(status, timestamp) of the newest entry, or (None, None) if there is none."""
+        try:
+            info = os.stat(self.path)
+        except FileNotFoundError:
+            return None, None
+        key = (info.st_size, info.st_mtime_ns)
+        with self.lock:
+            if key == self.cached_key:
+                return self.cached
+        latest = self._read_tail(info.st_size)
+        with self.lock:
+            self.cached_key, self.cached = key, latest
+        return latest
+
+    def _read_tail(self, size):
+        window = TAIL_BYTES
+        with open(self.path, 'rb') as f:
+            while True:
+                f.seek(max(0, size - window))
+                lines = f.read().splitlines()
+                # The first line is partial unless the window reaches the start
+                complete = lines if window >= size else lines[1:]
+                for line in reversed(complete):
+                    try:
+                        entry = json.loads(line)
+                        return entry['status'], entry['timestamp']
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                if window >= size:
+                    return None, None
+                window *= 4
+
+    def subscribe(self, callback):
+        """Call ``callback(status, timestamp)`` for every status appended in this process."""
+        with self.lock:
+            self.subscribers.append(callback)
+
+    def watch(self, callback, interval=WATCH_INTERVAL):
+        """Call ``callback(status, timestamp)`` whenever another process appends a status."""
+        def run():
+            last = self.latest()
+            while True:
+                time.sleep(interval)
+                current = self.latest()
+                if current != last:
+                    last = current
+                    callback(*current)
+
+        thread = threading.Thread(target=run, name="nfc-status-watch", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,159 @@
+import os
+import time
+import logging
+import threading
+import collections
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import LatencyHistogram
+
+PLAYER_URL = os.getenv("PLAYER_URL", "http://localhost:32500")
+COMMAND_TIMEOUT = 5
+PLAY_TIMEOUT = 10  # playMedia has to start the queue, so it gets longer than other commands
+
+# Commands that set the transport state: only the last queued one matters
+STATE_COMMANDS = ("play", "pause", "stop")
+SKIPS = {"skipNext": 1, "skipPrevious": -1}
+
+
+class Command:
+    def __init__(self, name, url=None, count=1):
+        self.name = name
+        self.url = url  # full URL for playMedia, else built from name
+        self.count = count
+        self.queued = time.monotonic()
+
+    def __repr__(self):
+        return f"Command({self.name!r}, count={self.count})"
+
+
+class PlayerClient:
+    """Non-blocking command queue for the local Plexamp player.
+
+    Commands go out over one keep-alive session.  Commands still waiting in
+    the queue are merged:
+
+    - Consecutive skips add up to a net count: skipNext x3 and a
+      skipPrevious become a skip of two, and opposite skips cancel out.
+    - Two playPause toggles cancel out.
+    - play/pause/stop: only the last one queued is sent.
+    - A new playMedia drops everything still queued before it.
+
+    playMedia and transport commands go through separate lanes, so a slow
+    playMedia never holds up the pause that follows a card removal.  That
+    pause could land before playMedia starts playback, so the last
+    play/pause/stop given while a playMedia is queued or in flight is sent
+    again once it has finished.
+    """
+
+    def __init__(self, base_url=PLAYER_URL, session=None, timeout=COMMAND_TIMEOUT, pool_size=2):
+        self.base_url = base_url
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+        self.condition = threading.Condition()
+        self.lanes = {"media": collections.deque(), "transport": collections.deque()}
+        self.busy = set()
+        # play/pause/stop to repeat when the pending playMedia completes
+        self.after_media = None
+        self.stats = {'queued': 0, 'sent': 0, 'coalesced': 0, 'failed': 0}
+        self.latency = collections.defaultdict(LatencyHistogram)
+        for lane in self.lanes:
+            threading.Thread(target=self._run, args=(lane,), name=f"player-{lane}", daemon=True).start()
+
+    def command(self, name):
+        """Queue a playback command such as ``pause`` or ``skipNext``; returns immediately."""
+        with self.condition:
+            if name in STATE_COMMANDS and (self.lanes["media"] or "media" in self.busy):
+                self.after_media = name
+            self._enqueue("transport", Command(name))
+
+    def play_media(self, url):
+        """Queue a full playMedia URL (as read from a card)."""
+        with self.condition:
+            # Starting new media makes everything queued before it moot
+            for lane in self.lanes.values():
+                self.stats['coalesced'] += len(lane)
+                lane.clear()
+            self.after_media = None
+        self._enqueue("media", Command("playMedia", url=url))
+
+    def _enqueue(self, lane_name, command):
+        with self.condition:
+            self.stats['queued'] += 1
+            lane = self.lanes[lane_name]
+            tail = lane[-1] if lane else None
+            if tail is not None and self._merge(lane, tail, command):
+                self.stats['coalesced'] += 1
+            else:
+                lane.append(command)
+            self.condition.notify_all()
+
+    def _merge(self, lane, tail, command):
+        """Fold ``command`` into the queued ``tail``; returns False if they can't merge."""
+        if command.name in SKIPS and tail.name in SKIPS:
+            net = SKIPS[tail.name] * tail.count + SKIPS[command.name]
+            if net == 0:
+                lane.pop()
+            else:
+                tail.name = "skipNext" if net > 0 else "skipPrevious"
+                tail.count = abs(net)
+            return True
+        if command.name == "playPause" and tail.name == "playPause":
+            lane.pop()
+            return True
+        if command.name in STATE_COMMANDS and tail.name in STATE_COMMANDS:
+            tail.name = command.name
+            return True
+        if command.name == "playMedia" and tail.name == "playMedia":
+            tail.url = command.url
+            return True
+        return False
+
+    def flush(self, timeout=None):
+        """Block until every queued command has been sent; returns False on timeout."""
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: not self.busy and not any(self.lanes.values()), timeout)
+
+    def _run(self, lane_name):
+        lane = self.lanes[lane_name]
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: lane)
+                command = lane.popleft()
+                self.busy.add(lane_name)
+            try:
+                self._send(command)
+            finally:
+                with self.condition:
+                    self.busy.discard(lane_name)
+                    if lane_name == "media" and not lane and self.after_media:
+                        # Whatever playMedia started, the state asked for since wins
+                        self._enqueue("transport", Command(self.after_media))
+                        self.after_media = None
+                    self.condition.notify_all()
+
+    def _send(self, command):
+        if command.url:
+            urls = [command.url]
+        else:
+            # The player API has no skip-by-n, so a merged skip is sent back to
+            # back over the open connection
+            urls = [f"{self.base_url}/player/playback/{command.name}"] * command.count
+        timeout = PLAY_TIMEOUT if command.name == "playMedia" else self.timeout
+        self.latency["queued"].observe(time.monotonic() - command.queued)
+        for url in urls:
+            start = time.monotonic()
+            try:
+                response = self.session.get(url, timeout=timeout)
+                logging.info(f"Opened URL: {url}, Status: {response.status_code}")
+                self.stats['sent'] += 1
+            except requests.RequestException as e:
+                logging.error(f"Failed to open URL: {url}, Error: {str(e)}")
+                self.stats['failed'] += 1
+            self.latency[command.name].observe(time.monotonic() - start)
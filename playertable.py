@@ -0,0 +1,121 @@
+import os
+import re
+import json
+from statebus import StateBus, STATE_SOCKET
+from snapshot import SnapshotWriter, SNAPSHOT_FILE, read_seq
+
+# JSON list of {"name", "uuid", "state_socket", "snapshot_file"}, one per DAP
+PLAYERS_FILE = os.getenv("PLAYERS_FILE", "players.json")
+# The Player object of a webhook payload.  It has no nested objects, and
+# Plex sends it ahead of the much larger Metadata.
+PLAYER_FIELD = re.compile(rb'"Player"\s*:\s*(\{[^{}]*\})')
+PLAYER_SEARCH_BYTES = 16 * 1024
+
+
+def snapshot_seq(path):
+    # Carry the sequence on from the last snapshot so subscribers never see it go backwards
+    seq = read_seq(path)
+    if seq is not None:
+        return seq
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get('seq', 0)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return 0
+
+
+def player_field(payload_head):
+    """The Player object from the first bytes of a raw payload, or None if it isn't there yet."""
+    match = PLAYER_FIELD.search(payload_head)
+    if match is None:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
+
+class PlayerRoute:
+    """One player's now-playing state and where it goes: its own state bus and snapshot file."""
+
+    def __init__(self, name, uuid=None, title=None, state_socket=STATE_SOCKET, snapshot_file=SNAPSHOT_FILE,
+                 latency=None):
+        self.name = name
+        self.uuid = uuid
+        self.title = title
+        self.state_bus = StateBus(state_socket, seq=snapshot_seq(snapshot_file))
+        # The file stays as a snapshot for whoever starts up or reconnects later;
+        # bursts of events are written once
+        self.snapshot_writer = SnapshotWriter(snapshot_file, latency=latency)
+        self.state = None
+
+    def publish(self, state):
+        """Stamp ``state`` with this player's next seq, push it to its subscribers and snapshot it."""
+        state = self.state_bus.publish(state)
+        self.snapshot_writer.update(state)
+        self.state = state
+        return state
+
+
+class PlayerTable:
+    """The players this listener serves, looked up by UUID.
+
+    Entries without a UUID are matched on the player's title instead, which
+    is how a single ``TARGET_PLAYER`` is configured.
+    """
+
+    def __init__(self, routes=()):
+        self.routes = []
+        self.by_uuid = {}
+        self.by_title = {}
+        for route in routes:
+            self.add(route)
+
+    def add(self, route):
+        self.routes.append(route)
+        if route.uuid:
+            self.by_uuid[route.uuid] = route
+        elif route.title:
+            self.by_title[route.title] = route
+
+    def lookup(self, player):
+        """The route for a webhook's Player object, or None for a player we don't serve."""
+        if not isinstance(player, dict):
+            return None
+        route = self.by_uuid.get(player.get('uuid'))
+        if route is None and self.by_title:
+            route = self.by_title.get(player.get('title'))
+        return route
+
+    def start(self):
+        for route in self.routes:
+            route.state_bus.start()
+
+    def flush(self, timeout=None):
+        """Write every player's pending snapshot; returns False if any is still pending."""
+        return all([route.snapshot_writer.flush(timeout) for route in self.routes])
+
+    def snapshot_stats(self):
+        totals = {}
+        for route in self.routes:
+            for kind, count in route.snapshot_writer.stats.items():
+                totals[kind] = totals.get(kind, 0) + count
+        return totals
+
+
+def load_players(path=PLAYERS_FILE, default_title=None, latency=None):
+    """The table from the players file; without one, just ``default_title`` on the default socket and file."""
+    try:
+        with open(path, 'r') as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return PlayerTable([PlayerRoute(default_title, title=default_title, latency=latency)])
+    routes = []
+    for entry in entries:
+        name = entry['name']
+        routes.append(PlayerRoute(
+            name, uuid=entry.get('uuid'), title=entry.get('title'),
+            state_socket=entry.get('state_socket', f"/tmp/plexdap-state-{name}.sock"),
+            snapshot_file=entry.get('snapshot_file', f"currentlyplaying-{name}.json"),
+            latency=latency))
+    return PlayerTable(routes)
@@ -0,0 +1,108 @@
+import threading
+import xml.etree.ElementTree as ET
+import requests
+from requests.adapters import HTTPAdapter
+
+PLEX_TIMEOUT = 5
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class PlexClient:
+    """Plex metadata lookups over one keep-alive session.
+
+    ``get_track`` fetches ``/library/metadata/{ratingKey}`` directly;
+    ``find_track`` walks a (possibly large) listing with ``iterparse`` and
+    stops at the first match.  Concurrent lookups for the same key share a
+    single request.
+    """
+
+    def __init__(self, base_url, token, session=None, timeout=PLEX_TIMEOUT, pool_size=4):
+        self.base_url = base_url
+        self.token = token
+        self.timeout = timeout
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.stats = {'requests': 0, 'coalesced': 0}
+
+    def _once(self, key, fn):
+        with self.lock:
+            call = self.in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self.in_flight[key] = _Call()
+            else:
+                self.stats['coalesced'] += 1
+
+        if not leader:
+            call.event.wait()
+        else:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self.lock:
+                    del self.in_flight[key]
+                call.event.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def get_track(self, rating_key):
+        """Return the ``Track`` element for ``rating_key``, or None."""
+        return self._once(('metadata', rating_key), lambda: self._get_track(rating_key))
+
+    def _get_track(self, rating_key):
+        self.stats['requests'] += 1
+        response = self.session.get(
+            f"{self.base_url}/library/metadata/{rating_key}",
+            params={'X-Plex-Token': self.token},
+            timeout=self.timeout,
+        )
+        if response.status_code != 200:
+            return None
+        return ET.fromstring(response.content).find("Track")
+
+    def find_track(self, url, rating_key):
+        """Stream the listing at ``url`` and return the first ``Track`` with ``rating_key``."""
+        return self._once(('listing', url, rating_key), lambda: self._find_track(url, rating_key))
+
+    def _find_track(self, url, rating_key):
+        self.stats['requests'] += 1
+        for element in self.iter_listing(url):
+            if element.tag == "Track" and element.get("ratingKey") == rating_key:
+                return element
+        return None
+
+    def iter_listing(self, url, params=None):
+        """Yield the direct children of the MediaContainer at ``url`` as they are parsed.
+
+        Each element is cleared once the caller moves on, so memory stays flat
+        however long the listing is.  Stopping early drops the connection.
+        """
+        with self.session.get(url, params=params, stream=True, timeout=self.timeout) as response:
+            if response.status_code != 200:
+                return
+            response.raw.decode_content = True
+            depth = 0
+            for event, element in ET.iterparse(response.raw, events=('start', 'end')):
+                if event == 'start':
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 1:
+                    yield element
+                    element.clear()
@@ -0,0 +1,156 @@
+import os
+import threading
+import itertools
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+PLAYER_URL = os.getenv("PLAYER_URL", "http://localhost:32500")
+PREFETCH_LOOKAHEAD = int(os.getenv("PREFETCH_LOOKAHEAD", 3))
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", 2))
+PREFETCH_INTERVAL = 5  # seconds between play queue polls
+CLIENT_IDENTIFIER = "plexdap-prefetch"
+
+
+class QueuePrefetcher:
+    """Pre-renders now-playing frames for the next tracks in the Plex play queue.
+
+    A background thread polls the player's timeline for the current play
+    queue, reads the queue from the server and hands the next ``lookahead``
+    ``Track`` elements to ``render`` on a bounded worker pool.  Whenever the
+    upcoming tracks change, pending jobs are cancelled and running ones are
+    discarded when they finish.  ``get_frame`` then turns a track change into
+    a dictionary lookup.
+    """
+
+    def __init__(self, server_url, token, render, player_url=PLAYER_URL,
+                 lookahead=PREFETCH_LOOKAHEAD, workers=PREFETCH_WORKERS,
+                 interval=PREFETCH_INTERVAL, session=None):
+        self.server_url = server_url
+        self.token = token
+        self.render = render
+        self.player_url = player_url
+        self.lookahead = lookahead
+        self.interval = interval
+        self.session = session or requests.Session()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.command_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.frames = OrderedDict()
+        self.pending = {}
+        self.upcoming = ()
+        self.generation = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.stats = {'polls': 0, 'rendered': 0, 'cancelled': 0, 'hits': 0, 'misses': 0, 'errors': 0}
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="prefetch-poll", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.lock:
+            self._cancel_pending()
+        self.executor.shutdown(wait=False)
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                self.stats['errors'] += 1
+                print(f"Error prefetching play queue: {e}")
+            self.stop_event.wait(self.interval)
+
+    def get_frame(self, track_id):
+        with self.lock:
+            frame = self.frames.get(track_id)
+        self.stats['hits' if frame is not None else 'misses'] += 1
+        return frame
+
+    def fetch_play_queue_id(self):
+        response = self.session.get(
+            f"{self.player_url}/player/timeline/poll",
+            params={'wait': 0, 'commandID': next(self.command_ids)},
+            headers={'X-Plex-Client-Identifier': CLIENT_IDENTIFIER},
+            timeout=2,
+        )
+        response.raise_for_status()
+        root = ET.fromstring(response.content)
+        for timeline in root.iter("Timeline"):
+            if timeline.get("type") == "music" and timeline.get("playQueueID"):
+                return timeline.get("playQueueID")
+        return None
+
+    def fetch_upcoming_tracks(self, play_queue_id):
+        response = self.session.get(
+            f"{self.server_url}/playQueues/{play_queue_id}",
+            params={'window': self.lookahead + 1, 'X-Plex-Token': self.token},
+            timeout=5,
+        )
+        response.raise_for_status()
+        root = ET.fromstring(response.content)
+        selected = root.get("playQueueSelectedItemID")
+        tracks = root.findall("Track")
+        for index, track in enumerate(tracks):
+            if track.get("playQueueItemID") == selected:
+                return tracks[index + 1:index + 1 + self.lookahead]
+        return tracks[:self.lookahead]
+
+    def refresh(self):
+        """Poll the play queue once and reschedule pre-renders if it changed."""
+        self.stats['polls'] += 1
+        play_queue_id = self.fetch_play_queue_id()
+        tracks = self.fetch_upcoming_tracks(play_queue_id) if play_queue_id else []
+        self.schedule(tracks)
+
+    def schedule(self, tracks):
+        upcoming = tuple(track.get("ratingKey") for track in tracks)
+        with self.lock:
+            if upcoming == self.upcoming:
+                return
+            self.upcoming = upcoming
+            self.generation += 1
+            self._cancel_pending()
+            # Keep already rendered frames for tracks that are still coming up,
+            # plus the most recent ones so the current track stays available
+            for track_id in list(self.frames):
+                if len(self.frames) <= self.lookahead * 2:
+                    break
+                if track_id not in upcoming:
+                    del self.frames[track_id]
+            for track in tracks:
+                track_id = track.get("ratingKey")
+                if track_id in self.frames:
+                    continue
+                future = self.executor.submit(self._render, track, self.generation)
+                self.pending[track_id] = future
+
+    def _cancel_pending(self):
+        for future in self.pending.values():
+            if future.cancel():
+                self.stats['cancelled'] += 1
+        self.pending = {}
+
+    def _render(self, track, generation):
+        if generation != self.generation or self.stop_event.is_set():
+            return
+        track_id = track.get("ratingKey")
+        try:
+            frame = self.render(track)
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"Error pre-rendering track {track_id}: {e}")
+            return
+        with self.lock:
+            if generation != self.generation:
+                self.stats['cancelled'] += 1
+                return
+            self.pending.pop(track_id, None)
+            if frame is not None:
+                self.frames[track_id] = frame
+                self.frames.move_to_end(track_id)
+                self.stats['rendered'] += 1
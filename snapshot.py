@@ -0,0 +1,104 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+from metrics import LatencyHistogram
+
+SNAPSHOT_FILE = os.getenv("SNAPSHOT_FILE", "currentlyplaying.json")
+# Updates arriving within this window of the first pending one share a single write
+SNAPSHOT_DELAY = 0.5
+SEQ_HEAD_BYTES = 32
+SEQ_HEAD = re.compile(rb'\{"seq":(\d+)[,}]')
+
+
+def encode(state):
+    # seq goes first so readers can check it from the first few bytes
+    state = dict(state)
+    head = {'seq': state.pop('seq')} if 'seq' in state else {}
+    return json.dumps({**head, **state}, separators=(',', ':')).encode()
+
+
+def write_snapshot(path, state):
+    """Replace ``path`` with ``state`` atomically; returns the bytes written."""
+    data = encode(state)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+def read_seq(path):
+    """The snapshot's seq, read from its first bytes only; None if it has none."""
+    try:
+        with open(path, 'rb') as f:
+            match = SEQ_HEAD.match(f.read(SEQ_HEAD_BYTES))
+    except OSError:
+        return None
+    return int(match.group(1)) if match else None
+
+
+class SnapshotWriter:
+    """Write-behind writer for the now-playing snapshot file.
+
+    ``update`` only records the newest state; a background thread writes it
+    ``delay`` seconds after the first pending update, so a burst of
+    pause/resume events costs one write.  Every write goes to a temp file
+    that is renamed over the snapshot, so readers never see it half
+    written.
+    """
+
+    def __init__(self, path, delay=SNAPSHOT_DELAY, latency=None):
+        self.path = path
+        self.delay = delay
+        # Anything with observe(seconds), such as a metrics.Histogram
+        self.latency = latency if latency is not None else LatencyHistogram()
+        self.condition = threading.Condition()
+        self.pending = None
+        self.writing = False
+        self.delay_skipped = False
+        self.stats = {'updates': 0, 'writes': 0, 'coalesced': 0, 'failed': 0, 'bytes_written': 0}
+        self.thread = threading.Thread(target=self._run, name="snapshot-writer", daemon=True)
+        self.thread.start()
+
+    def update(self, state):
+        with self.condition:
+            self.stats['updates'] += 1
+            if self.pending is not None:
+                self.stats['coalesced'] += 1
+            self.pending = state
+            self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Write any pending state now; returns False if it is still pending after ``timeout``."""
+        with self.condition:
+            self.delay_skipped = True
+            self.condition.notify_all()
+            return self.condition.wait_for(lambda: self.pending is None and not self.writing, timeout)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None)
+                self.delay_skipped = False
+                # Let the rest of the burst arrive; flush() cuts the wait short
+                self.condition.wait_for(lambda: self.delay_skipped, self.delay)
+                state, self.pending = self.pending, None
+                self.writing = True
+            start = time.perf_counter()
+            try:
+                size = write_snapshot(self.path, state)
+                self.latency.observe(time.perf_counter() - start)
+                self.stats['writes'] += 1
+                self.stats['bytes_written'] += size
+            except (OSError, TypeError, ValueError) as e:
+                logging.error(f"Failed to write {self.path}: {str(e)}")
+                self.stats['failed'] += 1
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.condition.notify_all()
@@ -0,0 +1,115 @@
+import os
+import json
+import time
+import socket
+import asyncio
+import threading
+
+STATE_SOCKET = os.getenv("STATE_SOCKET", "/tmp/plexdap-state.sock")
+RECONNECT_DELAY = 1
+SEND_TIMEOUT = 1  # a subscriber that can't take a state within this is dropped
+
+
+class BusInUse(Exception):
+    """Another live process is already serving the state socket."""
+
+
+def socket_in_use(socket_path):
+    """True if something is accepting connections on ``socket_path``."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def encode(state):
+    return (json.dumps(state, separators=(',', ':')) + "\n").encode()
+
+
+class StateBus:
+    """Pushes each now-playing state to every subscriber on a Unix socket.
+
+    States are JSON lines in the same shape as currentlyplaying.json plus a
+    ``seq`` that increases with every publish; ``seq`` starts after the one
+    passed in, so a restarted listener seeded from its snapshot keeps
+    counting up.  A new subscriber is sent the latest state straight away.
+    """
+
+    def __init__(self, socket_path=STATE_SOCKET, seq=0):
+        self.socket_path = socket_path
+        self.seq = seq
+        self.latest = None
+        self.clients = []
+        self.lock = threading.Lock()
+        self.server = None
+
+    def publish(self, state):
+        """Stamp ``state`` with the next sequence number and push it; returns the stamped state."""
+        with self.lock:
+            self.seq += 1
+            state = dict(state, seq=self.seq)
+            self.latest = encode(state)
+            for client in list(self.clients):
+                self._send(client, self.latest)
+        return state
+
+    def _send(self, client, line):
+        try:
+            client.sendall(line)
+        except OSError:
+            self.clients.remove(client)
+            client.close()
+
+    def start(self):
+        """Serve the socket; raises BusInUse rather than take it over from a live bus."""
+        if os.path.exists(self.socket_path):
+            if socket_in_use(self.socket_path):
+                raise BusInUse(f"State bus already running on {self.socket_path}")
+            # Left behind by a bus that died; nothing is listening on it
+            os.remove(self.socket_path)
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        self.server.listen(8)
+        threading.Thread(target=self._accept, name="state-bus", daemon=True).start()
+
+    def _accept(self):
+        while True:
+            client, _ = self.server.accept()
+            client.settimeout(SEND_TIMEOUT)
+            with self.lock:
+                self.clients.append(client)
+                if self.latest is not None:
+                    self._send(client, self.latest)
+
+
+def iter_states(socket_path=STATE_SOCKET, reconnect_delay=RECONNECT_DELAY):
+    """Yield states from the bus forever, reconnecting whenever the listener goes away."""
+    while True:
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+                client.connect(socket_path)
+                for line in client.makefile('rb'):
+                    yield json.loads(line)
+        except (OSError, ValueError):
+            pass
+        time.sleep(reconnect_delay)
+
+
+async def watch_states(socket_path=STATE_SOCKET, reconnect_delay=RECONNECT_DELAY):
+    """asyncio version of iter_states."""
+    while True:
+        try:
+            reader, writer = await asyncio.open_unix_connection(socket_path)
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    yield json.loads(line)
+            finally:
+                writer.close()
+        except (OSError, ValueError):
+            pass
+        await asyncio.sleep(reconnect_delay)
@@ -1,6 +1,6 @@
 import evdev
 import time
-import requests
+from playerclient import PlayerClient
 
 TOUCHSCREEN_DEVICE = '/dev/input/event0'
 DOUBLE_TAP_MAX_DELAY = 0.3
@@ -12,6 +12,8 @@ ACTION_COOLDOWN = 0.5
 last_action_time = 0
 touch_points = {}
 is_playing = False
+# Keep-alive connection to the player; commands queue without blocking the touch loop
+player = PlayerClient()
 
 class TouchPoint:
     def __init__(self, id, x=None, y=None):
@@ -43,20 +45,6 @@ class TouchPoint:
         self.tap_count = 0
         self.last_tap_time = None
 
-def open_url(url):
-    try:
-        print(f"Attempting to open URL: {url}")
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        print(f"URL opened successfully. Status code: {response.status_code}")
-        print(f"Response content: {response.text[:100]}...")
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to open URL: {e}")
-        print(f"Error type: {type(e).__name__}")
-        if hasattr(e, 'response'):
-            print(f"Response status code: {e.response.status_code}")
-            print(f"Response content: {e.response.text[:100]}...")
-
 def handle_gestures(touch_point):
     global last_action_time, is_playing
     current_time = time.time()
@@ -83,10 +71,10 @@ def handle_gestures(touch_point):
         if abs(delta_x) > SWIPE_THRESHOLD and gesture_time < SWIPE_TIME:
             if delta_x > 0:
                 print("Swipe right detected")
-                open_url("http://localhost:32500/player/playback/skipPrevious")
+                player.command("skipPrevious")
             else:
                 print("Swipe left detected")
-                open_url("http://localhost:32500/player/playback/skipNext")
+                player.command("skipNext")
             last_action_time = current_time
             return
 
@@ -95,9 +83,9 @@ def handle_gestures(touch_point):
         print("Single tap detected")
         is_playing = not is_playing
         if is_playing:
-            open_url("http://localhost:32500/player/playback/playPause")
+            player.command("playPause")
         else:
-            open_url("http://localhost:32500/player/playback/playPause")
+            player.command("playPause")
         last_action_time = current_time
         touch_point.last_tap_time = current_time
         return
@@ -105,7 +93,7 @@ def handle_gestures(touch_point):
     # Double tap detection
     if DOUBLE_TAP_MIN_DELAY < current_time - touch_point.last_tap_time < DOUBLE_TAP_MAX_DELAY:
         print("Double tap detected")
-        open_url("http://localhost:32500/player/playback/skipNext")
+        player.command("skipNext")
         last_action_time = current_time
         touch_point.reset()
         return
@@ -0,0 +1,61 @@
+import os
+from functools import lru_cache
+from PIL import ImageFont
+
+# Fallback fonts
+FALLBACK_FONTS = (
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/usr/share/fonts/truetype/freefont/FreeSans.ttf",
+)
+
+
+@lru_cache(maxsize=64)
+def load_font(path, size):
+    return ImageFont.truetype(path, size)
+
+
+@lru_cache(maxsize=64)
+def get_font(preferred_path, size, fallback_paths=FALLBACK_FONTS):
+    for path in (preferred_path,) + tuple(fallback_paths):
+        if os.path.exists(path):
+            return load_font(path, size)
+    print(f"Warning: No suitable font found. Using default font.")
+    return ImageFont.load_default()
+
+
+@lru_cache(maxsize=4096)
+def glyph_advance(font, char):
+    return font.getlength(char)
+
+
+@lru_cache(maxsize=2048)
+def text_width(font, text):
+    """Right edge of the rendered ``text``, as used for centering lines."""
+    return font.getbbox(text)[2]
+
+
+def wrap_text(text, font, max_width):
+    """Greedy word wrap in a single pass over the words.
+
+    Word widths are summed from cached glyph advances, so a title is measured
+    once per glyph instead of once per growing prefix.  A word wider than
+    ``max_width`` gets a line of its own.
+    """
+    if not text:
+        return []
+    space = glyph_advance(font, ' ')
+    lines = []
+    line = []
+    line_width = 0
+    for word in text.split():
+        word_width = sum(glyph_advance(font, char) for char in word)
+        if line and line_width + space + word_width > max_width:
+            lines.append(' '.join(line))
+            line = []
+            line_width = 0
+        line_width += word_width + (space if line else 0)
+        line.append(word)
+    if line:
+        lines.append(' '.join(line))
+    return lines
@@ -1,78 +1,433 @@
+import io
+import os
+import sys
 import json
+import signal
+import asyncio
 import logging
-from collections import defaultdict
 from datetime import datetime
-from flask import Flask, request
-from werkzeug.serving import run_simple
+from http import HTTPStatus
+from urllib.parse import parse_qs
+from playertable import load_players, player_field, PLAYERS_FILE, PLAYER_SEARCH_BYTES
+from metrics import registry, read_exported, merge_families, FAST_BUCKETS
+from multipart import MultipartParser, BufferSink, boundary_from
+from artcache import ImageCache, ARTWORK_CACHE_DIR
+from artwork import artwork_key, decode_image
+from compositor import album_art_size
+from framebuffer import screen_size
 
-app = Flask(__name__)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-CURRENT_PLAYING_FILE = 'currentlyplaying.json'
+# Served when there is no players file (see playertable.py)
 TARGET_PLAYER = "Your_Headless_plexamp_player_name"
 
-# Use in-memory storage for stats to reduce disk writes
-stats = {
-    'total_requests': 0,
-    'successful_requests': 0,
-    'error_requests': 0,
-    'events': defaultdict(int),
-    'last_reset': datetime.now()
-}
-
-def write_current_playing(data):
-    player = data.get('Player', {})
-    if player.get('title') != TARGET_PLAYER:
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "33500"))
+READ_CHUNK = 64 * 1024
+MAX_PAYLOAD = 1024 * 1024  # the JSON payload field
+MAX_THUMBNAIL = 8 * 1024 * 1024
+MAX_BODY = 32 * 1024 * 1024
+KEEPALIVE_TIMEOUT = 30
+STATE_EVENTS = ('media.play', 'media.resume', 'media.pause', 'media.stop')
+# Events whose attached thumbnail is the art the display is about to draw
+THUMBNAIL_EVENTS = ('media.play', 'media.resume')
+
+# Counters and latency histograms behind /stats and /metrics
+started = datetime.now()
+webhook_requests = registry.counter('webhook_requests_total', 'Webhook requests by result', label='result')
+webhook_events = registry.counter('webhook_events_total', 'Webhook events by type', label='event')
+player_events = registry.counter('webhook_player_events_total', 'Webhook events by player served', label='player')
+webhook_thumbnails = registry.counter('webhook_thumbnails_total', 'Attached thumbnails by outcome', label='outcome')
+webhook_seconds = registry.histogram('webhook_handle_seconds', 'Time to read, parse and answer a webhook',
+                                     buckets=FAST_BUCKETS)
+snapshot_seconds = registry.histogram('snapshot_write_seconds', 'Time to write and swap in the now-playing snapshot',
+                                      buckets=FAST_BUCKETS)
+
+# Each player's states go to its own bus (main.py and the display service
+# subscribe) and snapshot file
+players = load_players(PLAYERS_FILE, TARGET_PLAYER, latency=snapshot_seconds)
+registry.gauge('snapshot_writer_total', 'Snapshot writer activity; coalesced counts the writes saved',
+               lambda: players.snapshot_stats(), label='kind', kind='counter')
+
+def get_stats():
+    results = webhook_requests.totals()
+    thumbnails = webhook_thumbnails.totals()
+    return {
+        'total_requests': sum(results.values()),
+        'successful_requests': results.get('ok', 0),
+        'error_requests': results.get('error', 0),
+        'ignored_requests': results.get('ignored', 0),
+        'thumbnails_cached': thumbnails.get('cached', 0),
+        'thumbnails_skipped': thumbnails.get('skipped', 0),
+        'events': webhook_events.totals(),
+        'events_per_second': webhook_events.rates(),
+        'latency': {
+            'webhook': webhook_seconds.summary(),
+            'snapshot_write': snapshot_seconds.summary(),
+        },
+        'snapshot': players.snapshot_stats(),
+        'players': {route.name: {'events': player_events.total(route.name),
+                                 'seq': route.state_bus.seq,
+                                 'event': route.state['event'] if route.state else None,
+                                 'subscribers': len(route.state_bus.clients)}
+                    for route in players.routes},
+        'last_reset': started,
+    }
+
+# Disk tier of the display's artwork cache; nothing is kept in memory here
+artwork_cache = ImageCache(max_bytes=0, disk_dir=ARTWORK_CACHE_DIR)
+artwork_size = None
+
+def wants_thumbnail(data, players):
+    # Only our players' art gets drawn, so every other thumbnail is skipped unread
+    return (isinstance(data, dict) and data.get('event') in THUMBNAIL_EVENTS
+            and players.lookup(data.get('Player')) is not None
+            and bool(data.get('Metadata', {}).get('thumb')))
+
+def cache_thumbnail(thumb, jpeg):
+    """Decode the attached thumbnail into the artwork cache under the renderer's key."""
+    global artwork_size
+    if artwork_cache.disk_dir is None:
         return
+    if artwork_size is None:
+        artwork_size = album_art_size(*screen_size())
+    key = artwork_key(thumb, artwork_size)
+    if artwork_cache.contains(key):
+        return
+    img = decode_image(jpeg, artwork_size)
+    if max(img.size) < artwork_size:
+        # Smaller than the renderer draws it; let it fetch the full art instead
+        webhook_thumbnails.inc('skipped')
+        return
+    artwork_cache.put_image(key, img)
+    webhook_thumbnails.inc('cached')
 
+def write_current_playing(route, data):
     current_playing = {
         'event': data.get('event'),
-        'player': player,
+        'player': data.get('Player', {}),
         'metadata': data.get('Metadata', {}),
         'timestamp': datetime.now().isoformat()
     }
+    current_playing = route.publish(current_playing)
+
+    logging.info(f"Published {current_playing['event']} for {route.name} (seq {current_playing['seq']})")
+
+def apply_event(route, data, thumbnail=None):
+    # The art goes into the cache first, so the redraw the publish triggers finds it
+    if thumbnail:
+        try:
+            cache_thumbnail(data['Metadata']['thumb'], thumbnail)
+        except Exception as e:
+            logging.error(f"Could not cache webhook thumbnail: {str(e)}")
+    write_current_playing(route, data)
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class UnknownPlayer(Exception):
+    """The webhook is for a player this listener doesn't serve."""
+
+    def __init__(self, player):
+        super().__init__(f"Ignoring event for player {player.get('title')!r} ({player.get('uuid')})")
+        self.player = player
+
+
+def check_player(data, players):
+    # Events with no player at all (library.new and the like) are still counted
+    if isinstance(data, dict) and isinstance(data.get('Player'), dict) and players.lookup(data['Player']) is None:
+        raise UnknownPlayer(data['Player'])
+
+
+async def read_head(reader):
+    """Request line and headers of the next request, or None once the client hangs up."""
+    try:
+        line = await asyncio.wait_for(reader.readline(), KEEPALIVE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return None
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode('latin-1').split()
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return method, target.split('?', 1)[0], version, headers
+
+
+async def iter_body(reader, headers):
+    """Yield the request body in chunks as it arrives (Content-Length or chunked)."""
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        received = 0
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass  # trailers
+                return
+            received += size
+            if received > MAX_BODY:
+                raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+            yield await reader.readexactly(size)
+            await reader.readexactly(2)
+        return
+
+    remaining = int(headers.get('content-length', 0))
+    if remaining > MAX_BODY:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+    while remaining:
+        chunk = await reader.read(min(READ_CHUNK, remaining))
+        if not chunk:
+            raise asyncio.IncompleteReadError(b'', remaining)
+        remaining -= len(chunk)
+        yield chunk
+
+
+class PayloadSink(BufferSink):
+    """The ``payload`` field, dropped as soon as its Player turns out to be one we don't serve.
+
+    Plex puts the Player ahead of the Metadata, so an unknown player's
+    payload is abandoned after its first few hundred bytes and never
+    decoded; ``on_ignore`` is then called, so the rest of the body can be
+    skipped too.
+    """
 
-    with open(CURRENT_PLAYING_FILE, 'w') as f:
-        json.dump(current_playing, f, indent=2)
-    
-    app.logger.info(f"Updated {CURRENT_PLAYING_FILE} for {TARGET_PLAYER}")
+    def __init__(self, limit, players, on_ignore=None):
+        super().__init__(limit)
+        self.players = players
+        self.on_ignore = on_ignore
+        self.player = None
+        self.ignored = False
 
-@app.route('/webhook', methods=['POST'])
-def webhook():
-    stats['total_requests'] += 1
-    
-    if request.method == 'POST':
+    def write(self, data):
+        if self.ignored:
+            return
+        super().write(data)
+        if self.player is None and self.size - len(data) < PLAYER_SEARCH_BYTES:
+            self.player = player_field(self.getvalue()[:PLAYER_SEARCH_BYTES])
+            if self.player is not None and self.players.lookup(self.player) is None:
+                self.ignored = True
+                self.chunks = []
+                if self.on_ignore is not None:
+                    self.on_ignore()
+
+
+class ThumbnailSink:
+    """Collects a thumbnail part, giving up on it (not the request) past ``limit`` bytes."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.data = io.BytesIO()
+
+    def write(self, data):
+        if self.data is not None:
+            self.data.write(data)
+            if self.data.tell() > self.limit:
+                self.data = None
+
+    def close(self):
+        pass
+
+    def getvalue(self):
+        return self.data.getvalue() if self.data is not None else None
+
+
+async def read_payload(reader, headers, players):
+    """Stream the multipart body; returns the decoded ``payload`` field and thumbnail.
+
+    The thumbnail Plex attaches is only kept for our players' play events;
+    any other part is skipped as it streams past instead of being held in
+    memory.  The thumbnail is None when it was not kept.  Raises
+    UnknownPlayer, once the body has been read, for a player not in
+    ``players``.
+    """
+    content_type = headers.get('content-type', '')
+    boundary = boundary_from(content_type)
+    if boundary is None:
+        body = BufferSink(MAX_PAYLOAD)
+        async for chunk in iter_body(reader, headers):
+            body.write(chunk)
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            payload = parse_qs(body.getvalue().decode('utf-8')).get('payload')
+            if payload:
+                data = json.loads(payload[0])
+                check_player(data, players)
+                return data, None
+        raise ValueError("No payload found in the form data")
+
+    fields = {}
+
+    def payload():
+        if 'data' not in fields and 'payload' in fields:
+            fields['data'] = json.loads(fields['payload'].getvalue())
+        return fields.get('data')
+
+    def on_part(part):
+        if part.name == 'payload':
+            fields['payload'] = PayloadSink(MAX_PAYLOAD, players, on_ignore=parser.stop)
+            return fields['payload']
+        # Plex sends the payload first, so the player is known before the image starts
+        if part.name == 'thumb' and 'payload' in fields and not fields['payload'].ignored \
+                and wants_thumbnail(payload(), players):
+            fields['thumb'] = ThumbnailSink(MAX_THUMBNAIL)
+            return fields['thumb']
+        return None
+
+    parser = MultipartParser(boundary, on_part)
+    # Once the player turns out to be someone else's, the body is only drained
+    async for chunk in iter_body(reader, headers):
+        parser.feed(chunk)
+    parser.close()
+
+    if 'payload' not in fields:
+        raise ValueError("No payload found in the form data")
+    if fields['payload'].ignored:
+        raise UnknownPlayer(fields['payload'].player)
+    check_player(payload(), players)
+    thumbnail = fields['thumb'].getvalue() if 'thumb' in fields else None
+    return payload(), thumbnail
+
+
+class WebhookListener:
+    """asyncio HTTP front end for Plex webhooks, ``/stats`` and ``/metrics``.
+
+    The webhook's multipart body is parsed as it streams in; once the
+    ``payload`` field has been decoded the request is answered and the
+    event is routed to its player and handed to a single worker, which
+    does the state work (thumbnail caching, bus publish and snapshot
+    write) in order and off the event loop.  Events for players not in
+    the table are answered without being decoded.
+    """
+
+    def __init__(self, players=players):
+        self.players = players
+        self.events = asyncio.Queue()
+
+    async def handle_connection(self, reader, writer):
         try:
-            payload = request.form.get('payload')
-            if not payload:
-                raise ValueError("No payload found in the form data")
+            while True:
+                try:
+                    head = await read_head(reader)
+                    if head is None:
+                        break
+                    method, path, version, headers = head
+                    status, body, content_type = await self.route(method, path, reader, headers)
+                except HTTPError as e:
+                    status, body, content_type = e.status, str(e), 'text/plain'
+                    headers, version = {'connection': 'close'}, 'HTTP/1.0'
 
-            data = json.loads(payload)
+                keep_alive = (version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close') \
+                    or headers.get('connection', '').lower() == 'keep-alive'
+                body = body.encode()
+                writer.write(
+                    f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, reader, headers):
+        if path == '/webhook':
+            if method != 'POST':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Method Not Allowed")
+            return await self.webhook(reader, headers)
+        if path == '/stats':
+            if method != 'GET':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Method Not Allowed")
+            return HTTPStatus.OK, json.dumps(get_stats(), indent=2, default=str), 'application/json'
+        if path == '/metrics':
+            if method != 'GET':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Method Not Allowed")
+            # Ours, then whatever the display and NFC processes exported
+            return HTTPStatus.OK, merge_families(registry.render(), read_exported()), 'text/plain; version=0.0.4'
+        raise HTTPError(HTTPStatus.NOT_FOUND, "Not Found")
+
+    async def webhook(self, reader, headers):
+        with webhook_seconds.time():
+            return await self.handle_webhook(reader, headers)
+
+    async def handle_webhook(self, reader, headers):
+        try:
+            data, thumbnail = await read_payload(reader, headers, self.players)
             event_type = data.get('event')
             if not event_type:
                 raise ValueError("No event type in the received data")
 
-            stats['events'][event_type] += 1
-            
-            if event_type in ['media.play', 'media.resume', 'media.pause', 'media.stop']:
-                write_current_playing(data)
-            
-            stats['successful_requests'] += 1
-            return 'OK', 200
-        
-        except (json.JSONDecodeError, ValueError) as e:
-            app.logger.error(str(e))
-            stats['error_requests'] += 1
-            return 'Bad Request: ' + str(e), 400
+            webhook_events.inc(event_type)
+
+            route = self.players.lookup(data.get('Player'))
+            if route is not None:
+                player_events.inc(route.name)
+                if event_type in STATE_EVENTS:
+                    self.events.put_nowait((route, data, thumbnail))
+
+            webhook_requests.inc('ok')
+            return HTTPStatus.OK, 'OK', 'text/plain'
+
+        except UnknownPlayer as e:
+            logging.debug(str(e))
+            webhook_requests.inc('ignored')
+            return HTTPStatus.OK, 'OK', 'text/plain'
+
+        except (json.JSONDecodeError, ValueError, AttributeError) as e:
+            logging.error(str(e))
+            webhook_requests.inc('error')
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'Bad Request: ' + str(e))
+        except (HTTPError, ConnectionError, asyncio.IncompleteReadError):
+            webhook_requests.inc('error')
+            raise
         except Exception as e:
-            app.logger.error(f"An unexpected error occurred: {str(e)}")
-            stats['error_requests'] += 1
-            return 'Internal Server Error', 500
+            logging.error(f"An unexpected error occurred: {str(e)}")
+            webhook_requests.inc('error')
+            raise HTTPError(HTTPStatus.INTERNAL_SERVER_ERROR, 'Internal Server Error')
+
+    async def apply_events(self):
+        # One event at a time, so states are published in the order they arrived
+        loop = asyncio.get_running_loop()
+        while True:
+            route, data, thumbnail = await self.events.get()
+            try:
+                await loop.run_in_executor(None, apply_event, route, data, thumbnail)
+            except Exception as e:
+                logging.error(f"An unexpected error occurred: {str(e)}")
+
+    async def serve(self, host=WEBHOOK_HOST, port=WEBHOOK_PORT, on_listening=None):
+        """Serve until cancelled; ``on_listening`` runs once the port is bound."""
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            # A second listener has already failed on the port by now, before
+            # it could touch the state sockets
+            if on_listening is not None:
+                on_listening()
+            worker = asyncio.create_task(self.apply_events())
+            logging.info(f"Listening for webhooks on {host}:{port}")
+            try:
+                await server.serve_forever()
+            finally:
+                worker.cancel()
 
-@app.route('/stats', methods=['GET'])
-def get_stats():
-    return json.dumps(stats, indent=2, default=str), 200, {'Content-Type': 'application/json'}
 
 if __name__ == '__main__':
-    app.logger.info("Starting Plex webhook listener...")
-    run_simple('0.0.0.0', 33500, app, use_reloader=False, threaded=True)
+    logging.info("Starting Plex webhook listener...")
+    # Exit through the finally below so a pending snapshot is written on stop
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        asyncio.run(WebhookListener().serve(on_listening=players.start))
+    finally:
+        players.flush(timeout=5)